@@ -9,11 +9,14 @@ unit-tested but not intended for wide-spread general use.
 # Pylint runs from a different directory, it's fine to import this way
 # pylint: disable=W0403
 
-from ConfigParser import SafeConfigParser
+from ConfigParser import SafeConfigParser, RawConfigParser
+from ConfigParser import Error as ConfigParserError
 from collections import MutableMapping
 import os.path
 import sys
 import copy
+import marshal
+import tempfile
 
 import xceptions
 
@@ -39,6 +42,9 @@ DEFAULTSFILE = 'defaults.ini'
 #: Name of file holding special control script options
 CONTROLFILE = 'control.ini'
 
+#: Environment variable naming file to hold compiled configuration, if set
+CONFIGCACHEVAR = 'AUTOTEST_DOCKER_CONFIG_CACHE'
+
 
 class ConfigSection(object):
 
@@ -231,11 +237,43 @@ class ConfigSection(object):
         return self._scp.items(self._section)
 
 
+def typed_value(value):
+    """
+    Return option value string converted to int, bool, float, or unchanged
+
+    :param value: Interpolated option value string
+    :return: Value converted by the first of ``int()``, boolean states,
+             or ``float()`` which accepts it (same as ``ConfigDict``).
+    """
+    # Integers first, boolean wants to gobble '0' and '1' :(
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    lowered = value.lower()
+    # Same as ConfigSection.getboolean()
+    if lowered.strip() in ("yes", "true"):
+        return True
+    if lowered.strip() in ("no", "false"):
+        return False
+    # Same as ConfigParser getboolean()
+    # pylint: disable=W0212
+    if lowered in RawConfigParser._boolean_states:
+        return RawConfigParser._boolean_states[lowered]
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
 class ConfigDict(MutableMapping):
 
     r"""
     Dict-like ``ConfigSection`` interface, ``SafeConfigParser`` facade.
 
+    Values are interpolated and converted by ``typed_value()`` once, on
+    first access after loading or modification.
+
     :param section: Section name string to represent
     :param defaults: dict-like of default parameters (lower-case keys)
     :param \*args:  Passed through to dict-like super-class.
@@ -245,6 +283,8 @@ class ConfigDict(MutableMapping):
     def __init__(self, section, defaults=None, *args, **dargs):
         self._config_section = ConfigSection(defaults=defaults,
                                              section=section)
+        # Private cache of option-name to converted value, None if stale
+        self._typed = None
         # pylint: disable=E1101
         super(ConfigDict, self).__init__(*args, **dargs)
 
@@ -259,34 +299,46 @@ class ConfigDict(MutableMapping):
         complete = mine | default
         return complete
 
+    # Private method doesn't need docstring
+    def _typed_values(self):  # pylint: disable=C0111
+        if self._typed is None:
+            typed = {}
+            for key in self._keyset():
+                try:
+                    typed[key] = typed_value(self._config_section.get(key))
+                except (ConfigParserError, AttributeError):
+                    typed[key] = None  # Error raised from __getitem__
+            self._typed = typed
+        return self._typed
+
     def __len__(self):
-        return len(self._keyset())
+        return len(self._typed_values())
 
     def __iter__(self):
-        return (option for option in self._keyset())
+        return iter(self._typed_values())
 
     def __contains__(self, item):
-        return item.lower() in self._keyset()
+        return item.lower() in self._typed_values()
 
     def __getitem__(self, key):
         # ConfigParser forces this, force it so any errors are clear
         key = key.lower()
-        # Don't call more methods than necessary
-        if not self.__contains__(key):
+        try:
+            value = self._typed_values()[key]
+        except KeyError:
             raise xceptions.DockerKeyError(key)
-        # No suffix calls regular get(), boolean wants to gobble '0' and '1' :(
-        for suffix in ('int', 'boolean', 'float', ''):
-            method = getattr(self._config_section, 'get%s' % suffix)
-            try:
-                return method(key)
-            except (ValueError, AttributeError):
-                continue
-        raise xceptions.DockerConfigError('', '', key)
+        if value is None:
+            # Raise the same interpolation (or other) error again
+            self._config_section.get(key)
+            raise xceptions.DockerConfigError('', '', key)
+        return value
 
     def __setitem__(self, key, value):
+        self._typed = None
         return self._config_section.set(key, str(value))
 
     def __delitem__(self, key):
+        self._typed = None
         return self._config_section.remove_option(key)
 
     def get_other(self, option, other=None):
@@ -299,6 +351,7 @@ class ConfigDict(MutableMapping):
     def read(self, filelike):
         """Load configuration from file-like object filelike"""
         filelike.seek(0)
+        self._typed = None
         return self._config_section.readfp(filelike)
 
     @staticmethod
@@ -308,6 +361,92 @@ class ConfigDict(MutableMapping):
                                       % filelike.name)
 
 
+class ConfigOverlay(MutableMapping):
+
+    """
+    Copy-on-write dict-like view of a shared, never modified, base dict
+
+    Modifications are recorded in the instance only.  Nested dict values
+    of base are returned wrapped in their own ``ConfigOverlay``, so they
+    are also safe to modify.  Copies share base, only modifications are
+    copied.
+
+    :param base: Dictionary to represent, must not be modified afterwards
+    """
+
+    def __init__(self, base):
+        self._base = base
+        # Modified and nested-wrapped values, by key
+        self._overlay = {}
+        # Keys removed from base
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        value = self._base[key]
+        if isinstance(value, dict):
+            value = self._overlay[key] = ConfigOverlay(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._overlay[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key in self._overlay:
+            del self._overlay[key]
+            if key in self._base:
+                self._deleted.add(key)
+        elif key in self._base and key not in self._deleted:
+            self._deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._overlay:
+            return True
+        return key in self._base and key not in self._deleted
+
+    def __iter__(self):
+        for key in self._base:
+            if key not in self._overlay and key not in self._deleted:
+                yield key
+        for key in self._overlay:
+            yield key
+
+    def __len__(self):
+        return len(set(self._base) - self._deleted | set(self._overlay))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __copy__(self):
+        # Same class, pylint: disable=W0212
+        the_copy = self.__class__(self._base)
+        the_copy._overlay = self._overlay.copy()
+        the_copy._deleted = self._deleted.copy()
+        # Nested overlays must not be shared
+        for key, value in the_copy._overlay.items():
+            if isinstance(value, ConfigOverlay):
+                the_copy._overlay[key] = value.copy()
+        return the_copy
+
+    def __deepcopy__(self, memo):
+        # Same class, pylint: disable=W0212
+        the_copy = self.__class__(self._base)
+        memo[id(self)] = the_copy
+        the_copy._overlay = copy.deepcopy(self._overlay, memo)
+        the_copy._deleted = self._deleted.copy()
+        return the_copy
+
+    def copy(self):
+        """Return an independent copy, sharing only the unmodified base"""
+        return self.__copy__()
+
+
 class Config(dict):
 
     r"""
@@ -315,8 +454,8 @@ class Config(dict):
 
     :param \*args: Same as built-in python ``dict()`` params.
     :param \*\*dargs: Same as built-in python ``dict()`` params.
-    :return: Regular 'ole python dictionary of global config also as
-             python dictionaries (cached on first load)
+    :return: ``ConfigOverlay`` of global config, sections also as
+             ``ConfigOverlay`` instances, over a cache loaded once.
     """
     #: Public instance attribute cache of defaults parsing w/ non-clashing name
     defaults_ = None
@@ -324,19 +463,19 @@ class Config(dict):
     configs_ = None
     #: private class-attribute cache used to return copy as a dict in __new__()
     _singleton = None
-    #: prepared dict for deep copy.
+    #: prepared dict shared by all returned ``ConfigOverlay`` instances
     prepdict = None
 
     def __new__(cls, *args, **dargs):
         if cls._singleton is None:
-            # Apply *args, *dargs _after_ making deep-copy
+            # Apply *args, *dargs _after_ making overlay
             cls._singleton = dict.__new__(cls)
             if cls._singleton.prepdict is None:
                 cls._singleton.prepdict = cls._singleton.copy()
-        deep_copy = copy.deepcopy(cls._singleton.prepdict)
-        deep_copy.update(dict(*args, **dargs))
         # Prevent any modifications from affecting cache and/or other tests
-        return deep_copy
+        overlay = ConfigOverlay(cls._singleton.prepdict)
+        overlay.update(dict(*args, **dargs))
+        return overlay
 
     @property
     def defaults(self):
@@ -446,24 +585,98 @@ class Config(dict):
                 # differs from existing (default) value in configs_dict.
                 Config.load_config_sec(newcd, section, configs_dict)
 
+    @staticmethod
+    def ini_stamps():
+        """
+        Return sorted list of path, mtime, size tuples for all ini files
+        """
+        stamps = []
+        for configdir in (CONFIGDEFAULT, CONFIGCUSTOMS):
+            for dirpath, dirnames, filenames in os.walk(configdir,
+                                                        followlinks=True):
+                del dirnames  # not needed
+                for filename in filenames:
+                    if not filename.endswith('.ini'):
+                        continue
+                    fullpath = os.path.join(dirpath, filename)
+                    stat = os.stat(fullpath)
+                    stamps.append((fullpath, stat.st_mtime, stat.st_size))
+        stamps.sort()
+        return stamps
+
+    @staticmethod
+    def load_cache(cache_path, stamps):
+        """
+        Return configs dict compiled into cache_path, or None if out of date
+
+        :param cache_path: Path to file written by ``save_cache()``
+        :param stamps: Current ``ini_stamps()`` value
+        """
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                cached_stamps, configs_ = marshal.load(cache_file)
+        except (IOError, EOFError, ValueError, TypeError):
+            return None  # Missing, partial, or foreign cache
+        if cached_stamps != stamps:
+            return None
+        return configs_
+
+    @staticmethod
+    def save_cache(cache_path, stamps, configs_):
+        """
+        Compile configs dict and stamps into cache_path, ignoring failures
+
+        :note: This is optional/advisory behavior, a missing or unwritable
+               cache only means ini files are parsed again.
+        """
+        tmp_path = None
+        try:
+            osfd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(cache_path)))
+            with os.fdopen(osfd, 'wb') as cache_file:
+                marshal.dump((stamps, configs_), cache_file)
+            # Parallel tests never see a partial cache
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError, ValueError):
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
     @property
     def configs(self):
         """
         Read-only cached dict of ConfigDict's by section, aggregating all ini's
+
+        :note: When the ``CONFIGCACHEVAR`` environment variable names a file,
+               it's used as cache, unless any ini file has changed.
         """
         if self.__class__.configs_ is None:
-            self.__class__.configs_ = {'DEFAULTS': self.defaults}
+            cache_path = os.environ.get(CONFIGCACHEVAR)
+            if cache_path:
+                stamps = self.ini_stamps()
+                configs_ = self.load_cache(cache_path, stamps)
+                if configs_ is not None:
+                    if self.__class__.defaults_ is None:
+                        self.__class__.defaults_ = configs_['DEFAULTS']
+                    self.__class__.configs_ = configs_
+                    return configs_
+            configs_ = {'DEFAULTS': self.defaults}
             # Overwrite section-by-section from customs after loading defaults
             for dirpath, dirnames, filenames in os.walk(CONFIGDEFAULT,
                                                         followlinks=True):
                 del dirnames  # not needed
                 self.load_config_dir(dirpath, filenames,
-                                     self.__class__.configs_, self.defaults)
+                                     configs_, self.defaults)
             for dirpath, dirnames, filenames in os.walk(CONFIGCUSTOMS,
                                                         followlinks=True):
                 del dirnames  # not needed
                 self.load_config_dir(dirpath, filenames,
-                                     self.__class__.configs_, self.defaults)
+                                     configs_, self.defaults)
+            if cache_path:
+                self.save_cache(cache_path, stamps, configs_)
+            self.__class__.configs_ = configs_
         return self.__class__.configs_
 
     def copy(self):
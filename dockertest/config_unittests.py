@@ -3,6 +3,8 @@
 # Pylint runs from a different directory, it's fine to import this way
 # pylint: disable=W0403
 
+import ConfigParser
+import copy
 import os
 import shutil
 import sys
@@ -139,6 +141,32 @@ class TestConfigDict(ConfigTestBase):
         self.assertEqual(foobar['aaa'], "AAA")
         del(foobar['aaa'])
 
+    def test_converted_once(self):
+        foobar = self.config.ConfigDict('TestSection')
+        foobar.read(open(self.testfile.name, 'rb'))
+        self.assertEqual(foobar['testoptioni'], 2)
+        foobar['testoptioni'] = 'yes'
+        self.assertEqual(foobar['testoptioni'], True)
+        del foobar['testoptioni']
+        self.assertFalse('testoptioni' in foobar)
+        self.assertEqual(len(foobar), 3)
+
+    def test_interpolation_error(self):
+        foobar = self.config.ConfigDict('TestSection')
+        foobar.read(open(self.testfile.name, 'rb'))
+        foobar['bad'] = '%(missing)s'
+        self.assertEqual(foobar['testoptions'], "foobarbaz")
+        self.assertRaises(ConfigParser.Error, foobar.__getitem__, 'bad')
+
+    def test_typed_value(self):
+        typed_value = self.config.typed_value
+        for value, expected in (('0', 0), ('1', 1), ('-3', -3),
+                                ('Yes', True), (' false ', False),
+                                ('on', True), ('off', False),
+                                ('2.5', 2.5), ('foo', 'foo'), ('', '')):
+            self.assertEqual(typed_value(value), expected)
+            self.assertEqual(type(typed_value(value)), type(expected))
+
 
 class TestConfig(ConfigTestBase):
 
@@ -190,6 +218,68 @@ class TestConfig(ConfigTestBase):
         bar = self.config.Config()
         self.assertNotEqual(id(foo), id(bar))
 
+    def test_config_isolation(self):
+        foo = self.config.Config()
+        foo['TestSection']['testoptions'] = 'changed'
+        bar = self.config.Config()
+        self.assertEqual(bar['TestSection']['testoptions'], 'baz!')
+
+    def reset_config(self):
+        self.config.Config.configs_ = None
+        self.config.Config.defaults_ = None
+        self.config.Config._singleton = None
+
+    def test_compiled_cache(self):
+        cache_path = os.path.join(self.config.CONFIGCUSTOMS, 'cache')
+        os.environ[self.config.CONFIGCACHEVAR] = cache_path
+        try:
+            config = self.config.Config()
+            self.assertEqual(config['TestSection']['testoptions'], "baz!")
+            self.assertTrue(os.path.isfile(cache_path))
+            self.reset_config()
+            load_config_dir = self.config.Config.__dict__['load_config_dir']
+
+            def not_parsed(*args):
+                self.fail("Parsed ini files %s, expected cache use" % args)
+            self.config.Config.load_config_dir = staticmethod(not_parsed)
+            config = self.config.Config()
+            self.assertEqual(config['TestSection']['testoptions'], "baz!")
+            self.assertEqual(config['TestSection']['testoptionx'], True)
+            self.assertEqual(config['DEFAULTS']['testoptioni'], '2')
+            # Changed ini file must be parsed again
+            self.config.Config.load_config_dir = load_config_dir
+            self.reset_config()
+            bar = self.config.ConfigSection(None, 'TestSection')
+            bar.set('TesTopTIONs', "changed")
+            bar.write(self.cfgfile)
+            config = self.config.Config()
+            self.assertEqual(config['TestSection']['testoptions'], "changed")
+        finally:
+            del os.environ[self.config.CONFIGCACHEVAR]
+
+    def test_compiled_cache_bad(self):
+        cache_path = os.path.join(self.config.CONFIGCUSTOMS, 'cache')
+        os.environ[self.config.CONFIGCACHEVAR] = cache_path
+        try:
+            with open(cache_path, 'wb') as cache_file:
+                cache_file.write('garbage')
+            config = self.config.Config()
+            self.assertEqual(config['TestSection']['testoptions'], "baz!")
+        finally:
+            del os.environ[self.config.CONFIGCACHEVAR]
+
+    def test_compiled_cache_unwritable(self):
+        # Renaming the temporary file over a directory fails
+        cache_path = os.path.join(self.config.CONFIGCUSTOMS, 'cache')
+        os.mkdir(cache_path)
+        os.environ[self.config.CONFIGCACHEVAR] = cache_path
+        try:
+            config = self.config.Config()
+            self.assertEqual(config['TestSection']['testoptions'], "baz!")
+            self.assertEqual(os.listdir(self.config.CONFIGCUSTOMS), ['cache'])
+        finally:
+            del os.environ[self.config.CONFIGCACHEVAR]
+
     def test_multi_sections(self):
         osfd, filename = tempfile.mkstemp(suffix='.ini',
                                           dir=self.config.CONFIGDEFAULT)
@@ -314,6 +404,55 @@ class TestConfig(ConfigTestBase):
         self.assertEqual(examples, expected)
 
 
+class TestConfigOverlay(ConfigTestBase):
+
+    def setUp(self):
+        super(TestConfigOverlay, self).setUp()
+        self.base = {'DEFAULTS': {'foo': 1, 'bar': 'baz'},
+                     'Section': {'foo': 2}}
+        self.overlay = self.config.ConfigOverlay(self.base)
+
+    def test_read(self):
+        self.assertEqual(len(self.overlay), 2)
+        self.assertEqual(self.overlay, self.base)
+        self.assertEqual(self.overlay['DEFAULTS']['bar'], 'baz')
+        self.assertEqual(sorted(self.overlay), ['DEFAULTS', 'Section'])
+
+    def test_isolation(self):
+        self.overlay['Section']['foo'] = 3
+        self.overlay['DEFAULTS']['new'] = True
+        del self.overlay['DEFAULTS']['bar']
+        self.overlay['Other'] = {}
+        self.assertEqual(self.base, {'DEFAULTS': {'foo': 1, 'bar': 'baz'},
+                                     'Section': {'foo': 2}})
+        self.assertEqual(self.overlay['Section']['foo'], 3)
+        self.assertEqual(dict(self.overlay['DEFAULTS']),
+                         {'foo': 1, 'new': True})
+        self.assertEqual(len(self.overlay), 3)
+        other = self.config.ConfigOverlay(self.base)
+        self.assertEqual(other['Section']['foo'], 2)
+
+    def test_delete(self):
+        section = self.overlay['DEFAULTS']
+        del section['foo']
+        self.assertFalse('foo' in section)
+        self.assertRaises(KeyError, section.__getitem__, 'foo')
+        self.assertRaises(KeyError, section.__delitem__, 'foo')
+        section['foo'] = 5
+        self.assertEqual(section['foo'], 5)
+        del section['foo']
+        self.assertEqual(len(section), 1)
+
+    def test_copies(self):
+        self.overlay['Section']['foo'] = 3
+        for the_copy in (copy.copy(self.overlay),
+                         copy.deepcopy(self.overlay),
+                         self.overlay.copy()):
+            the_copy['Section']['foo'] = 4
+            self.assertEqual(self.overlay['Section']['foo'], 3)
+            self.assertEqual(the_copy['DEFAULTS']['foo'], 1)
+
+
 class TestUtilities(ConfigTestBase):
 
     def test_nfe_all(self):
@@ -31,6 +31,8 @@ from output import TextTable
 from config import get_as_list
 from subtestbase import SubBase
 from xceptions import DockerTestError
+import dockertest.docker_daemon as docker_daemon
+import dockertest.listcache as listcache
 
 
 # Many attributes simply required here
@@ -45,6 +47,8 @@ class DockerContainer(object):  # pylint: disable=R0902
     #: *  image_name could be None if image was not tagged.
     #: *  command will have all special-characters escaped with a '\'
     #: *  ports must be parsable by ``networking.ContainerPort``
+    #: *  created is relative to the listing time, like ``2 hours ago``
+    #:    for every backend.
     #: *  size could be None if data was not requested
     #: *  links is either None, or a list of tuple((child,alias))
     #:    strings.
@@ -166,6 +170,35 @@ class DockerContainer(object):  # pylint: disable=R0902
         return self.container_name == str(container_name)
 
 
+class DockerContainerList(listcache.IndexedList):
+
+    """
+    Python-list of DockerContainer-like instances, indexed by ID and name
+    """
+
+    index_keys = {'long_id': lambda cntr: cntr.long_id,
+                  'short_id': lambda cntr: cntr.long_id[:12],
+                  'container_name': lambda cntr: cntr.container_name}
+
+    def with_cid(self, cid):
+        """
+        Return python-list of DockerContainer-like instances matching cid
+
+        :param cid: String of long or short (12-character) container id
+        """
+        if len(cid) == 12:
+            return self.lookup('short_id', cid)
+        return self.lookup('long_id', cid)
+
+    def with_name(self, container_name):
+        """
+        Return python-list of DockerContainer-like instances with name
+
+        :param container_name: String name of container
+        """
+        return self.lookup('container_name', str(container_name))
+
+
 class DockerContainers(object):
 
     """
@@ -196,6 +229,28 @@ class DockerContainers(object):
     #: Extra arguments to use with remove methods
     remove_args = None
 
+    #: How containers are listed, ``cli`` runs and parses ``docker ps``,
+    #: ``api`` queries the daemon socket.  Set from ``backend`` config. option
+    backend = 'cli'
+
+    #: Docker daemon unix-socket used by the ``api`` backend
+    docker_socket = '/var/run/docker.sock'
+
+    #: How the ``cli`` backend lists, one of ``docker_daemon.LISTING_FORMATS``.
+    #: Set from ``listing_format`` config. option
+    listing_format = 'auto'
+
+    #: Collection class returned by ``list_containers()``
+    DCLCLS = DockerContainerList
+
+    #: Maximum length of container IDs passed to a single ``docker inspect``,
+    #: kept well under any system ARG_MAX.
+    inspect_arg_max = 65536
+
+    #: Seconds to reuse a listing snapshot, 0 disables.  Set from
+    #: ``listing_cache_ttl`` config. option
+    cache_ttl = 0
+
     def __init__(self, subtest, timeout=None, verbose=False):
         if timeout is None:
             # Defined in [DEFAULTS] guaranteed to exist
@@ -218,6 +273,21 @@ class DockerContainers(object):
         else:
             self.subtest = subtest
 
+        self.backend = subtest.config.get('backend', self.backend)
+        if self.backend not in docker_daemon.BACKENDS:
+            raise DockerTestError("Unsupported backend '%s', expecting one "
+                                  "of %s" % (self.backend,
+                                             docker_daemon.BACKENDS))
+        self.listing_format = subtest.config.get('listing_format',
+                                                 self.listing_format)
+        if self.listing_format not in docker_daemon.LISTING_FORMATS:
+            raise DockerTestError("Unsupported listing_format '%s', "
+                                  "expecting one of %s"
+                                  % (self.listing_format,
+                                     docker_daemon.LISTING_FORMATS))
+        self.cache_ttl = float(subtest.config.get('listing_cache_ttl',
+                                                  self.cache_ttl))
+
     # private methods don't need docstrings
     def _dc_from_row(self, row):  # pylint: disable=C0111
         image_name = row['IMAGE']
@@ -241,6 +311,114 @@ class DockerContainers(object):
         texttable = TextTable(stdout_strip)
         return [self._dc_from_row(row) for row in texttable]
 
+    # private methods don't need docstrings
+    def _dc_from_format(self, item):  # pylint: disable=C0111
+        # Same strings as table columns, from '{{json .}}' field names
+        dcntr = DockerContainer(item['Image'], item['Command'],
+                                item['Ports'], item['Names'])
+        dcntr.long_id = item['ID']
+        dcntr.created = item['RunningFor']
+        dcntr.status = item['Status']
+        if self.get_size:
+            # Raise documented get_container_list() exception
+            try:
+                dcntr.size = item['Size']  # throw
+            except KeyError:
+                raise ValueError("No size data present in json!")
+        return dcntr
+
+    # private methods don't need docstrings
+    def _parse_json_lines(self, stdout_strip):  # pylint: disable=C0111
+        return [self._dc_from_format(json.loads(line))
+                for line in stdout_strip.splitlines() if line.strip()]
+
+    # private methods don't need docstrings
+    def _dc_from_json(self, item):  # pylint: disable=C0111
+        # Linked containers also carry '/<child>/<alias>' names, same CSV
+        # format as the CLI's NAMES column once the leading '/' is dropped.
+        container_name = ",".join([name.lstrip('/')
+                                   for name in item['Names']])
+        ports = []
+        for port in item.get('Ports') or []:
+            if port.get('PublicPort'):
+                ports.append("%s:%d->%d/%s" % (port.get('IP', '0.0.0.0'),
+                                               port['PublicPort'],
+                                               port['PrivatePort'],
+                                               port['Type']))
+            else:
+                ports.append("%d/%s" % (port['PrivatePort'], port['Type']))
+        # CLI always double-quotes the --no-trunc command
+        command = json.dumps(item['Command'])
+        dcntr = DockerContainer(item['Image'], command, ", ".join(ports),
+                                container_name)
+        dcntr.long_id = item['Id']
+        dcntr.created = docker_daemon.human_since(item['Created'])
+        dcntr.status = item['Status']
+        if self.get_size:
+            # Raise documented get_container_list() exception
+            try:
+                # API omits zero-sized SizeRw
+                size_rw = docker_daemon.human_size(item.get('SizeRw', 0))
+                size_rootfs = docker_daemon.human_size(item['SizeRootFs'])
+            except KeyError:
+                raise ValueError("No size data present in json!")
+            dcntr.size = "%s (virtual %s)" % (size_rw, size_rootfs)
+        return dcntr
+
+    # private methods don't need docstrings
+    def _fetch_containers(self):  # pylint: disable=C0111
+        if self.backend == 'api':
+            return self.DCLCLS(self._dc_from_json(item)
+                               for item in self.get_container_json())
+        if self.json_format:
+            return self.DCLCLS(
+                self._parse_json_lines(self.get_container_list()))
+        return self.DCLCLS(self._parse_lines(self.get_container_list()))
+
+    # private methods don't need docstrings
+    def _indexed(self):  # pylint: disable=C0111
+        # Shared snapshot when cached, callers must not modify it
+        if self.cache_ttl > 0:
+            return self.snapshot().items
+        return self._fetch_containers()
+
+    @property
+    def api_client(self):
+        """
+        Represent pooled connections to docker daemon used by ``api`` backend
+        """
+        return docker_daemon.socket_client(self.docker_socket)
+
+    @property
+    def json_format(self):
+        """
+        Represent whether ``cli`` backend lists with ``--format '{{json .}}'``
+        """
+        return docker_daemon.listing_format(self.subtest.config['docker_path'],
+                                            self.listing_format) == 'json'
+
+    @property
+    def listing_cache(self):
+        """
+        Represent subtest's ``listcache.ListingCache``, None when disabled
+        """
+        if self.cache_ttl <= 0:
+            return None
+        return listcache.for_subtest(self.subtest)
+
+    def snapshot(self):
+        """
+        Return current ``listcache.Snapshot`` of containers, listing if expired
+
+        :raises ValueError: if caching is disabled (``cache_ttl`` is 0)
+        """
+        cache = self.listing_cache
+        if cache is None:
+            raise ValueError("Listing cache disabled")
+        # Subclasses can produce different DockerContainer-likes
+        key = (self.__class__, self.backend, self.get_size)
+        return cache.snapshot(key, self.cache_ttl, self._fetch_containers)
+
     def docker_cmd(self, cmd, timeout=None):
         """
         Called on to execute docker subcommand cmd with timeout
@@ -253,9 +431,14 @@ class DockerContainers(object):
                                  cmd))
         if timeout is None:
             timeout = self.timeout
-        return utils.run(docker_cmd,
-                         verbose=self.verbose,
-                         timeout=timeout)
+        try:
+            return utils.run(docker_cmd,
+                             verbose=self.verbose,
+                             timeout=timeout)
+        finally:
+            # Even failed commands may have changed something
+            if listcache.is_mutating(cmd):
+                listcache.invalidate()
 
     def docker_cmd_check(self, cmd, timeout=None):
         """
@@ -275,21 +458,36 @@ class DockerContainers(object):
         :raises RuntimeError: if not defined by subclass
         :return: Opaque value, do not use.
         """
-        if not self.get_size:
-            cmdresult = self.docker_cmd("ps -a --no-trunc",
-                                        self.timeout)
-        else:
-            cmdresult = self.docker_cmd("ps -a --no-trunc --size",
-                                        self.timeout)
+        cmd = "ps -a --no-trunc"
+        if self.get_size:
+            cmd += " --size"
+        if self.json_format:
+            cmd += " --format '{{json .}}'"
+        cmdresult = self.docker_cmd(cmd, self.timeout)
         return cmdresult.stdout.strip()
 
+    def get_container_json(self):
+        """
+        Query docker daemon for container list (w/ or w/o size)
+
+        :note: This is probably not the method you're looking for,
+               try ``list_containers()`` instead.
+
+        :return: Opaque value, do not use.
+        """
+        return self.api_client.containers(all_containers=True,
+                                          size=self.get_size)
+
     def list_containers(self):
         """
         Return a python-list of DockerContainer-like instances
 
-        :return: [DockerContainer-like, DockerContainer-like, ...]
+        :return: ``DCLCLS`` instance,
+                 [DockerContainer-like, DockerContainer-like, ...]
         """
-        return self._parse_lines(self.get_container_list())
+        if self.cache_ttl > 0:
+            return self.snapshot().items.copy()
+        return self._fetch_containers()
 
     def list_containers_with_name(self, container_name):
         """
@@ -298,8 +496,7 @@ class DockerContainers(object):
         :param container_name: String name of container
         :return: Python list of DockerContainer-like instances
         """
-        clist = self.list_containers()
-        return [cnt for cnt in clist if cnt.cmp_name(container_name)]
+        return self._indexed().with_name(container_name)
 
     def list_containers_with_cid(self, cid):
         """
@@ -308,8 +505,7 @@ class DockerContainers(object):
         :param cid: String of long or short container id
         :return: Python list of DockerContainer-like instances
         """
-        clist = self.list_containers()
-        return [cnt for cnt in clist if cnt.cmp_id(cid)]
+        return self._indexed().with_cid(cid)
 
     def list_container_ids(self):
         """
@@ -336,6 +532,15 @@ class DockerContainers(object):
         :param long_id: String of long-id for container
         :return: None if long_id invalid/not found, or JSON instance
         """
+        if self.backend == 'api':
+            try:
+                # Same list-of-one format as CLI
+                return [self.api_client.inspect(long_id)]
+            except (ValueError, IOError), details:
+                self.subtest.logdebug("Inspecting %s raised: %s: %s",
+                                      long_id, details.__class__.__name__,
+                                      str(details))
+                return None
         try:
             cmdresult = self.docker_cmd('inspect "%s"' % str(long_id),
                                         self.timeout)
@@ -353,6 +558,80 @@ class DockerContainers(object):
                                   str(details))
             return None
 
+    # private methods don't need docstrings
+    def _inspect_chunks(self, ids):  # pylint: disable=C0111
+        chunk = []
+        length = 0
+        for cid in ids:
+            arg = '"%s"' % cid
+            if chunk and length + len(arg) + 1 > self.inspect_arg_max:
+                yield chunk
+                chunk = []
+                length = 0
+            chunk.append(arg)
+            length += len(arg) + 1
+        if chunk:
+            yield chunk
+
+    def inspect_many(self, ids):
+        """
+        Return JSON objects for many containers from as few queries as possible
+
+        :param ids: Iterable of long or short container IDs or names
+        :return: Dictionary of long-id to JSON object, omitting any not found
+        """
+        ids = [str(cid) for cid in ids]
+        result = {}
+        if self.backend == 'api':
+            # No bulk inspect in API, but connections are kept alive
+            for cid in ids:
+                try:
+                    item = self.api_client.inspect(cid)
+                except (ValueError, IOError), details:
+                    self.subtest.logdebug("Inspecting %s raised: %s: %s",
+                                          cid, details.__class__.__name__,
+                                          str(details))
+                    continue
+                result[item['Id']] = item
+            return result
+        for chunk in self._inspect_chunks(ids):
+            # Any missing container makes exit non-zero, others still output
+            cmdresult = utils.run("%s inspect %s"
+                                  % (self.subtest.config['docker_path'],
+                                     " ".join(chunk)),
+                                  verbose=self.verbose,
+                                  timeout=self.timeout,
+                                  ignore_status=True)
+            try:
+                items = json.loads(cmdresult.stdout.strip())
+            except (TypeError, ValueError), details:
+                self.subtest.logdebug("docker inspect of %d containers "
+                                      "raised: %s: %s", len(chunk),
+                                      details.__class__.__name__,
+                                      str(details))
+                continue
+            for item in items or []:
+                if item:
+                    # Older docker versions used 'ID'
+                    result[item.get('Id', item.get('ID'))] = item
+        return result
+
+    def pid_index(self):
+        """
+        Return dictionary of running containers main process ID to long-id
+
+        :return: {PID: long-id, PID: long-id, ...}
+        """
+        # Bypass any cache, new containers are most likely being looked for
+        running = [cntr.long_id for cntr in self._fetch_containers()
+                   if str(cntr.status).startswith('Up')]
+        index = {}
+        for long_id, item in self.inspect_many(running).items():
+            pid = item.get('State', {}).get('Pid')
+            if pid:
+                index[int(pid)] = long_id
+        return index
+
     def json_by_long_id(self, long_id):
         """
         Return json-object for container with long_id
@@ -400,7 +679,7 @@ class DockerContainers(object):
             prefix = "%s-%s" % (self.subtest.__class__.__name__, prefix)
         else:
             prefix = self.subtest.__class__.__name__
-        all_containers = [_.container_name for _ in self.list_containers()]
+        all_containers = self._indexed().key_index('container_name')
         check = lambda name: name not in all_containers
         return utils.get_unique_name(check, prefix, suffix, length)
 
@@ -9,6 +9,8 @@ import types
 import tempfile
 import os
 import shutil
+import json
+import time
 
 
 class ContainersTestBase(unittest.TestCase):
@@ -132,6 +134,46 @@ class FakeCmdResult(object):
         for key, val in dargs.items():
             setattr(self, key, val)
 
+# Same containers as the table run() returns, as --format '{{json .}}' lines
+FORMAT_JSON = "\n".join([json.dumps({
+    "ID": long_id, "Image": image, "Command": command, "RunningFor": created,
+    "CreatedAt": "2014-03-26 13:42:42 +0000 UTC", "Status": status,
+    "Ports": ports, "Names": names, "Size": size, "Labels": "",
+    "Mounts": ""}) for (long_id, image, command, created, status, ports,
+                        names, size) in [
+        ("ac8c9fa367f96e10cbfc7927dd4048d7db3e6d240d201019c5d4359795e3bcbe",
+         "busybox:latest", '"/bin/sh -c echo -ne \"hello world\\n\"; '
+         'sleep 10m"', "5 minutes ago", "Up 79 seconds", "",
+         "cocky_albattani", "77 B"),
+        ("ef0fe72271778aefcb5cf6015f30067fbe01f05996a123037f65db0b82795915",
+         "busybox:latest", '"/bin/sh -c echo -ne \"world hello\\n\"; '
+         'sleep 10m"', "82 seconds ago", "Up 61 seconds",
+         "4.3.2.1:4321->1234/bar, 1.2.3.4:1234->4321/foo", "berserk_asdf",
+         "55 B"),
+        ("849915d551d80edce7698de91852c06bbbb7a67fe0968a3c0c246e6f25f81017",
+         "busybox:latest", '"/bin/sh -c echo -ne \"hello world\\n\"; '
+         'sleep 10m"', "28 seconds ago", "Up 16 seconds",
+         "1.2.3.4:1234->4321/foo, 0.0.0.0:5678->8765/tcp", "berserk_bohr",
+         "77 B"),
+        ("c0c35064e4d2bdcf86e6fd83e0de2e599473c12a6599415a9a021bdf382a3589",
+         "busybox:latest", '"/bin/sh -c echo -ne \"hello world\\n\""',
+         "5 minutes ago", "Exit 0", "", "lonely_poincare", "77 B"),
+        ("3723b1b0abd7be84316ce7824e68cb7af090416296c539a28d169495f44a6319",
+         "busybox:latest", '"/bin/bash -c echo -ne \"hello world\\n\""',
+         "6 minutes ago", "Exit 1", "", "clever_brattain", "77 B"),
+        ("abf8c40b19e353ff1f67e3a26a967c14944b07b8f5aceb752f781ffca285a2a9",
+         "10.16.71.105:5000/fedora:latest", "/bin/bash", "22 hours ago",
+         "Exit 0", "",
+         "child0/alias0,child1/alias1,child2/alias2,suspicious_pare",
+         "77 B"),
+        ("gfjggkkg9049iewm430oitjg09fd09094jte0re8g5gcgbg5ge7e15f6a2gtgggg",
+         "foobar", "/bin/bash", "1 decade ago", "Exit 99", "",
+         "child0/alias0,infernal_github,child1/alias1,child2/alias2",
+         "77 B"),
+        ("e1820ef428b51a95c963353cc4ce6b57ea0a20c44537a8336792510713dfe524",
+         "10.16.71.105:5000/fedora:latest", "/bin/bash", "22 hours ago",
+         "Exit 0", "", "thirsty_mccarthy", "77 B")]])
+
 RUN_CACHE = []
 
 
@@ -165,6 +207,12 @@ def run(command, *_args, **_dargs):
                              stderr='',
                              exit_status=0,
                              duration=1.21)
+    if '--format' in command:
+        return FakeCmdResult(command=command.strip(),
+                             stdout=FORMAT_JSON,
+                             stderr='',
+                             exit_status=0,
+                             duration=42)
     return FakeCmdResult(command=command.strip(),
                          stdout=r"""
 CONTAINER ID                                                       IMAGE                             COMMAND                                            CREATED             STATUS              PORTS                                            NAMES                                                       SIZE
@@ -199,12 +247,14 @@ setattr(mock('autotest.client.shared.version'), 'get_version',
         lambda: version.AUTOTESTVERSION)
 
 import version
+from fakedaemon import FakeDaemon
 
 
 class DockerContainersTestBase(ContainersTestBase):
 
     defaults = {'docker_path': '/foo/bar', 'docker_options': '--not_exist',
                 'docker_timeout': 60.0, 'config_version': '0.3.1',
+                'listing_format': 'table',
                 'preserve_cnames': '\ncocky_albattani,   '
                 'lonely_poincare \n  '}
     customs = {}
@@ -296,6 +346,16 @@ class DockerContainersTest(DockerContainersTestBase):
 
         self.assertNotEqual(len(dcc.json_by_name("suspicious_pare")), 0)
 
+    def test_indexed(self):
+        dcc = self.containers.DockerContainers(self.fake_subtest)
+        cl = dcc.list_containers()
+        self.assertTrue(isinstance(cl, self.containers.DockerContainerList))
+        self.assertEqual(cl.with_name('berserk_bohr'),
+                         [c for c in cl if c.cmp_name('berserk_bohr')])
+        self.assertEqual(cl.with_cid('ac8c9fa367f9'),
+                         [c for c in cl if c.cmp_id('ac8c9fa367f9')])
+        self.assertEqual(cl.with_name('not_exist'), [])
+
     def test_noports(self):
         dcc = self.containers.DockerContainers(self.fake_subtest)
         short_id = "ac8c9fa367f9"
@@ -366,6 +426,21 @@ class DockerContainersTest(DockerContainersTestBase):
         for exp in expected:
             self.assertTrue(exp in dcntr.list_container_ids())
 
+    def test_inspect_many(self):
+        dcntr = self.containers.DockerContainers(self.fake_subtest)
+        # Room for two quoted long IDs per command
+        dcntr.inspect_arg_max = 140
+        ids = dcntr.list_container_ids()
+        kill_run_cache()
+        result = dcntr.inspect_many(ids)
+        commands = [item['command'] for item in get_run_cache()]
+        self.assertEqual(len(commands), 4)
+        for command in commands:
+            self.assertTrue(command.startswith('/foo/bar inspect "'))
+            self.assertEqual(command.count('"'), 4)
+        self.assertEqual(result.keys(), ["abf8c40b19e353ff1f67e3a26a967c14"
+                                         "944b07b8f5aceb752f781ffca285a2a9"])
+
     def test_clean_all(self):
         dcntr = self.containers.DockerContainers(self.fake_subtest)
         names = set(dcntr.list_container_names())
@@ -384,5 +459,224 @@ class DockerContainersTest(DockerContainersTestBase):
         self.assertEqual(cleaned_names, expected)
         self.assertTrue(cleaned_names.isdisjoint(preserve))
 
+
+class DockerContainersFormatTest(DockerContainersTest):
+
+    # Everything in DockerContainersTest must also pass with json listings
+    def setUp(self):
+        super(DockerContainersFormatTest, self).setUp()
+        self.fake_subtest.config['listing_format'] = 'json'
+
+    def test_format_command(self):
+        dcc = self.containers.DockerContainers(self.fake_subtest)
+        self.assertTrue(dcc.json_format)
+        kill_run_cache()
+        dcc.list_containers()
+        self.assertEqual(get_run_cache()[0]['command'],
+                         "/foo/bar ps -a --no-trunc --format '{{json .}}'")
+
+    def test_same_as_table(self):
+        dcc = self.containers.DockerContainers(self.fake_subtest)
+        dcc.get_size = True
+        from_json = dcc.list_containers()
+        self.fake_subtest.config['listing_format'] = 'table'
+        dcc = self.containers.DockerContainers(self.fake_subtest)
+        dcc.get_size = True
+        from_table = dcc.list_containers()
+        self.assertEqual(len(from_json), len(from_table))
+        for json_dc, table_dc in zip(from_json, from_table):
+            self.assertEqual(json_dc, table_dc)
+            self.assertEqual(json_dc.links, table_dc.links)
+            for attr in ('long_id', 'created', 'status', 'size'):
+                self.assertEqual(getattr(json_dc, attr),
+                                 getattr(table_dc, attr))
+
+    def test_bad_format(self):
+        self.fake_subtest.config['listing_format'] = 'yaml'
+        self.assertRaises(Exception, self.containers.DockerContainers,
+                          self.fake_subtest)
+
+
+class DockerContainersCacheTest(DockerContainersTestBase):
+
+    def setUp(self):
+        super(DockerContainersCacheTest, self).setUp()
+        self.fake_subtest.config['listing_cache_ttl'] = 60
+        self.dcc = self.containers.DockerContainers(self.fake_subtest)
+        kill_run_cache()
+
+    @staticmethod
+    def listings():
+        return len([item for item in get_run_cache()
+                    if item['command'].find(' ps ') > -1])
+
+    def test_disabled(self):
+        del self.fake_subtest.config['listing_cache_ttl']
+        dcc = self.containers.DockerContainers(self.fake_subtest)
+        self.assertEqual(dcc.listing_cache, None)
+        dcc.list_containers()
+        dcc.list_containers()
+        self.assertEqual(self.listings(), 2)
+
+    def test_lookups(self):
+        short_id = "ac8c9fa367f9"
+        long_id = ("abf8c40b19e353ff1f67e3a26a967"
+                   "c14944b07b8f5aceb752f781ffca285a2a9")
+        self.assertEqual(len(self.dcc.list_containers()), 8)
+        cnts = self.dcc.list_containers_with_cid(short_id)
+        self.assertEqual(cnts[0].container_name, 'cocky_albattani')
+        cnts = self.dcc.list_containers_with_cid(long_id)
+        self.assertEqual(cnts[0].container_name, 'suspicious_pare')
+        cnts = self.dcc.list_containers_with_name('infernal_github')
+        self.assertEqual(len(cnts), 1)
+        self.assertEqual(self.dcc.list_containers_with_name('not_exist'), [])
+        self.assertTrue('berserk_bohr' in self.dcc.list_container_names())
+        self.assertEqual(self.listings(), 1)
+        self.assertEqual(self.dcc.listing_cache.misses, 1)
+        self.assertEqual(self.dcc.listing_cache.hits, 5)
+
+    def test_shared(self):
+        self.dcc.list_containers()
+        other = self.containers.DockerContainers(self.fake_subtest)
+        other.list_container_ids()
+        self.assertEqual(self.listings(), 1)
+        self.assertTrue(other.listing_cache is self.dcc.listing_cache)
+
+    def test_copy(self):
+        self.dcc.list_containers().pop()
+        self.assertEqual(len(self.dcc.list_containers()), 8)
+
+    def test_invalidate_remove(self):
+        self.dcc.remove_by_name('berserk_bohr')
+        self.dcc.list_containers()
+        self.assertEqual(self.listings(), 2)
+
+    def test_invalidate_clean_all(self):
+        self.dcc.list_containers()
+        self.dcc.clean_all(['berserk_bohr'])
+        self.dcc.list_containers()
+        self.dcc.list_containers()
+        self.assertEqual(self.listings(), 2)
+
+    def test_invalidate_dockercmd(self):
+        import dockercmd
+        self.dcc.list_containers()
+        dockercmd.DockerCmd(self.fake_subtest, 'inspect', ['foo']).execute()
+        self.dcc.list_containers()
+        self.assertEqual(self.listings(), 1)
+        dockercmd.DockerCmd(self.fake_subtest, 'run', ['foo']).execute()
+        self.dcc.list_containers()
+        self.assertEqual(self.listings(), 2)
+
+    def test_ttl(self):
+        self.dcc.cache_ttl = 0.01
+        self.dcc.list_containers()
+        time.sleep(0.02)
+        self.dcc.list_containers()
+        self.assertEqual(self.listings(), 2)
+
+
+class DockerContainersAPITest(DockerContainersTestBase):
+
+    containers_json = [
+        {"Id": "ac8c9fa367f96e10cbfc7927dd4048d7"
+               "db3e6d240d201019c5d4359795e3bcbe",
+         "Names": ["/cocky_albattani"],
+         "Image": "busybox:latest",
+         "Command": "/bin/sh -c sleep 10m",
+         "Created": 1490000000,
+         "Ports": [],
+         "Status": "Up 79 seconds",
+         "SizeRootFs": 1100000},
+        {"Id": "ef0fe72271778aefcb5cf6015f30067f"
+               "be01f05996a123037f65db0b82795915",
+         "Names": ["/berserk_asdf", "/child0/alias0"],
+         "Image": "busybox:latest",
+         "Command": "/bin/true",
+         "Created": 1490000001,
+         "Ports": [{"IP": "4.3.2.1", "PrivatePort": 1234,
+                    "PublicPort": 4321, "Type": "bar"},
+                   {"PrivatePort": 443, "Type": "tcp"}],
+         "Status": "Exited (0) 2 seconds ago",
+         "SizeRw": 77,
+         "SizeRootFs": 1100077}]
+
+    def setUp(self):
+        super(DockerContainersAPITest, self).setUp()
+        self.sockdir = tempfile.mkdtemp(self.__class__.__name__)
+        self.sockpath = os.path.join(self.sockdir, 'docker.sock')
+        self.daemon = FakeDaemon(self.sockpath,
+                                 {'/containers/json': self.containers_json})
+        self.dcc = self.containers.DockerContainers(self.fake_subtest)
+        self.dcc.backend = 'api'
+        self.dcc.docker_socket = self.sockpath
+        kill_run_cache()
+
+    def tearDown(self):
+        self.dcc.api_client.close()
+        self.daemon.stop()
+        shutil.rmtree(self.sockdir, ignore_errors=True)
+        super(DockerContainersAPITest, self).tearDown()
+
+    def test_bad_backend(self):
+        self.fake_subtest.config['backend'] = 'carrier_pigeon'
+        self.assertRaises(self.containers.DockerTestError,
+                          self.containers.DockerContainers,
+                          self.fake_subtest)
+
+    def test_list(self):
+        cl = self.dcc.list_containers()
+        self.assertEqual(len(cl), 2)
+        self.assertEqual(get_run_cache(), [])  # Nothing forked
+        self.assertEqual(cl[0].container_name, 'cocky_albattani')
+        self.assertEqual(cl[0].long_id, self.containers_json[0]['Id'])
+        self.assertEqual(cl[0].command, '"/bin/sh -c sleep 10m"')
+        self.assertEqual(cl[0].ports, '')
+        self.assertEqual(cl[0].size, None)
+        self.assertEqual(cl[1].container_name, 'berserk_asdf')
+        self.assertEqual(cl[1].links, [('child0', 'alias0')])
+        self.assertEqual(cl[1].ports, '4.3.2.1:4321->1234/bar, 443/tcp')
+        self.assertEqual(cl[1].status, 'Exited (0) 2 seconds ago')
+        # Same relative string as the CLI backends, not the API's epoch
+        self.assertTrue(cl[0].created.endswith(' years ago'))
+
+    def test_size(self):
+        self.dcc.get_size = True
+        cl = self.dcc.list_containers()
+        self.assertEqual(cl[0].size, '0 B (virtual 1.1 MB)')
+        self.assertEqual(cl[1].size, '77 B (virtual 1.1 MB)')
+        self.assertTrue(self.daemon.requests[-1].find('size=1') > -1)
+
+    def test_keepalive(self):
+        for _ in xrange(5):
+            self.dcc.list_container_names()
+        self.assertEqual(len(self.daemon.requests), 5)
+        self.assertEqual(self.daemon.connections, 1)
+
+    def test_inspect(self):
+        long_id = self.containers_json[1]['Id']
+        self.daemon.routes['/containers/%s/json' % long_id] = {
+            'Id': long_id, 'State': {'Running': False, 'Pid': 0}}
+        _json = self.dcc.json_by_name('berserk_asdf')
+        self.assertEqual(_json[0]['Id'], long_id)
+        self.assertEqual(self.dcc.get_container_metadata('not_exist'), None)
+        self.assertEqual(get_run_cache(), [])  # Nothing forked
+        self.assertEqual(self.daemon.connections, 1)
+
+    def test_pid_index(self):
+        for pid, item in enumerate(self.containers_json):
+            self.daemon.routes['/containers/%s/json' % item['Id']] = {
+                'Id': item['Id'], 'State': {'Pid': 100 + pid}}
+        pids = self.dcc.pid_index()
+        # Only the 'Up' container
+        self.assertEqual(pids, {100: self.containers_json[0]['Id']})
+        self.assertEqual(len(self.daemon.requests), 2)
+        self.assertEqual(get_run_cache(), [])  # Nothing forked
+
+    def test_with_name(self):
+        cl = self.dcc.list_containers_with_name('berserk_asdf')
+        self.assertEqual(len(cl), 1)
+        self.assertEqual(cl[0].long_id, self.containers_json[1]['Id'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,9 +10,24 @@ import logging
 import socket
 import json
 import re
+import subprocess
+import threading
+import time
+import urllib
 from autotest.client import utils
 
 
+#: Valid values for the ``backend`` [DEFAULTS] option.  ``cli`` forks the
+#: docker client and parses its output, ``api`` talks to the daemon socket.
+BACKENDS = ('cli', 'api')
+
+#: Valid values for the ``listing_format`` [DEFAULTS] option.  ``table``
+#: parses the ``cli`` backend's column output, ``json`` has the client
+#: print one ``--format '{{json .}}'`` object per line, ``auto`` picks
+#: ``json`` whenever the client supports it.
+LISTING_FORMATS = ('auto', 'table', 'json')
+
+
 class ClientBase(object):
 
     """
@@ -58,10 +73,43 @@ class ClientBase(object):
         return self.value_to_json(self.get(resource))
 
 
+class SocketResponse(object):
+
+    """
+    Completely read response from a ``SocketClient`` request
+
+    :param response: ``httplib.HTTPResponse`` instance to read & close
+    """
+
+    # Too few pub. meth: Just a container for read-once response details
+    # pylint: disable=R0903
+
+    def __init__(self, response):
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = dict(response.getheaders())
+        self.body = response.read()
+
+    def read(self):
+        """
+        Return complete response body (may be called more than once)
+        """
+
+        return self.body
+
+
 class SocketClient(ClientBase):
 
     """
-    Connection to docker daemon through a unix socket
+    Pool of keep-alive connections to docker daemon through a unix socket
+
+    Safe to share across threads.  At most ``pool_size`` connections are
+    open at once, callers wait up to their request timeout for a free one.
+    Connections closed by the daemon while idle are transparently re-opened.
+
+    :param uri: Path to the existing docker daemon unix socket
+    :param pool_size: Non-default maximum number of connections
+    :param timeout: Non-default timeout for each request, in seconds
     """
 
     class UHTTPConnection(httplib.HTTPConnection):
@@ -71,29 +119,193 @@ class SocketClient(ClientBase):
         socket
 
         :param path: Path to the existing unix socket
+        :param timeout: Socket timeout in seconds, or None to block
         """
 
         # Too few pub. meth: Subclass of builtin, don't break design.
         # pylint: disable=R0903
 
-        def __init__(self, path="/var/run/docker.sock"):
+        def __init__(self, path="/var/run/docker.sock", timeout=None):
             httplib.HTTPConnection.__init__(self, 'localhost')
             self.path = path
+            self.timeout = timeout
 
         def connect(self):
             sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
             sock.connect(self.path)
             self.sock = sock
 
+        def settimeout(self, timeout):
+            """
+            Change timeout for any future (or current) socket operations
+            """
+            self.timeout = timeout
+            if self.sock is not None:
+                self.sock.settimeout(timeout)
+
     interface = UHTTPConnection
 
-    def __init__(self, uri="/var/run/docker.sock"):
+    #: Maximum number of simultaneously open connections
+    pool_size = 4
+
+    #: Default timeout in seconds for each request
+    timeout = 120.0
+
+    #: Size of each read-request when streaming response bodies
+    READ_SIZE = 65536
+
+    #: Seconds between attempts to get a free pool slot
+    SLOT_POLL_SECONDS = 0.01
+
+    def __init__(self, uri="/var/run/docker.sock", pool_size=None,
+                 timeout=None):
         super(SocketClient, self).__init__(uri)
-        self._connection = self.interface(uri)
+        if pool_size is not None:
+            self.pool_size = int(pool_size)
+        if timeout is not None:
+            self.timeout = float(timeout)
+        self._idle = []  # most recently used last
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+    def _acquire(self, timeout):
+        """
+        Return tuple(connection, was_idle), wait up to timeout for free slot
 
-    def get(self, resource):
-        self._connection.request("GET", resource)
-        return self._connection.getresponse()  # httplib.HTTPResponse
+        :raises socket.timeout: When no slot became free in time, e.g. all
+                                are held by unfinished ``stream()`` calls.
+        """
+        deadline = time.time() + timeout
+        while not self._slots.acquire(False):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout("No free connection in pool of %d "
+                                     "within %s seconds"
+                                     % (self.pool_size, timeout))
+            time.sleep(min(remaining, self.SLOT_POLL_SECONDS))
+        with self._lock:
+            if self._idle:
+                connection = self._idle.pop()
+                was_idle = True
+            else:
+                connection = None
+                was_idle = False
+        if connection is None:
+            connection = self.interface(self.uri)
+        connection.settimeout(timeout)
+        return connection, was_idle
+
+    def _release(self, connection, reusable=True):
+        """Return connection to pool if reusable, otherwise close it"""
+        try:
+            if reusable and connection.sock is not None:
+                with self._lock:
+                    self._idle.append(connection)
+            else:
+                connection.close()
+        finally:
+            self._slots.release()
+
+    def _request(self, method, resource, timeout):
+        """
+        Return tuple(connection, response) after sending method on resource
+
+        Retried once on a fresh connection, if the daemon hung up on an
+        idle keep-alive connection.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        connection, was_idle = self._acquire(timeout)
+        try:
+            try:
+                connection.request(method, resource)
+                return connection, connection.getresponse()
+            except (httplib.BadStatusLine, httplib.CannotSendRequest,
+                    socket.error), xcept:
+                if not was_idle or isinstance(xcept, socket.timeout):
+                    raise
+                connection.close()  # stale, reconnects on next request
+                connection.request(method, resource)
+                return connection, connection.getresponse()
+        except:
+            self._release(connection, reusable=False)
+            raise
+
+    def close(self):
+        """
+        Close all idle connections, busy connections close when released
+        """
+
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for connection in idle:
+            connection.close()
+
+    def get(self, resource, timeout=None):
+        """
+        Return ``SocketResponse`` for resource, with complete body read
+
+        :param resource: Daemon API path (and query) string
+        :param timeout: Non-default timeout for this request, in seconds
+        """
+
+        connection, response = self._request("GET", resource, timeout)
+        reusable = False
+        try:
+            result = SocketResponse(response)
+            reusable = not response.will_close
+            return result
+        finally:
+            self._release(connection, reusable)
+
+    def get_json(self, resource, timeout=None):
+        return self.value_to_json(self.get(resource, timeout))
+
+    def stream(self, resource, timeout=None):
+        """
+        Generate response body pieces for resource, as they arrive
+
+        :note: Connection is held out of the pool until generator finishes
+               or is closed.
+        :param resource: Daemon API path (and query) string
+        :param timeout: Non-default timeout between each piece, in seconds
+                        ``None`` to use ``timeout`` attribute.
+        :raises ValueError: On non-200 response status
+        """
+
+        connection, response = self._request("GET", resource, timeout)
+        reusable = False
+        try:
+            if response.status != 200:
+                raise ValueError("Bad response status %s (%s)\nRaw data: %s"
+                                 % (response.status, response.reason,
+                                    response.read()))
+            if response.chunked:
+                # httplib's read(amt) blocks until amt is filled,
+                # yield each chunk as soon as it arrives instead.
+                while True:
+                    line = response.fp.readline()
+                    size = int(line.split(';', 1)[0], 16)
+                    if size == 0:
+                        # Discard optional trailers up to blank line
+                        while response.fp.readline() not in ('\r\n', '\n',
+                                                             ''):
+                            pass
+                        break
+                    piece = response.fp.read(size)
+                    response.fp.read(2)  # CRLF
+                    yield piece
+                response.close()
+            else:
+                piece = response.read(self.READ_SIZE)
+                while piece:
+                    yield piece
+                    piece = response.read(self.READ_SIZE)
+            reusable = not response.will_close
+        finally:
+            self._release(connection, reusable)
 
     @staticmethod
     def value_to_json(value):
@@ -109,6 +321,196 @@ class SocketClient(ClientBase):
 
         return self.get_json("/version")
 
+    def containers(self, all_containers=True, size=False):
+        """
+        Return container list as a json object, same as ``docker ps``
+
+        :param all_containers: Also list non-running containers (``--all``)
+        :param size: Include layer-size data (``--size``), potentially slow
+        """
+
+        query = urllib.urlencode({'all': int(bool(all_containers)),
+                                  'size': int(bool(size))})
+        return self.get_json("/containers/json?%s" % query)
+
+    def images(self, all_images=False):
+        """
+        Return image list as a json object, same as ``docker images``
+
+        :param all_images: Also list intermediate images (``--all``)
+        """
+
+        query = urllib.urlencode({'all': int(bool(all_images))})
+        return self.get_json("/images/json?%s" % query)
+
+    def inspect(self, container_id):
+        """
+        Return container details as a json object, same as ``docker inspect``
+
+        :param container_id: Long/short container ID or name
+        :raises ValueError: If container doesn't exist
+        """
+
+        return self.get_json("/containers/%s/json"
+                             % urllib.quote(str(container_id)))
+
+    def events(self, since=None, until=None, timeout=None):
+        """
+        Generate event json objects as they arrive, same as ``docker events``
+
+        :param since: Optional timestamp (string/int) to begin with
+        :param until: Optional timestamp (string/int) to end with
+        :param timeout: Max seconds to wait for each event, None for default
+        """
+
+        query = {}
+        if since is not None:
+            query['since'] = since
+        if until is not None:
+            query['until'] = until
+        buf = ''
+        for piece in self.stream("/events?%s" % urllib.urlencode(query),
+                                 timeout):
+            buf += piece
+            lines = buf.split('\n')
+            buf = lines.pop()  # incomplete
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        if buf.strip():
+            yield json.loads(buf)
+
+    def logs(self, container_id, stdout=True, stderr=True, follow=False,
+             timeout=None):
+        """
+        Generate raw log data pieces as they arrive, same as ``docker logs``
+
+        :note: Unless container has a TTY, data is multiplexed with an
+               8-byte stream/length header before each frame.
+        :param container_id: Long/short container ID or name
+        :param stdout: Include standard output
+        :param stderr: Include standard error
+        :param follow: Keep streaming until the container exits
+        :param timeout: Max seconds to wait for each piece, None for default
+        """
+
+        query = urllib.urlencode({'stdout': int(bool(stdout)),
+                                  'stderr': int(bool(stderr)),
+                                  'follow': int(bool(follow))})
+        return self.stream("/containers/%s/logs?%s"
+                           % (urllib.quote(str(container_id)), query),
+                           timeout)
+
+
+#: Private, process-wide ``SocketClient`` instances, keyed by socket path
+_SOCKET_CLIENTS = {}
+
+#: Private, protects ``_SOCKET_CLIENTS``
+_SOCKET_CLIENTS_LOCK = threading.Lock()
+
+
+def socket_client(uri="/var/run/docker.sock"):
+    """
+    Return the shared (pooled) ``SocketClient`` for docker daemon socket uri
+
+    :param uri: Path to the existing docker daemon unix socket
+    """
+    with _SOCKET_CLIENTS_LOCK:
+        client = _SOCKET_CLIENTS.get(uri)
+        if client is None:
+            client = _SOCKET_CLIENTS[uri] = SocketClient(uri)
+        return client
+
+
+def human_size(size):
+    """
+    Return byte-count size as a human-readable string, like the docker CLI.
+
+    :param size: Number of bytes
+    :return: String like ``'1.5 MB'`` (base-1000 units, 4 significant digits)
+    """
+    size = float(size)
+    units = ('B', 'kB', 'MB', 'GB', 'TB', 'PB')
+    index = 0
+    while size >= 1000.0 and index < len(units) - 1:
+        size /= 1000.0
+        index += 1
+    return "%.4g %s" % (size, units[index])
+
+
+def human_since(timestamp, now=None):
+    """
+    Return time since timestamp as a human-readable string, like the
+    CREATED column of the docker CLI.
+
+    :param timestamp: Seconds since the epoch
+    :param now: Seconds since the epoch to compare against, None for now
+    :return: String like ``'2 hours ago'``
+    """
+    if now is None:
+        now = time.time()
+    seconds = now - timestamp
+    # Same rounding and units as the CLI (go-units HumanDuration)
+    hours = int(seconds / 3600.0 + 0.5)
+    if seconds < 1:
+        since = "Less than a second"
+    elif int(seconds) == 1:
+        since = "1 second"
+    elif seconds < 60:
+        since = "%d seconds" % seconds
+    elif int(seconds / 60) == 1:
+        since = "About a minute"
+    elif seconds < 3600:
+        since = "%d minutes" % (seconds / 60)
+    elif hours == 1:
+        since = "About an hour"
+    elif hours < 48:
+        since = "%d hours" % hours
+    elif hours < 24 * 7 * 2:
+        since = "%d days" % (hours / 24)
+    elif hours < 24 * 30 * 2:
+        since = "%d weeks" % (hours / 24 / 7)
+    elif hours < 24 * 365 * 2:
+        since = "%d months" % (hours / 24 / 30)
+    else:
+        since = "%d years" % (int(seconds / 3600) / 24 / 365)
+    return since + " ago"
+
+
+#: Private, ``auto`` listing format resolved per docker client path
+_LISTING_FORMATS = {}
+
+
+def listing_format(docker_path, wanted='auto'):
+    """
+    Return ``'table'`` or ``'json'``, how to list with client at docker_path
+
+    :param docker_path: Full path to docker client executable
+    :param wanted: One of ``LISTING_FORMATS``, ``auto`` asks ``DockerVersion``
+    :raises ValueError: if wanted is not one of ``LISTING_FORMATS``
+    """
+    if wanted not in LISTING_FORMATS:
+        raise ValueError("Unsupported listing_format '%s', expecting one "
+                         "of %s" % (wanted, LISTING_FORMATS))
+    if wanted != 'auto':
+        return wanted
+    try:
+        return _LISTING_FORMATS[docker_path]
+    except KeyError:
+        pass
+    # Not at module level, output needs the full autotest error module
+    from dockertest.output import DockerVersion
+    try:
+        has_json = DockerVersion(docker_path=docker_path).has_json_format
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        # Unknown client version, the table format always works
+        has_json = False
+    if has_json:
+        _LISTING_FORMATS[docker_path] = 'json'
+    else:
+        _LISTING_FORMATS[docker_path] = 'table'
+    return _LISTING_FORMATS[docker_path]
+
 # Group of utils for managing docker daemon service.
 
 
@@ -136,9 +538,48 @@ def which_docker():
     return docker
 
 
+#: Private, memoized ``which_docker()`` result, see ``service_name()``
+_SERVICE_NAME = None
+
+
+def service_name(refresh=False):
+    """
+    Return ``which_docker()``, memoized until ``invalidate_caches()``
+
+    :param refresh: Run ``which_docker()`` again when True
+    """
+    global _SERVICE_NAME  # pylint: disable=W0603
+    if refresh or _SERVICE_NAME is None:
+        _SERVICE_NAME = which_docker()
+    return _SERVICE_NAME
+
+
+#: ``systemctl`` actions which (may) change the running docker daemon
+RESTART_ACTIONS = ('start', 'stop', 'restart', 'try-restart',
+                   'reload-or-restart', 'kill')
+
+
 def systemd_action(action):
     """ Run the given systemctl action on the current docker service """
-    return utils.run("systemctl %s %s.service" % (action, which_docker()))
+    if action.split()[0] not in RESTART_ACTIONS:
+        return utils.run("systemctl %s %s.service" % (action, service_name()))
+    try:
+        return utils.run("systemctl %s %s.service" % (action, service_name()))
+    finally:
+        invalidate_caches()
+
+
+def invalidate_caches():
+    """
+    Forget cached docker version and daemon details, e.g. after (re)starts
+    """
+    global _SERVICE_NAME  # pylint: disable=W0603
+    _SERVICE_NAME = None
+    _LISTING_FORMATS.clear()
+    _IDENTITY.reset()
+    # Not at module level, output needs the full autotest error module
+    from dockertest.output import dockerversion
+    dockerversion.invalidate()
 
 
 def stop():
@@ -197,24 +638,24 @@ def cmdline(process_id=None):
     :param process_id: PID whose commandline we read (default: docker daemon)
     """
     if process_id is None:
-        process_id = pid()
+        return list(_IDENTITY.cmdline)
     ps_command = 'ps -o command= -p %d' % int(process_id)
     return utils.run(ps_command).stdout.strip().split()
 
 
 def user_namespaces_enabled():
     """ Returns true if docker daemon is running with user namespaces """
-    return '--userns-remap=default' in cmdline()
+    return _IDENTITY.userns_enabled
 
 
 def user_namespaces_uid():
     """ Returns the subordinate UID used for docker processes. """
-    return _user_namespaces_id('/etc/subuid')
+    return _IDENTITY.userns_uid
 
 
 def user_namespaces_gid():
     """ Returns the subordinate GID used for docker processes. """
-    return _user_namespaces_id('/etc/subgid')
+    return _IDENTITY.userns_gid
 
 
 def _user_namespaces_id(idfile):
@@ -232,3 +673,134 @@ def _user_namespaces_id(idfile):
                 pass
     raise RuntimeError("User namespaces enabled, but"
                        " did not find 'dockremap' in %s" % idfile)
+
+
+class DaemonIdentity(object):
+
+    """
+    Memoized service name, PID, argv, rpm NVRA and userns IDs of docker daemon
+
+    Everything is resolved on first use, and again only after ``reset()``
+    (called when ``systemd_action()`` (re)starts/stops the daemon), or
+    when the remembered PID no longer runs the remembered argv.  That check
+    reads a single ``/proc`` file.
+    """
+
+    #: Per-process command line file, ``%d`` is the PID
+    proc_cmdline = '/proc/%d/cmdline'
+
+    def __init__(self):
+        #: Mapping of value name to ``[calls, resolves, total seconds]``
+        self.timings = {}
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def reset(self):
+        """
+        Forget all resolved values
+        """
+        with self._lock:
+            self._values = {}
+
+    def valid(self):
+        """
+        Return True if remembered PID is still running remembered argv
+        """
+        try:
+            process_id = self._values['pid']
+            argv = self._values['cmdline']
+        except KeyError:
+            return False
+        try:
+            with open(self.proc_cmdline % process_id, 'rb') as cmdfile:
+                # ps (as used by cmdline()) joins argv with spaces
+                return cmdfile.read().replace('\0', ' ').split() == argv
+        except IOError:  # process is gone
+            return False
+
+    def _value(self, name, resolve):
+        start = time.time()
+        resolved = 0
+        with self._lock:
+            try:
+                if not self.valid():
+                    self._values = {}
+                    # Daemon changed, maybe to another service
+                    self._values['service'] = service_name(refresh=True)
+                    self._values['pid'] = pid()
+                    self._values['cmdline'] = cmdline(self._values['pid'])
+                    resolved = 1
+                if name not in self._values:
+                    self._values[name] = resolve()
+                    resolved = 1
+                return self._values[name]
+            finally:
+                timing = self.timings.setdefault(name, [0, 0, 0.0])
+                timing[0] += 1
+                timing[1] += resolved
+                timing[2] += time.time() - start
+
+    @property
+    def service(self):
+        """
+        Represent name of running docker systemd service, see which_docker()
+        """
+        return self._value('service', None)
+
+    @property
+    def pid(self):
+        """
+        Represent process ID of running docker daemon, see pid()
+        """
+        return self._value('pid', None)
+
+    @property
+    def cmdline(self):
+        """
+        Represent argv list of running docker daemon (do not modify)
+        """
+        return self._value('cmdline', None)
+
+    @property
+    def rpm(self):
+        """
+        Represent NVRA string of rpm providing running docker service
+        """
+        # FIXME: this won't work for container-engine.
+        return self._value('rpm', lambda: subprocess.check_output(
+            "rpm -q %s" % self.service, shell=True).strip())
+
+    @property
+    def userns_enabled(self):
+        """
+        Represent whether docker daemon is running with user namespaces
+        """
+        return self._value('userns_enabled',
+                           lambda: '--userns-remap=default' in self.cmdline)
+
+    @property
+    def userns_uid(self):
+        """
+        Represent subordinate UID used for docker processes
+        """
+        return self._value('userns_uid',
+                           lambda: _user_namespaces_id('/etc/subuid'))
+
+    @property
+    def userns_gid(self):
+        """
+        Represent subordinate GID used for docker processes
+        """
+        return self._value('userns_gid',
+                           lambda: _user_namespaces_id('/etc/subgid'))
+
+
+#: Private, process-wide ``DaemonIdentity``, see ``identity()``
+_IDENTITY = DaemonIdentity()
+
+
+def identity():
+    """
+    Return the process-wide, memoized ``DaemonIdentity`` of docker daemon
+    """
+    return _IDENTITY
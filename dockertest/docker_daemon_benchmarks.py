@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+Compare docker_daemon.SocketClient throughput against a local fake daemon
+
+Prints requests per second for one connection per request (the historic
+behavior), the pooled keep-alive client used serially, and the pooled
+client shared by several threads.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import httplib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Must come after sys.path modification
+import dockertest.docker_daemon as docker_daemon  # noqa
+from dockertest.fakedaemon import FakeDaemon  # noqa
+
+#: Number of requests timed per scenario
+REQUESTS = 2000
+
+#: Number of threads sharing the pooled client
+THREADS = 4
+
+#: Body returned for every request, a realistic /containers/json entry
+BODY = json.dumps([{"Id": "0" * 64, "Names": ["/benchmark"],
+                    "Image": "busybox", "Command": "/bin/true",
+                    "Created": 1400000000, "Status": "Exited (0)",
+                    "Ports": []}] * 10)
+
+
+def new_connection_per_request(path, count):
+    """Open, request, and close a new connection each time"""
+    for _ in xrange(count):
+        conn = httplib.HTTPConnection('localhost')
+        conn.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.sock.connect(path)
+        conn.request('GET', '/containers/json')
+        json.loads(conn.getresponse().read())
+        conn.close()
+
+
+def pooled_serial(path, count):
+    """Issue requests one after another through a pooled client"""
+    client = docker_daemon.SocketClient(path)
+    for _ in xrange(count):
+        client.containers()
+    client.close()
+
+
+def pooled_threaded(path, count):
+    """Issue requests from THREADS threads sharing a pooled client"""
+    client = docker_daemon.SocketClient(path, pool_size=THREADS)
+
+    def worker():
+        for _ in xrange(count / THREADS):
+            client.containers()
+
+    threads = [threading.Thread(target=worker) for _ in xrange(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.close()
+
+
+def main():
+    """Run each scenario against a fresh fake daemon and print results"""
+    tmpdir = tempfile.mkdtemp('docker_daemon_benchmarks')
+    path = os.path.join(tmpdir, 'docker.sock')
+    daemon = FakeDaemon(path, {'/containers/json': BODY})
+    try:
+        for func in (new_connection_per_request, pooled_serial,
+                     pooled_threaded):
+            start = time.time()
+            func(path, REQUESTS)
+            elapsed = time.time() - start
+            print "%-28s %8.1f requests/sec" % (func.__name__,
+                                                REQUESTS / elapsed)
+    finally:
+        daemon.stop()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,12 @@
 #!/usr/bin/env python
 
 import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
 import unittest2
 import sys
 import types
@@ -49,6 +55,12 @@ def fakerun_setup(**kwargs):
 def fakerun(command, *_args, **_dargs):
     return FAKERUN_RESULTS.pop(0)
 
+def fake_service():
+    """Memoize service name from a fake which_docker() run"""
+    import docker_daemon
+    fakerun_setup(stdout="\n")
+    docker_daemon.service_name(refresh=True)
+
 
 # Mock module and exception class in one stroke
 setattr(mock('autotest.client.shared.error'), 'CmdError', Exception)
@@ -62,6 +74,37 @@ mock('autotest.client.shared.error')
 mock('autotest.client.shared.service')
 setattr(mock('autotest.client.utils'), 'run', fakerun)
 
+from fakedaemon import FakeDaemon
+
+
+def slow(handler):
+    time.sleep(0.5)
+    handler.send_body('{}')
+
+
+def hangup(handler):
+    handler.send_body('{}')
+    # Idle keep-alive connection dropped by daemon w/o notice
+    handler.close_connection = 1
+
+
+def events(handler):
+    handler.send_response(200)
+    handler.send_header('Transfer-Encoding', 'chunked')
+    handler.end_headers()
+    for event in ('{"status": "create", "id": "abc"}\n',
+                  '{"status": "start", "id": "abc"}\n'
+                  '{"status": "die", ', '"id": "abc"}\n'):
+        handler.wfile.write('%x\r\n%s\r\n' % (len(event), event))
+    handler.wfile.write('0\r\n\r\n')
+
+
+#: Fake daemon responses by request path
+ROUTES = {'/slow': slow,
+          '/hangup': hangup,
+          '/events': events,
+          '/version': {"Version": "1.2.3"}}
+
 
 class DDTestBase(unittest2.TestCase):
 
@@ -94,6 +137,174 @@ class DDTest(DDTestBase):
         self.assertEqual(i.interface, None)
 
 
+class TestSocketClient(DDTestBase):
+
+    def setUp(self):
+        super(TestSocketClient, self).setUp()
+        self.sockdir = tempfile.mkdtemp(self.__class__.__name__)
+        self.sockpath = os.path.join(self.sockdir, 'docker.sock')
+        self.daemon = FakeDaemon(self.sockpath, ROUTES)
+        self.client = self.dd.SocketClient(self.sockpath, pool_size=2)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.stop()
+        shutil.rmtree(self.sockdir, ignore_errors=True)
+        super(TestSocketClient, self).tearDown()
+
+    def test_keepalive(self):
+        for _ in xrange(10):
+            self.assertEqual(self.client.version(), {'Version': '1.2.3'})
+        self.assertEqual(len(self.daemon.requests), 10)
+        self.assertEqual(self.daemon.connections, 1)
+
+    def test_bad_status(self):
+        self.assertRaises(ValueError, self.client.inspect, 'not_exist')
+        # Error response didn't cost a connection
+        self.client.version()
+        self.assertEqual(self.daemon.connections, 1)
+
+    def test_reconnect(self):
+        self.client.get_json('/hangup')
+        self.assertEqual(self.client.version(), {'Version': '1.2.3'})
+        self.assertEqual(self.daemon.connections, 2)
+
+    def test_timeout(self):
+        self.assertRaises(socket.timeout, self.client.get, '/slow', 0.05)
+        # Timed-out connection must not go back in the pool
+        self.assertEqual(self.client.version(), {'Version': '1.2.3'})
+        self.assertEqual(self.daemon.connections, 2)
+
+    def test_bounded_pool(self):
+        errors = []
+
+        def worker():
+            try:
+                for _ in xrange(5):
+                    self.client.version()
+            except Exception, xcept:  # pylint: disable=W0703
+                errors.append(xcept)
+
+        threads = [threading.Thread(target=worker) for _ in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.daemon.requests), 40)
+        self.assertTrue(self.daemon.connections <= 2)
+
+    def test_events(self):
+        events = list(self.client.events(since=0))
+        self.assertEqual([event['status'] for event in events],
+                         ['create', 'start', 'die'])
+        self.assertEqual(self.daemon.requests[-1], '/events?since=0')
+        # Fully consumed stream connection is reused
+        self.client.version()
+        self.assertEqual(self.daemon.connections, 1)
+
+    def test_stream_abandoned(self):
+        stream = self.client.stream('/events')
+        stream.next()
+        stream.close()
+        self.client.version()
+        self.assertEqual(self.daemon.connections, 2)
+
+    def test_pool_exhausted(self):
+        # pool_size=2, both slots held by unfinished streams
+        streams = [self.client.stream('/events') for _ in xrange(2)]
+        for stream in streams:
+            stream.next()
+        start = time.time()
+        self.assertRaises(socket.timeout, self.client.get, '/version', 0.1)
+        self.assertTrue(time.time() - start >= 0.1)
+        streams[0].close()
+        self.assertEqual(self.client.version(), {'Version': '1.2.3'})
+        streams[1].close()
+
+    def test_shared(self):
+        self.assertTrue(self.dd.socket_client(self.sockpath) is
+                        self.dd.socket_client(self.sockpath))
+
+    def test_human_size(self):
+        self.assertEqual(self.dd.human_size(0), '0 B')
+        self.assertEqual(self.dd.human_size(999), '999 B')
+        self.assertEqual(self.dd.human_size(385500000), '385.5 MB')
+
+    def test_human_since(self):
+        now = 1490000000
+        for seconds, expected in ((0.5, 'Less than a second'),
+                                  (1, '1 second'),
+                                  (59, '59 seconds'),
+                                  (119, 'About a minute'),
+                                  (120, '2 minutes'),
+                                  (3599, '59 minutes'),
+                                  (5399, 'About an hour'),
+                                  (5400, '2 hours'),
+                                  (47 * 3600, '47 hours'),
+                                  (48 * 3600, '2 days'),
+                                  (14 * 86400, '2 weeks'),
+                                  (60 * 86400, '2 months'),
+                                  (800 * 86400, '2 years')):
+            self.assertEqual(self.dd.human_since(now - seconds, now),
+                             expected + ' ago')
+
+
+class TestListingFormat(DDTestBase):
+
+    def setUp(self):
+        super(TestListingFormat, self).setUp()
+        self.tmpdir = tempfile.mkdtemp(prefix='TestListingFormat')
+        self.dd._LISTING_FORMATS.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        self.dd._LISTING_FORMATS.clear()
+
+    def fake_docker(self, version):
+        docker_path = os.path.join(self.tmpdir, 'docker_%s' % version)
+        with open(docker_path, 'wb') as docker:
+            docker.write("#!/bin/sh\n"
+                         "printf 'Client:\\n Version: %s\\n'\n" % version)
+        os.chmod(docker_path, 0755)
+        return docker_path
+
+    def test_explicit(self):
+        self.assertEqual(self.dd.listing_format('/not/exist', 'table'),
+                         'table')
+        self.assertEqual(self.dd.listing_format('/not/exist', 'json'), 'json')
+        self.assertRaises(ValueError, self.dd.listing_format,
+                          '/not/exist', 'yaml')
+
+    def test_auto(self):
+        new_docker = self.fake_docker('1.13.1')
+        old_docker = self.fake_docker('1.12.6')
+        self.assertEqual(self.dd.listing_format(new_docker), 'json')
+        self.assertEqual(self.dd.listing_format(old_docker), 'table')
+        # Resolved once per client
+        os.unlink(new_docker)
+        self.assertEqual(self.dd.listing_format(new_docker), 'json')
+
+    def test_invalidate(self):
+        docker_path = self.fake_docker('1.12.6')
+        self.assertEqual(self.dd.listing_format(docker_path), 'table')
+        os.unlink(docker_path)
+        self.fake_docker('1.13.1')
+        os.rename(os.path.join(self.tmpdir, 'docker_1.13.1'), docker_path)
+        self.assertEqual(self.dd.listing_format(docker_path), 'table')
+        fake_service()
+        fakerun_setup()  # systemctl restart
+        self.dd.restart()
+        self.assertEqual(self.dd.listing_format(docker_path), 'json')
+
+    def test_auto_broken(self):
+        docker_path = os.path.join(self.tmpdir, 'docker')
+        with open(docker_path, 'wb') as docker:
+            docker.write("#!/bin/sh\nexit 1\n")
+        os.chmod(docker_path, 0755)
+        self.assertEqual(self.dd.listing_format(docker_path), 'table')
+
+
 class TestWhichDocker(unittest2.TestCase):
     """
     Tests for which_docker()
@@ -155,6 +366,13 @@ class TestSystemdShow(unittest2.TestCase):
     Tests for systemd_show()
     """
 
+    def setUp(self):
+        del FAKERUN_RESULTS[:]
+        fake_service()
+
+    def tearDown(self):
+        del FAKERUN_RESULTS[:]
+
     def test_simple(self):
         """
         The usual case: systemctl responds with a 'Property=XXX' one-liner
@@ -162,7 +380,6 @@ class TestSystemdShow(unittest2.TestCase):
         import docker_daemon
 
         expect = 'baz'
-        fakerun_setup(stdout="\n")                      # for which_docker()
         fakerun_setup(stdout="FooBar=%s\n" % expect)
         actual = docker_daemon.systemd_show('FooBar')
 
@@ -174,7 +391,6 @@ class TestSystemdShow(unittest2.TestCase):
         """
         import docker_daemon
 
-        fakerun_setup(stdout="\n")                      # for which_docker()
         fakerun_setup(stdout="UnExpectedResultWithNoEqualsSign\n")
         self.assertRaises(RuntimeError,
                           docker_daemon.systemd_show, 'FooBar')
@@ -189,12 +405,119 @@ class TestSystemdShow(unittest2.TestCase):
         # distinguish between dockerd itself and dockerd run under runc
         # (as a container). The third fakerun_setup() simulates the
         # output of 'ps' on our pid.
-        fakerun_setup(stdout="\n")                      # for which_docker()
         fakerun_setup(stdout="MainPID=12345\n")
         fakerun_setup(stdout="/usr/bin/dockerd --add-runtime ...\n")
 
         self.assertEqual(docker_daemon.pid(), 12345, 'daemon pid')
 
+    def test_service_memoized(self):
+        """
+        Only the first systemctl action looks up the service name
+        """
+        import docker_daemon
+
+        fakerun_setup(stdout="ActiveState=active\n")
+        fakerun_setup(stdout="ActiveState=active\n")
+        for _ in xrange(2):
+            self.assertEqual(docker_daemon.systemd_show('ActiveState'),
+                             'active')
+        docker_daemon.invalidate_caches()
+        fakerun_setup(stdout="docker-latest.service loaded active "
+                             "running Docker\n")
+        fakerun_setup(stdout="ActiveState=active\n")
+        docker_daemon.systemd_show('ActiveState')
+        self.assertEqual(docker_daemon.service_name(), 'docker-latest')
+        self.assertEqual(FAKERUN_RESULTS, [])
+
+
+
+class TestDaemonIdentity(unittest2.TestCase):
+    """
+    Tests for DaemonIdentity
+    """
+
+    def setUp(self):
+        import docker_daemon
+        self.dd = docker_daemon
+        self.tmpdir = tempfile.mkdtemp(prefix='TestDaemonIdentity')
+        self.identity = docker_daemon.DaemonIdentity()
+        self.identity.proc_cmdline = os.path.join(self.tmpdir, '%d')
+        del FAKERUN_RESULTS[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        del FAKERUN_RESULTS[:]
+        self.dd.identity().proc_cmdline = self.dd.DaemonIdentity.proc_cmdline
+        self.dd.identity().reset()
+
+    def fake_daemon(self, pid, argv):
+        with open(self.identity.proc_cmdline % pid, 'wb') as cmdfile:
+            cmdfile.write('\0'.join(argv) + '\0')
+        fakerun_setup(stdout="\n")                      # which_docker()
+        fakerun_setup(stdout="MainPID=%d\n" % pid)
+        fakerun_setup(stdout=" ".join(argv) + "\n")     # pid() cmdline()
+        fakerun_setup(stdout=" ".join(argv) + "\n")     # cmdline()
+
+    def test_resolve_once(self):
+        self.fake_daemon(123, ['/usr/bin/dockerd', '--userns-remap=default'])
+        for _ in xrange(3):
+            self.assertEqual(self.identity.service, 'docker')
+            self.assertEqual(self.identity.pid, 123)
+            self.assertEqual(self.identity.cmdline,
+                             ['/usr/bin/dockerd', '--userns-remap=default'])
+            self.assertTrue(self.identity.userns_enabled)
+        self.assertEqual(FAKERUN_RESULTS, [])
+        self.assertEqual(self.identity.timings['pid'][:2], [3, 0])
+        self.assertEqual(self.identity.timings['service'][:2], [3, 1])
+        self.assertEqual(self.identity.timings['userns_enabled'][:2], [3, 1])
+
+    def test_timings_threads(self):
+        self.fake_daemon(123, ['/usr/bin/dockerd'])
+
+        def get_pids():
+            for _ in xrange(100):
+                self.assertEqual(self.identity.pid, 123)
+        threads = [threading.Thread(target=get_pids) for _ in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.identity.timings['pid'][:2], [800, 1])
+
+    def test_pid_changed(self):
+        self.fake_daemon(123, ['/usr/bin/dockerd', '--userns-remap=default'])
+        self.assertTrue(self.identity.userns_enabled)
+        os.unlink(self.identity.proc_cmdline % 123)
+        self.fake_daemon(456, ['/usr/bin/dockerd-current'])
+        self.assertFalse(self.identity.userns_enabled)
+        self.assertEqual(self.identity.pid, 456)
+        self.assertEqual(FAKERUN_RESULTS, [])
+
+    def test_argv_changed(self):
+        # Same PID, different process
+        self.fake_daemon(123, ['/usr/bin/dockerd'])
+        self.assertEqual(self.identity.pid, 123)
+        self.fake_daemon(123, ['/usr/bin/dockerd', '--debug'])
+        self.assertEqual(self.identity.cmdline,
+                         ['/usr/bin/dockerd', '--debug'])
+
+    def test_restart_resets(self):
+        # Module-wide instance, with fake /proc
+        self.dd.identity().proc_cmdline = self.identity.proc_cmdline
+        self.dd.identity().reset()
+        self.fake_daemon(123, ['/usr/bin/dockerd'])
+        self.assertEqual(self.dd.identity().pid, 123)
+        fakerun_setup()  # systemctl restart
+        self.dd.restart()
+        self.assertFalse(self.dd.identity().valid())
+        # show doesn't restart anything
+        self.fake_daemon(123, ['/usr/bin/dockerd'])
+        self.assertEqual(self.dd.identity().pid, 123)
+        fakerun_setup(stdout="MainPID=123\n")
+        self.dd.systemd_show('MainPID')
+        self.assertTrue(self.dd.identity().valid())
+        self.assertEqual(FAKERUN_RESULTS, [])
+
 
 if __name__ == '__main__':
     unittest2.main()
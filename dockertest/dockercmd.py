@@ -12,6 +12,8 @@ from subtestbase import SubBase
 from xceptions import DockerNotImplementedError
 from xceptions import DockerExecError, DockerTestError
 from xceptions import DockerCommandError
+from containers import DockerContainers
+import dockertest.listcache as listcache
 
 
 class DockerCmdBase(object):
@@ -281,9 +283,13 @@ class DockerCmd(DockerCmdBase):  # pylint: disable=R0903
             str_stdin = ""
         if self.verbose:
             self.subtest.logdebug("Executing %s%s", str(self), str_stdin)
-        self.cmdresult = utils.run(self.command, timeout=self.timeout,
-                                   stdin=stdin, verbose=False,
-                                   ignore_status=True)
+        try:
+            self.cmdresult = utils.run(self.command, timeout=self.timeout,
+                                       stdin=stdin, verbose=False,
+                                       ignore_status=True)
+        finally:
+            if listcache.is_mutating(self.subcmd):
+                listcache.invalidate()
         # Return value, not reference
         return self.cmdresult
 
@@ -322,6 +328,8 @@ class AsyncDockerCmd(DockerCmdBase):
             self.subtest.logdebug("Async-execute: %s%s", str(self), str_stdin)
         self._async_job = utils.AsyncJob(self.command, verbose=False,
                                          stdin=stdin, close_fds=True)
+        if listcache.is_mutating(self.subcmd):
+            listcache.invalidate()
         return self.cmdresult
 
     def wait_for_ready(self, cid=None, timeout=None, timestep=0.2):
@@ -387,7 +395,12 @@ class AsyncDockerCmd(DockerCmdBase):
         if self.verbose and not self.quiet:
             self.subtest.logdebug("Waiting %s for async-command to finish",
                                   timeout)
-        self._async_job.wait_for(timeout)
+        try:
+            self._async_job.wait_for(timeout)
+        finally:
+            # Changes made while running in background
+            if listcache.is_mutating(self.subcmd):
+                listcache.invalidate()
         return self.cmdresult
 
     @property
@@ -433,15 +446,10 @@ class AsyncDockerCmd(DockerCmdBase):
         if self.subcmd == 'attach':
             return self.subargs[-1]
 
-        # Non-attach command. Find our PID, iterate over all containers,
-        # get their PID (via inspect). If we find a match, return the CID.
+        # Non-attach command. Find our PID among the PIDs of all running
+        # containers (from one bulk inspect).  Return the CID if found.
         pid = self.process_id
-        cids = utils.run('docker ps -q', verbose=False).stdout.splitlines()
-        for cid in cids:
-            c_pid = utils.run('docker inspect --format {{.State.Pid}} ' + cid)
-            if int(c_pid.stdout) == int(pid):
-                return cid
-        return None
+        return DockerContainers(self.subtest).pid_index().get(int(pid))
 
     # Override base-class property methods to give up-to-second details
 
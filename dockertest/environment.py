@@ -13,7 +13,7 @@ import subprocess
 # python docs are terrible.  The C library man(3) pages provided by
 # the 'libselinux-devel' RPM package (or equivilent) are much better.
 import selinux
-from dockertest.docker_daemon import which_docker
+from dockertest.docker_daemon import identity
 
 
 def set_selinux_context(path=None, context=None, recursive=True, pwd=None):
@@ -89,5 +89,5 @@ def docker_rpm():
     FIXME: this won't work for container-engine. That's tricky, and
     not high priority, so let's save it for a subsequent PR.
     """
-    cmd = "rpm -q %s" % which_docker()
-    return subprocess.check_output(cmd, shell=True).strip()
+    # Memoized until docker daemon changes
+    return identity().rpm
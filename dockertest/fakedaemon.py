@@ -0,0 +1,94 @@
+"""
+Fake docker daemon serving canned API responses, for unittests & benchmarks
+
+Not for use by subtests, it only understands what the unittests request.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import json
+import threading
+import BaseHTTPServer
+import SocketServer
+
+
+class FakeDaemonHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    """
+    Answer GET requests from the server's ``routes`` table
+
+    Route values which are callable are passed this handler, and must
+    send the complete response.  String values are sent as the body
+    unmodified, anything else is JSON encoded first.
+    """
+
+    # Keep-alive, like the real daemon
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_body(self, body, status=200):
+        """Send complete response with JSON body string and status code"""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=C0103
+        with self.server.lock:
+            self.server.requests.append(self.path)
+        try:
+            route = self.server.routes[self.path.split('?')[0]]
+        except KeyError:
+            self.send_body(json.dumps(self.server.not_found), 404)
+            return
+        if callable(route):
+            route(self)
+        elif isinstance(route, basestring):
+            self.send_body(route)
+        else:
+            self.send_body(json.dumps(route))
+
+    def address_string(self):
+        return 'localhost'  # unix sockets have no peer address
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeDaemon(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+
+    """
+    Serve routes on unix socket path from a background thread until stop()
+
+    :param path: Path to unix socket to create
+    :param routes: Dictionary of request path (w/o query) to response, see
+                   ``FakeDaemonHandler``
+    :param not_found: Value JSON encoded into 404 responses for other paths
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, routes, not_found=None):
+        SocketServer.UnixStreamServer.__init__(self, path, FakeDaemonHandler)
+        self.routes = routes
+        if not_found is None:
+            not_found = {'message': 'page not found'}
+        self.not_found = not_found
+        self.lock = threading.Lock()
+        self.requests = []
+        self.connections = 0
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving, close listening socket"""
+        self.shutdown()
+        self.server_close()
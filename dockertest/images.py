@@ -25,6 +25,7 @@ Note: As in other places, the terms 'repo' and 'image' are used
 # Pylint runs from another directory, ignore relative import warnings
 # pylint: disable=W0403
 
+import json
 import re
 from autotest.client import utils
 from autotest.client.shared import error
@@ -35,6 +36,8 @@ from output import OutputGood, TextTable
 from subtestbase import SubBase
 from xceptions import DockerTestError, DockerCommandError
 from xceptions import DockerFullNameFormatError
+import dockertest.docker_daemon as docker_daemon
+import dockertest.listcache as listcache
 
 
 # Many attributes simply required here
@@ -68,7 +71,9 @@ class DockerImage(object):  # pylint: disable=R0902
         :param repo: String repository name component
         :param tag: String tag name
         :param long_id: Full 64-character ID string for image
-        :param created: Opaque instance representing date/time aspect
+        :param created: Opaque instance representing date/time aspect,
+                        listings set it relative to the listing time,
+                        like ``2 hours ago``, for every backend.
         :param size: Opaque instance representing a storage-size aspect
         :param repo_addr: Opaque instance representing network address/port
         :param user: String representing username as consumed by usage context
@@ -305,6 +310,56 @@ class DockerImage(object):  # pylint: disable=R0902
         return self.cmp_greedy(repo, tag, repo_addr, user)
 
 
+class DockerImageList(listcache.IndexedList):
+
+    """
+    Python-list of DockerImage-like instances, indexed by ID and FQIN
+    components
+    """
+
+    index_keys = {'long_id': lambda di: di.long_id,
+                  'short_id': lambda di: di.short_id,
+                  'repo': lambda di: di.repo,
+                  'tag': lambda di: di.tag,
+                  'repo_addr': lambda di: di.repo_addr,
+                  'user': lambda di: di.user}
+
+    def with_image_id(self, image_id):
+        """
+        Return python-list of DockerImage-like instances matching image_id
+
+        :param image_id: Exactly 12-character string or longer image ID
+        """
+        if len(image_id) == 12:
+            return self.lookup('short_id', image_id)
+        return self.lookup('long_id', image_id)
+
+    def with_components(self, repo=None, tag=None, repo_addr=None, user=None):
+        """
+        Return python-list of DockerImage-like instances greedy-matching
+        all non-None FQIN components (see ``DockerImage.cmp_greedy()``)
+
+        :param repo: String repository name component
+        :param tag: Optional tag name string
+        :param repo_addr: Optional String representing network address/port
+        :param user: Optional string username as consumed by usage context
+        """
+        return self.lookup_all(repo=repo, tag=tag,
+                               repo_addr=repo_addr, user=user)
+
+    def with_full_name(self, full_name):
+        """
+        Return python-list of DockerImage-like instances greedy-matching
+        full_name (see ``DockerImage.cmp_greedy_full_name()``)
+
+        :param full_name: FQIN string, Fully Qualified Image Name
+        """
+        if not self:
+            return []
+        # Items may be a DockerImage subclass, split only once
+        return self.with_components(*self[0].split_to_component(full_name))
+
+
 class DockerImages(object):
 
     """
@@ -318,6 +373,9 @@ class DockerImages(object):
     #: Allow switching out the class used by items
     DICLS = DockerImage
 
+    #: Collection class returned by ``list_imgs()``
+    DILCLS = DockerImageList
+
     #: Operational timeout, may be overridden by subclasses and/or parameters.
     timeout = 60.0
 
@@ -336,6 +394,21 @@ class DockerImages(object):
     #: Extra arguments to use with remove methods
     remove_args = None
 
+    #: How images are listed, ``cli`` runs and parses ``docker images``,
+    #: ``api`` queries the daemon socket.  Set from ``backend`` config. option
+    backend = 'cli'
+
+    #: Docker daemon unix-socket used by the ``api`` backend
+    docker_socket = '/var/run/docker.sock'
+
+    #: How the ``cli`` backend lists, one of ``docker_daemon.LISTING_FORMATS``.
+    #: Set from ``listing_format`` config. option
+    listing_format = 'auto'
+
+    #: Seconds to reuse a listing snapshot, 0 disables.  Set from
+    #: ``listing_cache_ttl`` config. option
+    cache_ttl = 0
+
     def __init__(self, subtest, timeout=None, verbose=False):
         if timeout is None:
             self.timeout = float(subtest.config['docker_timeout'])
@@ -351,6 +424,21 @@ class DockerImages(object):
         else:
             self.subtest = subtest
 
+        self.backend = subtest.config.get('backend', self.backend)
+        if self.backend not in docker_daemon.BACKENDS:
+            raise DockerTestError("Unsupported backend '%s', expecting one "
+                                  "of %s" % (self.backend,
+                                             docker_daemon.BACKENDS))
+        self.listing_format = subtest.config.get('listing_format',
+                                                 self.listing_format)
+        if self.listing_format not in docker_daemon.LISTING_FORMATS:
+            raise DockerTestError("Unsupported listing_format '%s', "
+                                  "expecting one of %s"
+                                  % (self.listing_format,
+                                     docker_daemon.LISTING_FORMATS))
+        self.cache_ttl = float(subtest.config.get('listing_cache_ttl',
+                                                  self.cache_ttl))
+
     # private methods don't need docstrings
     @classmethod
     def _di_from_row(cls, row):  # pylint: disable=C0111
@@ -373,6 +461,86 @@ class DockerImages(object):
         texttable = TextTable(stdout_strip)
         return [self._di_from_row(row) for row in texttable]
 
+    # private methods don't need docstrings
+    @classmethod
+    def _di_from_format(cls, item):  # pylint: disable=C0111
+        # Same strings as table columns, from '{{json .}}' field names
+        value_filter = TextTable.value_filter
+        size = item.get('VirtualSize', item.get('Size'))
+        if size is None:
+            raise KeyError("neither Size nor VirtualSize found in json")
+        return cls.DICLS(value_filter(item['Repository']),
+                         value_filter(item['Tag']),
+                         value_filter(item['ID']),
+                         value_filter(item['CreatedSince']),
+                         value_filter(size))
+
+    # private methods don't need docstrings
+    def _parse_json_lines(self, stdout_strip):  # pylint: disable=C0111
+        return [self._di_from_format(json.loads(line))
+                for line in stdout_strip.splitlines() if line.strip()]
+
+    # private methods don't need docstrings
+    @classmethod
+    def _dis_from_json(cls, item):  # pylint: disable=C0111
+        # One DockerImage per repo:tag, same as rows of 'docker images'
+        repotags = item.get('RepoTags') or []
+        if not repotags:
+            # Untagged but pulled by digest lists as '<repo> <none>'
+            repotags = ["%s:<none>" % digest.split('@', 1)[0]
+                        for digest in item.get('RepoDigests') or []]
+        if not repotags:
+            repotags = ['<none>:<none>']
+        size = docker_daemon.human_size(item.get('VirtualSize',
+                                                 item.get('Size', 0)))
+        created = docker_daemon.human_since(item['Created'])
+        dis = []
+        for repotag in repotags:
+            repo, _, tag = repotag.rpartition(':')
+            if not repo or '/' in tag:  # colon was a registry port
+                repo, tag = repotag, None
+            dis.append(cls.DICLS(TextTable.value_filter(repo),
+                                 TextTable.value_filter(tag),
+                                 item['Id'], created, size))
+        return dis
+
+    @property
+    def api_client(self):
+        """
+        Represent pooled connections to docker daemon used by ``api`` backend
+        """
+        return docker_daemon.socket_client(self.docker_socket)
+
+    @property
+    def json_format(self):
+        """
+        Represent whether ``cli`` backend lists with ``--format '{{json .}}'``
+        """
+        return docker_daemon.listing_format(self.subtest.config['docker_path'],
+                                            self.listing_format) == 'json'
+
+    @property
+    def listing_cache(self):
+        """
+        Represent subtest's ``listcache.ListingCache``, None when disabled
+        """
+        if self.cache_ttl <= 0:
+            return None
+        return listcache.for_subtest(self.subtest)
+
+    def snapshot(self):
+        """
+        Return current ``listcache.Snapshot`` of images, listing if expired
+
+        :raises ValueError: if caching is disabled (``cache_ttl`` is 0)
+        """
+        cache = self.listing_cache
+        if cache is None:
+            raise ValueError("Listing cache disabled")
+        # Subclasses can produce different DockerImage-likes
+        key = (self.__class__, self.backend, self.images_args)
+        return cache.snapshot(key, self.cache_ttl, self.get_dockerimages_list)
+
     def docker_cmd(self, cmd, timeout=None):
         """
         Called on to execute the docker command cmd with timeout.
@@ -394,6 +562,10 @@ class DockerImages(object):
         except CmdError, detail:
             raise DockerCommandError(detail.command, detail.result_obj,
                                      additional_text=detail.additional_text)
+        finally:
+            # Even failed commands may have changed something
+            if listcache.is_mutating(cmd):
+                listcache.invalidate()
 
     def docker_cmd_check(self, cmd, timeout=None):
         """
@@ -427,7 +599,7 @@ class DockerImages(object):
             _name = "%s_%s_%%s" % (self.subtest.__class__.__name__, prefix)
         else:
             _name = "%s_%%s" % self.subtest.__class__.__name__
-        all_images = self.list_imgs_full_name()
+        all_images = set(self.list_imgs_full_name())
         if suffix:
             _name += suffix
         for _ in xrange(1000):
@@ -451,16 +623,35 @@ class DockerImages(object):
 
     def get_dockerimages_list(self):
         """
-        Retrieve list of images using docker CLI
+        Retrieve list of images using docker CLI (or daemon API)
 
         :note:  This is probably not the method you're looking for,
                 try ``list_imgs()`` instead.
 
         :return: Opaque value, do not use
         """
+        if self.backend == 'api':
+            images_args = self.images_args.split()
+            all_images = '--all' in images_args or '-a' in images_args
+            dis = self.DILCLS()
+            for item in self.api_client.images(all_images=all_images):
+                dis += self._dis_from_json(item)
+            return dis
+        if self.json_format:
+            cmdresult = self.docker_cmd("images %s --format '{{json .}}'"
+                                        % self.images_args, self.timeout)
+            return self.DILCLS(
+                self._parse_json_lines(cmdresult.stdout.strip()))
         cmdresult = self.docker_cmd("images %s" % self.images_args,
                                     self.timeout)
-        return self._parse_columns(cmdresult.stdout.strip())
+        return self.DILCLS(self._parse_columns(cmdresult.stdout.strip()))
+
+    # private methods don't need docstrings
+    def _indexed(self):  # pylint: disable=C0111
+        # Shared snapshot when cached, callers must not modify it
+        if self.cache_ttl > 0:
+            return self.snapshot().items
+        return self.get_dockerimages_list()
 
     @staticmethod
     def filter_list_full_name(image_list, full_name=None):
@@ -477,7 +668,11 @@ class DockerImages(object):
         :return: Iterable container-like of DockerImage-like instances
         """
 
-        return [di for di in image_list if di.cmp_greedy_full_name(full_name)]
+        if isinstance(image_list, DockerImageList):
+            return image_list.with_full_name(full_name)
+        # Don't re-split full_name for every item
+        components = DockerImage.split_to_component(full_name)
+        return [di for di in image_list if di.cmp_greedy(*components)]
 
     @staticmethod
     def filter_list_by_components(image_list, repo=None, tag=None,
@@ -499,6 +694,8 @@ class DockerImages(object):
                  instances
         """
 
+        if isinstance(image_list, DockerImageList):
+            return image_list.with_components(repo, tag, repo_addr, user)
         return [di for di in image_list if di.cmp_greedy(repo, tag,
                                                          repo_addr, user)]
 
@@ -506,10 +703,12 @@ class DockerImages(object):
         """
         Return a python-list of DockerImage-like instances
 
-        :return: **possibly overlapping**
+        :return: **possibly overlapping** ``DILCLS`` instance,
                  [DockerImage-like, DockerImage-like, ...]
         """
 
+        if self.cache_ttl > 0:
+            return self.snapshot().items.copy()
         return self.get_dockerimages_list()
 
     def list_imgs_full_name(self):
@@ -543,8 +742,7 @@ class DockerImages(object):
                  on full_name (FQIN)
         """
 
-        dis = self.list_imgs()
-        return [di for di in dis if di.cmp_greedy_full_name(full_name)]
+        return self._indexed().with_full_name(full_name)
 
     # Extra verbosity in name is needed here
     # pylint: disable=C0103
@@ -561,8 +759,7 @@ class DockerImages(object):
                  on FQIN components.
         """
 
-        dis = self.list_imgs()
-        return [di for di in dis if di.cmp_greedy(repo, tag, repo_addr, user)]
+        return self._indexed().with_components(repo, tag, repo_addr, user)
 
     def list_imgs_with_image_id(self, image_id):
         """
@@ -574,8 +771,7 @@ class DockerImages(object):
                  on FQIN components.
         """
 
-        dis = self.list_imgs()
-        return [di for di in dis if di.cmp_id(image_id)]
+        return self._indexed().with_image_id(image_id)
 
     def remove_image_by_id(self, image_id):
         """
@@ -9,6 +9,7 @@ import sys
 import tempfile
 import types
 import unittest
+import json
 
 
 def mock(mod_path):
@@ -36,6 +37,28 @@ class FakeCmdResult(object):
         for key, val in dargs.items():
             setattr(self, key, val)
 
+# Same images as the table run() returns, as --format '{{json .}}' lines
+FORMAT_JSON = "\n".join([json.dumps({
+    "Repository": repo, "Tag": tag, "ID": long_id, "Digest": "<none>",
+    "CreatedAt": "2014-03-26 13:42:42 +0000 UTC",
+    "CreatedSince": "5 weeks ago", "Size": size, "VirtualSize": size})
+    for repo, tag, long_id, size in [
+        ("192.168.122.245:5000/fedora", "32", "0d20aec6529d5d396b195182c0eaa82b"
+         "fe014c3e82ab390203ed56a774d2c404", "387 MB"),
+        ("fedora", "32", "0d20aec6529d5d396b195182c0eaa82b"
+         "fe014c3e82ab390203ed56a774d2c404", "387 MB"),
+        ("fedora", "rawhide", "0d20aec6529d5d396b195182c0eaa82b"
+         "fe014c3e82ab390203ed56a774d2c404", "387 MB"),
+        ("192.168.122.245:5000/fedora", "latest",
+         "58394af373423902a1b97f209a31e377"
+         "7932d9321ef10e64feaaa7b4df609cf9", "385.5 MB"),
+        ("fedora", "20", "58394af373423902a1b97f209a31e377"
+         "7932d9321ef10e64feaaa7b4df609cf9", "385.5 MB"),
+        ("fedora", "heisenbug", "58394af373423902a1b97f209a31e377"
+         "7932d9321ef10e64feaaa7b4df609cf9", "385.5 MB"),
+        ("fedora", "latest", "58394af373423902a1b97f209a31e377"
+         "7932d9321ef10e64feaaa7b4df609cf9", "385.5 MB")]])
+
 RUN_CACHE = []
 
 
@@ -52,6 +75,12 @@ def kill_run_cache():
 def run(command, *args, **dargs):
     command = "%s" % (command)
     get_run_cache().append({'command': command, 'args': args, 'dargs': dargs})
+    if '--format' in command:
+        return FakeCmdResult(command=command.strip(),
+                             stdout=FORMAT_JSON,
+                             stderr=str(dargs),
+                             exit_status=len(args),
+                             duration=len(dargs))
     return FakeCmdResult(command=command.strip(),
                          stdout="""
 REPOSITORY                    TAG                 IMAGE ID                                                           CREATED             VIRTUAL SIZE
@@ -84,6 +113,7 @@ mock('autotest.client.shared.utils')
 mock('autotest.client.job')
 
 import version
+from fakedaemon import FakeDaemon
 
 
 class ImageTestBase(unittest.TestCase):
@@ -171,7 +201,8 @@ class DockerImageTestBasic(ImageTestBase):
     defaults = {'docker_path': '/foo/bar', 'docker_options': '--not_exist',
                 'docker_timeout': 60.0, 'docker_repo_name': 'fedora',
                 'docker_repo_tag': 'latest', 'docker_registry_host': '192.168.122.245:5000',
-                'docker_registry_user': '', 'preserve_fqins': 'fedora:32, fedora:heisenbug'}
+                'docker_registry_user': '', 'preserve_fqins': 'fedora:32, fedora:heisenbug',
+                'listing_format': 'table'}
     customs = {}
     config_section = "Foo/Bar/Baz"
 
@@ -395,6 +426,22 @@ class DockerImageTestBasic(ImageTestBase):
                          "/foo/bar rmi %s" % img_id)
 
 
+    def test_indexed_matches_greedy(self):
+        d = self.images.DockerImages(self.fake_subtest)
+        all_images = d.list_imgs()
+        self.assertTrue(isinstance(all_images, self.images.DockerImageList))
+        plain = list(all_images)
+        for full_name in ('fedora', 'fedora:latest', 'fedora:32',
+                          '192.168.122.245:5000/fedora',
+                          '192.168.122.245:5000/fedora:latest',
+                          'user/fedora:32', 'centos'):
+            exp = [di for di in plain if di.cmp_greedy_full_name(full_name)]
+            self.assertEqual(all_images.with_full_name(full_name), exp)
+            flfn = self.images.DockerImages.filter_list_full_name
+            self.assertEqual(flfn(plain, full_name), exp)
+        self.assertEqual(all_images.with_components(tag='32'),
+                         [di for di in plain if di.tag == '32'])
+
     def test_docker_images_lowlevel(self):
         images = self.images.DockerImages(self.fake_subtest)
 
@@ -422,5 +469,138 @@ class DockerImageTestBasic(ImageTestBase):
         self.assertEqual(cleaned_names, expected)
         self.assertTrue(cleaned_names.isdisjoint(preserve))
 
+
+class DockerImagesCacheTest(DockerImageTestBasic):
+
+    # Everything in DockerImageTestBasic must also pass with cache enabled
+    def setUp(self):
+        super(DockerImagesCacheTest, self).setUp()
+        self.fake_subtest.config['listing_cache_ttl'] = 60
+
+    @staticmethod
+    def listings():
+        return len([item for item in get_run_cache()
+                    if item['command'].find(' images ') > -1])
+
+    def test_cached(self):
+        d = self.images.DockerImages(self.fake_subtest)
+        kill_run_cache()
+        all_images = d.list_imgs()
+        self.assertEqual(len(d.list_imgs_with_image_id(
+            all_images[0].long_id)), 3)
+        self.assertEqual(len(d.list_imgs_with_image_id(
+            all_images[0].short_id)), 3)
+        self.assertEqual(d.list_imgs_with_image_id('not_exist'), [])
+        self.assertEqual(len(d.list_imgs_full_name()), 7)
+        self.assertEqual(self.listings(), 1)
+        self.assertEqual(d.listing_cache.hits, 4)
+        d.remove_image_by_full_name('fedora:rawhide')
+        d.list_imgs()
+        self.assertEqual(self.listings(), 2)
+
+
+class DockerImagesFormatTest(DockerImageTestBasic):
+
+    # Everything in DockerImageTestBasic must also pass with json listings
+    def setUp(self):
+        super(DockerImagesFormatTest, self).setUp()
+        self.fake_subtest.config['listing_format'] = 'json'
+
+    def test_format_command(self):
+        d = self.images.DockerImages(self.fake_subtest)
+        self.assertTrue(d.json_format)
+        kill_run_cache()
+        d.list_imgs()
+        self.assertEqual(get_run_cache()[0]['command'],
+                         "/foo/bar images --no-trunc --format '{{json .}}'")
+
+    def test_same_as_table(self):
+        from_json = self.images.DockerImages(self.fake_subtest).list_imgs()
+        self.fake_subtest.config['listing_format'] = 'table'
+        from_table = self.images.DockerImages(self.fake_subtest).list_imgs()
+        self.assertEqual(len(from_json), len(from_table))
+        for json_di, table_di in zip(from_json, from_table):
+            self.assertEqual(json_di, table_di)
+            self.assertEqual(json_di.created, table_di.created)
+            self.assertEqual(json_di.size, table_di.size)
+
+    def test_none_values(self):
+        di = self.images.DockerImages._di_from_format(
+            {"Repository": "<none>", "Tag": "<none>", "ID": "sha256:abcd",
+             "CreatedSince": "2 days ago", "Size": "1 MB"})
+        self.assertEqual(di.repo, None)
+        self.assertEqual(di.tag, None)
+        self.assertEqual(di.size, "1 MB")
+
+
+class DockerImagesAPITest(ImageTestBase):
+
+    defaults = DockerImageTestBasic.defaults
+    images_json = [
+        {"Id": "sha256:0d20aec6529d5d396b195182c0eaa82b"
+               "fe014c3e82ab390203ed56a774d2c404",
+         "RepoTags": ["192.168.122.245:5000/fedora:32", "fedora:32"],
+         "Created": 1490000000,
+         "Size": 387000000,
+         "VirtualSize": 387000000},
+        {"Id": "sha256:58394af373423902a1b97f209a31e377"
+               "7932d9321ef10e64feaaa7b4df609cf9",
+         "RepoTags": None,
+         "RepoDigests": ["docker.io/fedora@sha256:abcdef"],
+         "Created": 1490000001,
+         "Size": 385500000},
+        {"Id": "sha256:1111111111111111111111111111111"
+               "111111111111111111111111111111111",
+         "RepoTags": ["<none>:<none>"],
+         "Created": 1490000002,
+         "Size": 12}]
+
+    def setUp(self):
+        super(DockerImagesAPITest, self).setUp()
+        self.sockdir = tempfile.mkdtemp(self.__class__.__name__)
+        self.sockpath = os.path.join(self.sockdir, 'docker.sock')
+        self.daemon = FakeDaemon(self.sockpath,
+                                 {'/images/json': self.images_json})
+        self.dis = self.images.DockerImages(self.fake_subtest)
+        self.dis.backend = 'api'
+        self.dis.docker_socket = self.sockpath
+        kill_run_cache()
+
+    def tearDown(self):
+        self.dis.api_client.close()
+        self.daemon.stop()
+        shutil.rmtree(self.sockdir, ignore_errors=True)
+        super(DockerImagesAPITest, self).tearDown()
+
+    def test_list(self):
+        all_images = self.dis.list_imgs()
+        self.assertEqual(get_run_cache(), [])  # Nothing forked
+        self.assertEqual([di.full_name for di in all_images],
+                         ['192.168.122.245:5000/fedora:32', 'fedora:32',
+                          'docker.io/fedora', ''])
+        self.assertEqual(all_images[0].repo_addr, '192.168.122.245:5000')
+        self.assertEqual(all_images[0].tag, '32')
+        self.assertEqual(all_images[0].size, '387 MB')
+        self.assertEqual(all_images[1].short_id, '0d20aec6529d')
+        self.assertEqual(all_images[2].tag, None)
+        self.assertEqual(all_images[2].size, '385.5 MB')
+        self.assertEqual(all_images[3].repo, None)
+        self.assertEqual(all_images[3].size, '12 B')
+        # Same relative string as the CLI backends, not the API's epoch
+        self.assertTrue(all_images[0].created.endswith(' years ago'))
+
+    def test_all(self):
+        self.dis.list_imgs()
+        self.assertTrue(self.daemon.requests[-1].endswith('all=0'))
+        self.dis.images_args += " --all"
+        self.dis.list_imgs()
+        self.assertTrue(self.daemon.requests[-1].endswith('all=1'))
+
+    def test_keepalive(self):
+        for _ in xrange(5):
+            self.dis.list_imgs_full_name()
+        self.assertEqual(len(self.daemon.requests), 5)
+        self.assertEqual(self.daemon.connections, 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,255 @@
+"""
+Indexed listings and per-subtest snapshots of container and image listings
+
+Listing containers or images forks a docker client (or queries the daemon),
+so helpers which only need to find one entry by name or ID are expensive.
+Listings are returned as ``IndexedList`` subclasses, which find items by
+hash lookups instead of linear scans.  When enabled by the
+``listing_cache_ttl`` option, ``DockerContainers`` and ``DockerImages``
+also keep the most recent listing here, so its indexes are reused.
+A snapshot is reused until it is older than the TTL, or the process-wide
+generation number changes.  The generation is bumped by every docker command
+in ``MUTATING_SUBCOMMANDS`` run through ``DockerCmd``, ``DockerContainers``,
+or ``DockerImages``.  Changes made any other way (e.g. ``utils.run()``) are
+only noticed once the TTL expires.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import threading
+import time
+import weakref
+
+
+#: Docker subcommands which may add, remove, rename, or change the status of
+#: containers or images, also following a ``MANAGEMENT_COMMANDS`` item.
+MUTATING_SUBCOMMANDS = frozenset(('attach', 'build', 'commit', 'create',
+                                  'import', 'kill', 'load', 'pause', 'prune',
+                                  'pull', 'rename', 'restart', 'rm', 'rmi',
+                                  'run', 'start', 'stop', 'tag', 'unpause',
+                                  'update', 'wait'))
+
+#: Docker management commands, followed by the actual subcommand
+#: (e.g. ``container rm``) which could change containers or images.
+MANAGEMENT_COMMANDS = frozenset(('container', 'image', 'system'))
+
+_LOCK = threading.Lock()
+
+_GENERATION = 0
+
+# One ListingCache per subtest instance, gone with the subtest
+_CACHES = weakref.WeakKeyDictionary()
+
+
+def generation():
+    """
+    Return the current listing generation number
+    """
+    return _GENERATION
+
+
+def invalidate():
+    """
+    Expire all snapshots, call after anything changes containers or images
+    """
+    global _GENERATION  # pylint: disable=W0603
+    with _LOCK:
+        _GENERATION += 1
+
+
+def is_mutating(subcmd):
+    """
+    Return True if docker subcommand string may change a listing
+
+    :param subcmd: Subcommand or fully-formed option/argument string
+    """
+    words = str(subcmd).split()
+    if not words:
+        return False
+    if words[0] in MANAGEMENT_COMMANDS:
+        words = words[1:]
+        if not words:
+            return False  # Only prints usage
+    # Can't tell which word is the subcommand, assume the worst
+    if words[0].startswith('-'):
+        return True
+    return words[0] in MUTATING_SUBCOMMANDS
+
+
+def for_subtest(subtest):
+    """
+    Return the ``ListingCache`` belonging to subtest, creating if necessary
+
+    :param subtest: A subtest.SubBase or subclass instance
+    """
+    with _LOCK:
+        cache = _CACHES.get(subtest)
+        if cache is None:
+            cache = _CACHES[subtest] = ListingCache()
+        return cache
+
+
+def peek(subtest):
+    """
+    Return the ``ListingCache`` belonging to subtest, or None if never used
+
+    :param subtest: A subtest.SubBase or subclass instance
+    """
+    with _LOCK:
+        return _CACHES.get(subtest)
+
+
+class IndexedList(list):
+
+    """
+    Python-list with lazily-built hash indexes, dropped on any modification
+
+    :param iterable: Optional items to initialize list with
+    """
+
+    #: Mapping of index name to callable returning an item's hashable key
+    index_keys = {}
+
+    def __init__(self, iterable=()):
+        super(IndexedList, self).__init__(iterable)
+        self._indexes = {}
+
+    def copy(self):
+        """
+        Return a shallow copy, sharing any indexes already built
+        """
+        other = self.__class__(self)
+        # Modifications replace, never update, the dictionary
+        other._indexes = self._indexes  # pylint: disable=W0212
+        return other
+
+    def key_index(self, name):
+        """
+        Return dict of key to python-list of items, built on first use
+
+        :param name: Name of index, a key of ``index_keys``
+        """
+        indexes = self._indexes
+        index = indexes.get(name)
+        if index is None:
+            # Worst-case two threads build the same index, last one wins
+            keyfunc = self.index_keys[name]
+            index = {}
+            for item in self:
+                index.setdefault(keyfunc(item), []).append(item)
+            indexes[name] = index
+        return index
+
+    def lookup(self, name, key):
+        """
+        Return python-list of items (in list order) having key in index name
+
+        :param name: Name of index, a key of ``index_keys``
+        :param key: Value to look up
+        """
+        return list(self.key_index(name).get(key, []))
+
+    def lookup_all(self, **keys):
+        """
+        Return python-list of items (in list order) matching every non-None
+        index name=key pair
+
+        :param keys: Mapping of index name to key, None values are ignored
+        """
+        keys = dict([(name, key) for name, key in keys.items()
+                     if key is not None])
+        if not keys:
+            return list(self)
+        matches = None
+        for name, key in keys.items():
+            found = self.key_index(name).get(key, [])
+            # Narrowest match first, then filter it by the rest
+            if matches is None or len(found) < len(matches):
+                matches = found
+        if not matches:
+            return []
+        keyfuncs = [(self.index_keys[name], key)
+                    for name, key in keys.items()]
+        return [item for item in matches
+                if all([keyfunc(item) == key for keyfunc, key in keyfuncs])]
+
+
+def _drops_indexes(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **dargs):  # pylint: disable=C0111
+        self._indexes = {}  # pylint: disable=W0212
+        return method(self, *args, **dargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for _name in ('__delitem__', '__delslice__', '__iadd__', '__imul__',
+              '__setitem__', '__setslice__', 'append', 'extend', 'insert',
+              'pop', 'remove', 'reverse', 'sort'):
+    setattr(IndexedList, _name, _drops_indexes(_name))
+
+
+class Snapshot(object):
+
+    """
+    Listing captured at a generation
+
+    :param items: ``IndexedList`` of DockerContainer-like or
+                  DockerImage-like instances
+    :param gen: Generation number in effect before items were listed
+    """
+
+    def __init__(self, items, gen):
+        self.items = items
+        self.generation = gen
+        self.timestamp = time.time()
+
+
+class ListingCache(object):
+
+    """
+    Snapshots of listings for one subtest, with hit/miss counters
+    """
+
+    def __init__(self):
+        self.snapshots = {}
+        #: Number of listings answered from a snapshot (forks saved)
+        self.hits = 0
+        #: Number of listings actually retrieved
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return "%d hits, %d misses" % (self.hits, self.misses)
+
+    def snapshot(self, key, ttl, fetch):
+        """
+        Return current ``Snapshot`` for key, calling fetch() if expired
+
+        :param key: Hashable identifying listing kind and options
+        :param ttl: Maximum snapshot age in seconds
+        :param fetch: Callable returning a fresh ``IndexedList`` of items
+        """
+        gen = generation()
+        with self._lock:
+            snap = self.snapshots.get(key)
+            if (snap is not None and snap.generation == gen and
+                    time.time() - snap.timestamp < ttl):
+                self.hits += 1
+                return snap
+            self.misses += 1
+        # Don't hold lock while forking, a concurrent change during
+        # fetch() leaves this snapshot with an already stale generation.
+        snap = Snapshot(fetch(), gen)
+        with self._lock:
+            self.snapshots[key] = snap
+        return snap
+
+    def clear(self):
+        """
+        Forget all snapshots, counters are unaffected
+        """
+        with self._lock:
+            self.snapshots.clear()
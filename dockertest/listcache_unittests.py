@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import time
+import unittest
+
+
+class FakeSubtest(object):
+    pass
+
+
+class ListCacheTestBase(unittest.TestCase):
+
+    def setUp(self):
+        import listcache
+        self.listcache = listcache
+        self.fetches = 0
+
+    def tearDown(self):
+        del self.listcache
+
+    def fetch(self):
+        self.fetches += 1
+        return self.listcache.IndexedList(['foo', 'bar', 'baz'])
+
+
+class ListCacheTest(ListCacheTestBase):
+
+    def test_is_mutating(self):
+        is_mutating = self.listcache.is_mutating
+        self.assertTrue(is_mutating('rm --force foo'))
+        self.assertTrue(is_mutating('run'))
+        self.assertTrue(is_mutating('--debug inspect foo'))
+        self.assertFalse(is_mutating('inspect foo'))
+        self.assertFalse(is_mutating('ps -a'))
+        self.assertFalse(is_mutating(''))
+
+    def test_is_mutating_management(self):
+        is_mutating = self.listcache.is_mutating
+        for subcmd in ('container rm foo', 'container run busybox',
+                       'container create busybox', 'container kill foo',
+                       'container stop foo', 'container prune --force',
+                       'image rm foo', 'image tag foo bar', 'image pull foo',
+                       'image prune -a', 'system prune --force',
+                       'container --help'):
+            self.assertTrue(is_mutating(subcmd), subcmd)
+        for subcmd in ('container ls -a', 'container inspect foo',
+                       'image ls', 'image inspect foo', 'system df',
+                       'system info', 'container', 'network rm foo'):
+            self.assertFalse(is_mutating(subcmd), subcmd)
+
+    def test_for_subtest(self):
+        subtest = FakeSubtest()
+        other = FakeSubtest()
+        self.assertEqual(self.listcache.peek(subtest), None)
+        cache = self.listcache.for_subtest(subtest)
+        self.assertTrue(self.listcache.for_subtest(subtest) is cache)
+        self.assertTrue(self.listcache.peek(subtest) is cache)
+        self.assertFalse(self.listcache.for_subtest(other) is cache)
+
+    def test_hit_miss(self):
+        cache = self.listcache.ListingCache()
+        snap = cache.snapshot('key', 60, self.fetch)
+        self.assertTrue(cache.snapshot('key', 60, self.fetch) is snap)
+        cache.snapshot('other', 60, self.fetch)
+        self.assertEqual(self.fetches, 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertEqual(str(cache), "1 hits, 2 misses")
+
+    def test_invalidate(self):
+        cache = self.listcache.ListingCache()
+        cache.snapshot('key', 60, self.fetch)
+        self.listcache.invalidate()
+        cache.snapshot('key', 60, self.fetch)
+        self.assertEqual(self.fetches, 2)
+
+    def test_ttl(self):
+        cache = self.listcache.ListingCache()
+        cache.snapshot('key', 0.01, self.fetch)
+        time.sleep(0.02)
+        cache.snapshot('key', 0.01, self.fetch)
+        self.assertEqual(self.fetches, 2)
+
+
+class IndexedListTest(ListCacheTestBase):
+
+    def setUp(self):
+        super(IndexedListTest, self).setUp()
+
+        class WordList(self.listcache.IndexedList):
+            index_keys = {'first': lambda word: word[0],
+                          'last': lambda word: word[-1]}
+
+        self.words = WordList(['foo', 'bar', 'baz', 'bob'])
+
+    def test_lookup(self):
+        self.assertEqual(self.words.lookup('first', 'b'),
+                         ['bar', 'baz', 'bob'])
+        self.assertEqual(self.words.lookup('first', 'x'), [])
+        # Returned list is a copy
+        self.words.lookup('first', 'b').pop()
+        self.assertEqual(self.words.lookup('first', 'b'),
+                         ['bar', 'baz', 'bob'])
+        self.assertRaises(KeyError, self.words.lookup, 'middle', 'a')
+
+    def test_lookup_all(self):
+        self.assertEqual(self.words.lookup_all(first='b', last='b'),
+                         ['bob'])
+        self.assertEqual(self.words.lookup_all(first='f', last='b'), [])
+        self.assertEqual(self.words.lookup_all(first=None, last='z'),
+                         ['baz'])
+        self.assertEqual(self.words.lookup_all(), self.words)
+
+    def test_modify(self):
+        self.assertEqual(self.words.lookup('last', 'z'), ['baz'])
+        self.words.append('fez')
+        self.assertEqual(self.words.lookup('last', 'z'), ['baz', 'fez'])
+        self.words[1] = 'biz'
+        self.assertEqual(self.words.lookup('last', 'z'), ['biz', 'baz', 'fez'])
+        del self.words[1:3]
+        self.assertEqual(self.words.lookup('last', 'z'), ['fez'])
+        self.words += ['zoz']
+        self.assertEqual(self.words.lookup('last', 'z'), ['fez', 'zoz'])
+
+    def test_copy(self):
+        self.words.lookup('first', 'b')
+        other = self.words.copy()
+        self.assertEqual(other, self.words)
+        self.assertTrue(isinstance(other, self.words.__class__))
+        other.pop()
+        self.assertEqual(other.lookup('first', 'b'), ['bar', 'baz'])
+        self.assertEqual(self.words.lookup('first', 'b'),
+                         ['bar', 'baz', 'bob'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,4 +11,7 @@ from . texttable import TextTable, ColumnRanges
 from . validate import OutputGood, OutputGoodBase, OutputNotBad
 from . validate import wait_for_output, mustpass, mustfail
 from . unseenlines import UnseenLines, UnseenlineMatchTimeout, UnseenlineMatch
+from . unseenlines import UnseenLinesPoller
 from . unseenlines import UnseenlineMatchPeek, NoUnseenlineMatch
+from . dockerevents import parse_event, parse_events, events_by_id
+from . dockerevents import is_dupe_event, event_object
@@ -0,0 +1,181 @@
+# coding: utf-8
+"""
+Parse ``docker events`` output, in both docker < 1.10 and later formats
+"""
+
+import re
+from dockertest.xceptions import DockerValueError
+from . dockertime import DockerTime
+
+
+#: Regular expression fragments for event line components.  The ``fqin``
+#: value is filled in from ``DockerImage.repo_split_p`` on first use
+#: (the images module imports this package).
+regexes = {
+    'timestamp': r'[\d-]+T[\d:]+\.\d+([+-][\d:]+|Z)',  # <iso8601>.<µs><TZ>
+                                                       # TZ='[+/-]HH:MM' or 'Z'
+    'cid':       r'(sha256:)?[0-9a-fA-F]{64}',         # 64-char hash
+    'fqin':      None,                                 # eg some.repo/image:tag
+    'operation': r'[\w-]+',                            # eg create, attach
+    'source':    r'\S+'                                # canonical image name
+}
+
+# Compiled on first use, by _event_re()
+_EVENT_RES = {}
+
+
+def _event_re(name):
+    if not _EVENT_RES:
+        from dockertest.images import DockerImage
+        if regexes['fqin'] is None:
+            regexes['fqin'] = DockerImage.repo_split_p.pattern
+        # eg <timestamp> container start <sha> (details)
+        _EVENT_RES['110'] = re.compile(
+            r'^(?P<timestamp>{timestamp})'
+            r'\s+(?P<object>\w+)'
+            r'\s+(?P<operation>{operation})'
+            r'\s+(?P<identifier>{cid}|{fqin})'
+            r'\s+\((?P<rest>.*)\)'.format(**regexes))
+        _EVENT_RES['110_source'] = re.compile(
+            r'(^|\s)image=(?P<image>\S+)(,|$)')
+        # eg <timestamp> <sha> (from <source>) start
+        _EVENT_RES['109'] = re.compile(
+            r'^(?P<timestamp>{timestamp})'
+            r'\s+(?P<identifier>{cid}|{fqin}):'
+            r'(\s+\(from (?P<source>{source})\))?'
+            r'\s+(?P<operation>{operation})'.format(**regexes))
+    return _EVENT_RES[name]
+
+
+def is_dupe_event(needle, haystack):
+    """
+    Return True if event details needle is already in haystack list
+    """
+    for event in haystack:
+        # Fastest comparison order
+        if (needle['datetime'] == event['datetime'] and
+                needle['source'] == event['source'] and
+                needle['operation'] == event['operation']):
+            return True
+    return False
+
+
+def parse_event_docker_110(line):
+    """
+    Try to parse input as a docker 1.10 event
+    """
+    mobj = _event_re('110').match(line)
+    if mobj is None:
+        return None
+
+    # Matched! Extract the positional fields, then try looking for source img
+    details = {
+        'datetime':   DockerTime(mobj.group('timestamp')),
+        'identifier': mobj.group('identifier'),
+        'object':     mobj.group('object'),
+        'operation':  mobj.group('operation'),
+        'source':     None,
+    }
+    # TODO: (maybe): split out components of the parenthesized list.
+    # If so, keep in mind that you can't just split on commas (because
+    # of "Red Hat, Inc.") and that the fields are output in unpredictable
+    # order: even two consecutive event lines will have different ordering.
+    mobj2 = _event_re('110_source').search(mobj.group('rest'))
+    if mobj2 is not None:
+        details['source'] = mobj2.group('image')
+    return details
+
+
+def parse_event_docker_109(line):
+    """
+    Try to parse input as a docker < 1.10 event
+    """
+    mobj = _event_re('109').match(line)
+    if mobj is not None:
+        return {
+            'datetime':   DockerTime(mobj.group('timestamp')),
+            'identifier': mobj.group('identifier'),
+            'source':     mobj.group('source'),
+            'operation':  mobj.group('operation'),
+        }
+    return None
+
+
+def parse_event(line):
+    """
+    Return {DETAILS} from parsing line
+
+    :param line: String-like containing a single event line
+    :returns: {DETAILS} from parsing line or None if unparseable
+    """
+    details = parse_event_docker_110(line)
+    if details is None:
+        details = parse_event_docker_109(line)
+    return details
+
+
+def event_object(details):
+    """
+    Return 'container', 'image', or other object type of parsed event details
+
+    :param details: {DETAILS} as returned from ``parse_event()``
+    """
+    if 'object' in details:
+        return details['object']
+    # docker < 1.10 only reports an image source for container events
+    if details['source'] is not None:
+        return 'container'
+    return 'image'
+
+
+def parse_events(lines, slop=None):
+    """
+    Return list of tuples for valid lines returned by parse_events()
+
+    :param lines: String containing events, one per line
+    :param slop: number of unparseable lines to tolerate, None/- to disable
+    :returns: List of tuple(CID, {DETAILS}) as returned from parse_events()
+    """
+    sloppy = []
+    result = []
+    n_lines = 0
+    for line in lines.splitlines():
+        n_lines += 1
+        cid_details = parse_event(line)
+        if cid_details is not None:
+            result.append((cid_details['identifier'], cid_details))
+        else:
+            sloppy.append(line)
+        if slop is not None and slop >= 0:
+            n_slop = len(sloppy)
+            if n_slop > slop:
+                raise DockerValueError("Excess slop (>%d) encountered after "
+                                       "parsing (%d) events (success on %d). "
+                                       " Garbage: %s"
+                                       % (slop, n_lines, n_lines - n_slop,
+                                          sloppy))
+    return result
+
+
+def events_by_id(events_list, previous=None):
+    """
+    Return a dictionary, mapping of CID or FQIN to de-duplicated details list
+
+    :param events_list: List of tuple(CID/FQIN, {DETAILS}) from parse_events()
+    :param previous: Possibly overlapping prior result from events_by_id()
+    :returns: dict-like mapping CID/FQIN to de-duplicated event-details list
+    """
+    if previous is None:
+        dct = {}
+    else:
+        dct = previous  # in-place update
+    for _id, details in events_list:
+        previous_events = dct.get(_id)
+        if previous_events is None:
+            previous_events = dct[_id] = []  # in-place update (below)
+        if not is_dupe_event(details, previous_events):
+            # don't assume it belongs at end
+            previous_events.append(details)
+            # using key is faster then custom compare function
+            previous_events.sort(key=lambda details: details['datetime'])
+    return dct  # possibly same as previous
@@ -7,18 +7,62 @@ Handlers for docker version parsing
 
 import re
 import subprocess
+import threading
 from autotest.client import utils
 from dockertest.xceptions import DockerOutputError, DockerTestNAError
 from dockertest.version import LooseVersion
 
 
+#: Private, process-wide ``docker version`` output strings, keyed by
+#: ``(docker_path, docker_options)``.  Cleared by ``invalidate()``.
+_VERSION_STRINGS = {}
+
+#: Private, protects ``_VERSION_STRINGS``
+_VERSION_STRINGS_LOCK = threading.Lock()
+
+
+def cached_version_string(docker_path=None, docker_options=None):
+    """
+    Return (cached) ``docker version`` output for client at docker_path
+
+    :param docker_path: Docker client executable, None for ``docker``
+    :param docker_options: Space-separated global client options, or None
+    :raises subprocess.CalledProcessError: if docker version fails (not cached)
+    """
+    if docker_path is None:
+        docker_path = 'docker'
+    if docker_options is None:
+        docker_options = ''
+    key = (docker_path, docker_options.strip())
+    with _VERSION_STRINGS_LOCK:
+        cached = _VERSION_STRINGS.get(key)
+        if cached is None:
+            command = " ".join([part for part in key if part] + ['version'])
+            cached = subprocess.check_output(command, shell=True,
+                                             close_fds=True)
+            _VERSION_STRINGS[key] = cached
+        return cached
+
+
+def invalidate():
+    """
+    Forget all cached ``docker version`` output, e.g. after daemon restarts
+    """
+    with _VERSION_STRINGS_LOCK:
+        _VERSION_STRINGS.clear()
+    DockerVersion._has_distinct_exit_codes = None
+
+
 class DockerVersion(object):
 
     """
     Parser of docker-cli version command output as client/server properties
 
     :param version_string: Raw, possibly empty or multi-line output
-                           from docker version command.
+                           from docker version command, None to use
+                           ``cached_version_string()``.
+    :param docker_path: Docker client executable, when version_string is None
+    :param docker_options: Global client options, when version_string is None
     """
     #: Raw, possibly empty or multi-line output from docker version command.
     #: Read-only, set in __init__
@@ -32,14 +76,12 @@ class DockerVersion(object):
     _server_info = None
     _has_distinct_exit_codes = None
 
-    def __init__(self, version_string=None, docker_path=None):
-        # If called without an explicit version string, run docker to find out
+    def __init__(self, version_string=None, docker_path=None,
+                 docker_options=None):
+        # If called without an explicit version string, ask (cached) docker
         if version_string is None:
-            if docker_path is None:
-                docker_path = 'docker'
-            version_string = subprocess.check_output(docker_path + ' version',
-                                                     shell=True,
-                                                     close_fds=True)
+            version_string = cached_version_string(docker_path,
+                                                   docker_options)
         self.version_string = version_string
         # FIXME: This should call super(...).__init__(...) (my bad)
 
@@ -248,3 +290,13 @@ class DockerVersion(object):
                 has = (d_run.exit_status > 120)
             DockerVersion._has_distinct_exit_codes = has
         return DockerVersion._has_distinct_exit_codes
+
+    @property
+    def has_json_format(self):
+        """
+        Read-only property, True if client lists with ``--format '{{json .}}'``
+
+        docker-1.13 made listing contexts marshal into complete JSON
+        objects, older clients print ``{}`` or reject the template.
+        """
+        return LooseVersion(self.client) >= LooseVersion('1.13')
@@ -2,6 +2,7 @@
 Parse tabular text output, such as output from 'docker images'
 """
 
+import bisect
 import re
 from collections import Mapping, MutableSet, Sequence
 
@@ -11,6 +12,9 @@ class ColumnRanges(Mapping):
     """
     Immutable map of start/end offsets to/from column names.
 
+    Instances are shared, constructing one with the same parameters as a
+    recent instance returns that instance.
+
     :param header: Table header string of multi-space separated column names
     :param expected: Precise number of columns expected, or raise ValueError
     :param min_col_len: Minimum number of characters for a column header
@@ -20,7 +24,8 @@ class ColumnRanges(Mapping):
     # Too few pub. methods, pylint doesn't count abstract __special_methods__
     # pylint: disable=R0903, W0231
 
-    __slots__ = ('ranges', 'columns', 'count')
+    __slots__ = ('ranges', 'columns', 'count', '_column_of', '_range_of',
+                 '_starts')
 
     #: Iterable of start/end character-offset tuples corresponding to columns
     ranges = None
@@ -31,10 +36,24 @@ class ColumnRanges(Mapping):
     #: Number of columns/ranges
     count = None
 
+    #: Maximum number of instances to remember for re-use
+    cache_size = 128
+
     #: Regex specifying the column separator
     _re = re.compile(r"\s\s+")
 
+    # Mapping of (class, constructor arguments) to instance
+    _instances = {}
+
+    def __new__(cls, header, min_col_len=3, expected=None):
+        instance = cls._instances.get((cls, header, min_col_len, expected))
+        if instance is None:
+            instance = super(ColumnRanges, cls).__new__(cls)
+        return instance
+
     def __init__(self, header, min_col_len=3, expected=None):
+        if self.count is not None:
+            return  # Re-used instance, already initialized
         header_strip = header.strip()  # just in case
         cols = [col for col in self._re.split(header_strip)]
         if expected is not None and len(cols) != expected:
@@ -55,12 +74,20 @@ class ColumnRanges(Mapping):
         self.columns = tuple(columns)
         ranges = zip(starts, ends)  # needed for exception message
         self.ranges = tuple(ranges)
-        self.count = len(columns)  # allow check for duplicates vs set()
         # Check duplicate column names or ranges
-        if (self.count != len(set(self.ranges)) or
-                self.count != len(set(self.columns))):
+        self._column_of = dict(zip(self.ranges, self.columns))
+        self._range_of = dict(zip(self.columns, self.ranges))
+        if (len(columns) != len(self._column_of) or
+                len(columns) != len(self._range_of)):
             raise ValueError("Duplicate column names '%s' or ranges '%s' "
                              "detected: " % (columns, ranges))
+        self._starts = tuple(starts)  # sorted, for bisect
+        # Set last, marks instance as initialized
+        self.count = len(columns)
+        instances = self.__class__._instances
+        if len(instances) >= self.cache_size:
+            instances.clear()  # Simple, and reuse happens within a command
+        instances[(self.__class__, header, min_col_len, expected)] = self
 
     def __str__(self):
         lst = [("%s: %s-%s" % (col, start, end))
@@ -77,16 +104,19 @@ class ColumnRanges(Mapping):
         return self.count  # instance is immutable
 
     def __contains__(self, item):
-        return item in self.ranges or item in self.columns
+        try:
+            return item in self._column_of or item in self._range_of
+        except TypeError:  # Un-hashable
+            return False
 
     def __iter__(self):
         return self.ranges.__iter__()
 
     def __getitem__(self, key):
         try:
-            return self.columns[list(self.ranges).index(key)]
-        except ValueError:
-            return self.ranges[list(self.columns).index(key)]
+            return self._column_of[key]
+        except KeyError:
+            return self._range_of[key]
 
     def offset(self, offset):
         """
@@ -98,13 +128,10 @@ class ColumnRanges(Mapping):
         """
         if offset is None or offset < 0:
             return self.columns[-1]
-        for index, (start, end) in enumerate(self.ranges):
-            if end is None:
-                return self.columns[-1]
-            if offset in xrange(start, end):
-                return self.columns[index]
-        if offset > 0:
-            return self.columns[-1]  # beyond end of any ranges
+        index = bisect.bisect_right(self._starts, offset) - 1
+        if index < 0:  # before first range
+            return self.columns[-1]
+        return self.columns[index]
 
 
 class TextTable(MutableSet, Sequence):
@@ -112,7 +139,12 @@ class TextTable(MutableSet, Sequence):
     """
     Parser for tabular data with values separated by character offsets
 
-    :param table: String of table header, optionally followed by data rows
+    Rows are stored as tuples of column values, in column order.  Indexing
+    or iterating returns a new dictionary of column name to value for each
+    row, so modifying it does not change the table.
+
+    :param table: String of table header, optionally followed by data rows,
+                  or iterable of lines (e.g. an open file).
     :param columnranges: Optional ColumnRanges instance to use
     :param header: Optional header to use, instead of first-line,
                    ignored if columnranges parameter is non-None
@@ -131,9 +163,22 @@ class TextTable(MutableSet, Sequence):
     # internal cache of column name to tuple of start,end offset range
     columnranges = None
 
-    #: internal cache of parsed rows
+    #: internal cache of parsed rows, as tuples of column values
     _rows = None
 
+    # internal count of rows by value tuple, or None when any row has
+    # un-hashable values.
+    _row_counts = None
+
+    # internal cache of column names, in column order
+    _columns = None
+
+    # internal cache of column names set
+    _column_set = None
+
+    # internal cache of start, end offset tuples, in column order
+    _ranges = None
+
     def __init__(self, table, columnranges=None, header=None, tabledata=None):
         # pylint: disable=W0231
         if columnranges is not None and header is not None:
@@ -141,17 +186,26 @@ class TextTable(MutableSet, Sequence):
                              "parameters")
 
         if header is None and tabledata is None:
-            table_lines = table.strip().splitlines()
-            if len(table_lines) < 1:
-                # FIXME: This should probably be a ValueError
-                raise TypeError("Table shorter than one line: %s" % table)
-            header, tabledata = self.parseheader(table)
+            if isinstance(table, basestring):
+                lines = table.splitlines()
+                # Same as strip(), w/o copying table
+                while lines and not lines[-1].strip():
+                    del lines[-1]
+                header = self.first_line(lines)
+                datalines = lines[lines.index(header) + 1:]
+            else:
+                lines = iter(table)
+                header = self.first_line(lines)
+                datalines = self.data_lines(lines)
         elif header is None:
             # tabledata == tabledata
             table_lines = tabledata.strip().splitlines()
             header = table_lines[0]
-        else:  # tabledata == none
-            tabledata = table_lines.strip().splitlines()
+            datalines = self.parserows(tabledata)
+        else:  # table holds only data rows
+            if tabledata is None:
+                tabledata = table
+            datalines = self.parserows(tabledata or '')
 
         if columnranges is None:
             # First line is header
@@ -162,49 +216,78 @@ class TextTable(MutableSet, Sequence):
             self.columnranges = columnranges
 
         self._rows = []
+        self._row_counts = {}
+        self._columns = tuple(self.columnranges.values())
+        self._column_set = frozenset(self._columns)
+        self._ranges = tuple(self.columnranges.keys())
 
-        if tabledata is not None:
-            for line in self.parserows(tabledata):
-                line_strip = line.strip()
-                self.append(self.parse_line(line_strip))
+        # Parsed rows always have all columns, only check duplicates
+        self._extend_values([self.parse_values(line) for line in datalines])
 
     def __eq__(self, other):
         if not hasattr(other, '__iter__'):
             return False
-        return list(self._rows) == list(other)
+        return list(self) == list(other)
 
     def __len__(self):
         return len(self._rows)
 
     def __iter__(self):
-        return self._rows.__iter__()
+        columns = self._columns
+        for values in self._rows:
+            yield dict(zip(columns, values))
 
     def __contains__(self, value):
         """
         Return true if any row or row[self.key_column] equals value
         """
-        return self._rows.__contains__(value)
+        if not isinstance(value, dict) or len(value) != len(self._columns):
+            return False
+        try:
+            values = self._values(value)
+        except KeyError:  # Different column names
+            return False
+        if self._row_counts is None:
+            return values in self._rows
+        try:
+            return values in self._row_counts
+        except TypeError:  # Un-hashable value
+            return values in self._rows
 
     def __setitem__(self, index, value):
         self.conform_or_raise(value)
-        return self._rows.__setitem__(index, value)
+        values = self._values(value)
+        old_values = self._rows[index]
+        self._rows.__setitem__(index, values)
+        self._count(old_values, -1)
+        self._count(values, 1)
 
     def __delitem__(self, index):
-        return self._rows.__delitem__(index)
+        if isinstance(index, slice):
+            old_rows = self._rows[index]
+        else:
+            old_rows = [self._rows[index]]
+        self._rows.__delitem__(index)
+        for old_values in old_rows:
+            self._count(old_values, -1)
 
     def __getitem__(self, index):
-        return self._rows.__getitem__(index)
+        if isinstance(index, slice):
+            return [dict(zip(self._columns, values))
+                    for values in self._rows[index]]
+        return dict(zip(self._columns, self._rows[index]))
 
     def insert(self, index, value):
         """
         Insert value contents at index
         """
         self.conform_or_raise(value)
-        return self._rows.insert(index, value)
+        values = self._values(value)
+        self._rows.insert(index, values)
+        self._count(values, 1)
 
     def add(self, value):
-        self.conform_or_raise(value)
-        return self._rows.append(value)
+        self.append(value)
 
     def discard(self, value):
         """
@@ -217,7 +300,65 @@ class TextTable(MutableSet, Sequence):
         Inserts value item or iterable at end
         """
         self.conform_or_raise(value)
-        return self._rows.append(value)
+        values = self._values(value)
+        self._rows.append(values)
+        self._count(values, 1)
+
+    def extend(self, values):
+        """
+        Append every item from values iterable, in order
+        """
+        values = list(values)
+        for value in values:
+            if not isinstance(value, dict):
+                raise ValueError("Value '%s' is not a dict-like" % value)
+            if set(value.keys()) != self._column_set:
+                raise ValueError("Value's keys %s != %s columns"
+                                 % (set(value.keys()), self._column_set))
+        self._extend_values([self._values(value) for value in values])
+
+    def _extend_values(self, rows):
+        # Rows are column value tuples, only duplicates are checked
+        if not self.allow_duplicate:
+            for values in rows:
+                if self._has_values(values):
+                    raise ValueError("Value '%s' is duplicate"
+                                     % dict(zip(self._columns, values)))
+                # Catch duplicates within rows also
+                self._rows.append(values)
+                self._count(values, 1)
+            return
+        self._rows.extend(rows)
+        for values in rows:
+            self._count(values, 1)
+
+    def _values(self, value):
+        # Tuple of dict-like value's column values, in column order
+        return tuple([value[column] for column in self._columns])
+
+    def _has_values(self, values):
+        # True if any row has the same values tuple
+        if self._row_counts is not None:
+            try:
+                return values in self._row_counts
+            except TypeError:
+                pass
+        return values in self._rows
+
+    def _count(self, values, delta):
+        # Track number of rows with values tuple, for __contains__()
+        counts = self._row_counts
+        if counts is None:
+            return
+        try:
+            count = counts.get(values, 0) + delta
+        except TypeError:  # Un-hashable, fall back to scanning rows
+            self._row_counts = None
+            return
+        if count > 0:
+            counts[values] = count
+        else:
+            counts.pop(values, None)
 
     def conforms(self, value):
         """
@@ -234,7 +375,7 @@ class TextTable(MutableSet, Sequence):
         if not isinstance(value, dict):
             raise ValueError("Value '%s' is not a dict-like" % value)
         keys = set(value.keys())
-        expected = set(self.columnranges.values())
+        expected = self._column_set
         if keys == expected:
             if not self.allow_duplicate and self.__contains__(value):
                 raise ValueError("Value '%s' is duplicate" % value)
@@ -254,6 +395,50 @@ class TextTable(MutableSet, Sequence):
             return None
         return value
 
+    @classmethod
+    def iter_rows(cls, lines):
+        """
+        Yield dictionary of column name to value for rows, as lines are read
+
+        Unlike instances, duplicate rows are not detected.
+
+        :param lines: Iterable of table lines, header first, e.g. stdout file
+        :raises TypeError: if lines contains no header
+        """
+        lines = iter(lines)
+        table = cls(cls.first_line(lines))
+        for line in cls.data_lines(lines):
+            yield table.parse_line(line)
+
+    @staticmethod
+    def first_line(lines):
+        """
+        Return first non-blank line consumed from lines iterator
+
+        :raises TypeError: if lines contains no non-blank line
+        """
+        for line in lines:
+            if line.strip():
+                return line
+        # FIXME: This should probably be a ValueError
+        raise TypeError("Table shorter than one line")
+
+    @staticmethod
+    def data_lines(lines):
+        """
+        Yield lines from lines iterable, except those blank at the end
+        """
+        blanks = []
+        for line in lines:
+            if not line.strip():
+                # Not known to be trailing, until another line comes
+                blanks.append(line)
+                continue
+            for blank in blanks:
+                yield blank
+            blanks = []
+            yield line
+
     @staticmethod
     def parseheader(table):
         """
@@ -275,15 +460,30 @@ class TextTable(MutableSet, Sequence):
         """
         return tabledata.strip().splitlines()
 
+    def parse_values(self, line):
+        """
+        Parse one line into a tuple of values, in column order
+        """
+        strippedline = line.strip()
+        value_filter = self.value_filter
+        return tuple([value_filter(strippedline[start:end])
+                      for start, end in self._ranges])
+
     def parse_line(self, line):
         """
         Parse one line into a dict based on columnranges
         """
-        newdict = {}
-        strippedline = line.strip()
-        for (start, end), colname in self.columnranges.items():
-            newdict[colname] = self.value_filter(strippedline[start:end])
-        return newdict
+        return dict(zip(self._columns, self.parse_values(line)))
+
+    def column(self, col_name):
+        """
+        Return list of every row's value for col_name, in row order
+
+        :param col_name: Column name string to use
+        :raises ValueError: If col_name is not a column
+        """
+        index = self._columns.index(col_name)
+        return [values[index] for values in self._rows]
 
     def search(self, col_name, value, match_func=None):
         """
@@ -294,15 +494,18 @@ class TextTable(MutableSet, Sequence):
         :match_func: If specified, match found when
                      match_func(col_name, value, row_value) returns True
         """
-        result = []
-        for row in self._rows:
-            if match_func is None:
-                if row.get(col_name) == value:
-                    result.append(dict(row))
-            else:
-                if match_func(col_name, value, row.get(col_name)):
-                    result.append(dict(row))
-        return result
+        if col_name in self._column_set:
+            col_values = self.column(col_name)
+        else:  # Same as row.get(col_name)
+            col_values = [None] * len(self._rows)
+        if match_func is None:
+            indexes = [index for index, col_value in enumerate(col_values)
+                       if col_value == value]
+        else:
+            indexes = [index for index, col_value in enumerate(col_values)
+                       if match_func(col_name, value, col_value)]
+        columns = self._columns
+        return [dict(zip(columns, self._rows[index])) for index in indexes]
 
     def find(self, col_name, value, match_func=None):
         """
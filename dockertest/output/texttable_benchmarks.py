@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""
+Time TextTable parsing of large ``docker ps -a --no-trunc --size`` outputs
+
+Prints rows parsed per second, and the time for a single ``search()``,
+for tables of 1k, 10k, and 100k rows.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+# Must come after sys.path modification
+from dockertest.output import TextTable  # noqa
+
+#: Number of rows in each table timed
+SIZES = (1000, 10000, 100000)
+
+#: Column name and width, as output by docker ps -a --no-trunc --size
+COLUMNS = (('CONTAINER ID', 67), ('IMAGE', 20), ('COMMAND', 20),
+           ('CREATED', 20), ('STATUS', 32), ('PORTS', 20), ('NAMES', 20),
+           ('SIZE', 0))
+
+
+def make_line(values):
+    """Return values padded to column widths"""
+    return "".join([value.ljust(width)
+                    for value, (_, width) in zip(values, COLUMNS)])
+
+
+def make_table(rows):
+    """Return table string with header and rows unique rows"""
+    lines = [make_line([name for name, _ in COLUMNS])]
+    for index in xrange(rows):
+        lines.append(make_line(['%064x' % index, 'fedora:20', '"/bin/true"',
+                                '5 weeks ago', 'Exited (0) 5 weeks ago', '',
+                                'name_%d' % index, '0 B (virtual 187.7 MB)']))
+    return "\n".join(lines)
+
+
+def main():
+    """Parse tables of each size, print results"""
+    for rows in SIZES:
+        table = make_table(rows)
+        start = time.time()
+        texttable = TextTable(table)
+        elapsed = time.time() - start
+        assert len(texttable) == rows
+        start = time.time()
+        found = texttable.find('NAMES', 'name_%d' % (rows - 1))
+        search = time.time() - start
+        assert found['CONTAINER ID'] == '%064x' % (rows - 1)
+        print ("%7d rows: %9.0f rows/sec, %8.4f sec parse, %8.4f sec search"
+               % (rows, rows / elapsed, elapsed, search))
+
+
+if __name__ == '__main__':
+    main()
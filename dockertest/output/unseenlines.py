@@ -1,18 +1,117 @@
 """Classes to assist with serial inspection of asynchronous output"""
 
+import errno
 import os
 import select
 import re
+import stat
 from time import time
 
 
+class UnseenLinesPoller(object):
+    """
+    Multiplexed, epoll-based reader feeding any number of ``UnseenLines``
+
+    Share one instance between ``UnseenLines`` of e.g. a command's stdout
+    and stderr, or several containers, to read from all of them while
+    blocking on any.
+    """
+
+    #: Epoll event mask to register
+    MASK = select.EPOLLIN | select.EPOLLPRI
+
+    #: Max seconds between reads of fds epoll can't watch (regular files)
+    FILE_POLL_SECONDS = 0.01
+
+    def __init__(self):
+        self._epoll = select.epoll()
+        # Mapping of fd to UnseenLines instance
+        self._unseenlines = {}
+        # Regular files are always readable, epoll refuses them
+        self._files = set()
+
+    def register(self, unseenlines):
+        """
+        Start reading into unseenlines, from its file descriptor
+
+        :param unseenlines: An UnseenLines instance
+        """
+        infd = unseenlines.fileno()
+        try:
+            self._epoll.register(infd, self.MASK)
+        except IOError, xcept:
+            if xcept.errno != errno.EPERM:
+                raise
+            self._files.add(infd)
+        self._unseenlines[infd] = unseenlines
+
+    def unregister(self, unseenlines):
+        """
+        Stop reading into unseenlines (e.g. on end of file)
+
+        :param unseenlines: An UnseenLines instance
+        """
+        infd = unseenlines.fileno()
+        if self._unseenlines.pop(infd, None) is None:
+            return
+        if infd in self._files:
+            self._files.remove(infd)
+        else:
+            try:
+                self._epoll.unregister(infd)
+            except (IOError, ValueError):
+                pass  # fd closed by caller already
+
+    def poll(self, timeout=0):
+        """
+        Wait up to timeout seconds for input, read all available input
+
+        :param timeout: Maximum seconds to block, when nothing is readable
+        :return: Number of bytes read into all registered UnseenLines
+        """
+        if self._files:
+            timeout = min(timeout, self.FILE_POLL_SECONDS)
+        try:
+            events = self._epoll.poll(max(timeout, 0))
+        except IOError, xcept:
+            if xcept.errno != errno.EINTR:
+                raise
+            return 0
+        n_read = 0
+        for infd in list(self._files):
+            n_read += self._unseenlines[infd].read_ready()
+        for infd, _event in events:
+            unseenlines = self._unseenlines.get(infd)
+            if unseenlines is not None:
+                n_read += unseenlines.read_ready()
+        return n_read
+
+    def close(self):
+        """
+        Stop reading into all UnseenLines, release epoll file descriptor
+        """
+        self._unseenlines.clear()
+        self._files.clear()
+        self._epoll.close()
+
+
 class UnseenLines(object):
     """
     Non-blocking reader that returns yet unseen-lines.  Requires
-    frequent calls to ``flush()`` and/or ``nextline()`` to prevent
-    the producer from blocking.
+    frequent calls to ``flush()``, ``nextline()``, or ``wait()``
+    to prevent the producer from blocking.
 
     :param infd: Open file descriptor to read
+    :param log_fn: Optional callable, passed all input as it's read
+    :param poller: Optional ``UnseenLinesPoller`` shared with other
+                   instances, None to use a private one.
+    :param max_lines: Ring-buffer mode, retain at most this many
+                      consumed lines in ``lines``, None for all.
+    :param max_bytes: Ring-buffer mode, retain at most this many bytes
+                      of consumed lines in ``lines``, None for all.
+    :param spill_path: Optional log file, appended with lines dropped from
+                       ``lines`` in ring-buffer mode, see ``spilled()``.
+                       Any existing content is kept, but never returned.
     """
 
     #: Max time to wait for new input on each read call
@@ -21,90 +120,211 @@ class UnseenLines(object):
     #: Pattern that will be stripped from input
     STRIP_REGEX = re.compile(r'(\x1b[][]([0-9\;\?h]+)?(.+\x07)?)|(\r)')
 
-    #: Polling mask to use
-    MASK = select.POLLIN
-
-    #: Size of each read-request
+    #: Initial (and minimum) size of each read-request
     READ_SIZE = 4096
 
+    #: Maximum size of each read-request, as it adapts to input rate
+    MAX_READ_SIZE = 1048576
+
     #: Index of last line returned to a caller
     idx = None
 
     #: Input buffer of incomplete lines
     strbuffer = None
 
-    #: Complete lines, in order received
+    #: Complete lines, in order received (only the retained window of
+    #: them in ring-buffer mode, ``lines[0]`` is line number ``offset``)
     lines = None
 
-    def __init__(self, infd, log_fn=None):
+    #: Line number (index) of ``lines[0]``, >0 after ring-buffer drops
+    offset = 0
+
+    #: Default ``max_lines`` for ring-buffer mode, None to retain all
+    MAX_LINES = None
+
+    #: Default ``max_bytes`` for ring-buffer mode, None to retain all
+    MAX_BYTES = None
+
+    #: Total number of bytes received (after stripping)
+    received = 0
+
+    #: True once end of input was read
+    eof = False
+
+    def __init__(self, infd, log_fn=None,  # pylint: disable=R0913
+                 poller=None, max_lines=None, max_bytes=None,
+                 spill_path=None):
         self.idx = -1
         self.strbuffer = ''
         self.lines = []
+        self.offset = 0
+        self.retained_bytes = 0
+        if max_lines is None:
+            max_lines = self.MAX_LINES
+        if max_bytes is None:
+            max_bytes = self.MAX_BYTES
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self._spill = None
+        # Where this instance's spilled lines start in spill_path
+        self._spill_offset = 0
+        if spill_path is not None:
+            self._spill = open(spill_path, 'ab')
+            self._spill.seek(0, os.SEEK_END)
+            self._spill_offset = self._spill.tell()
         self._infd = infd
-        self._poll = select.poll()
-        self._poll.register(infd, self.MASK)
+        # More may be appended to regular files after end-of-file
+        self._regular = stat.S_ISREG(os.fstat(infd).st_mode)
+        self.read_size = self.READ_SIZE
         self.log_fn = log_fn
+        # Only a poller created here is closed by close()
+        self._private_poller = poller is None
+        if poller is None:
+            poller = UnseenLinesPoller()
+        self.poller = poller
+        poller.register(self)
 
     def __str__(self):
         return ''.join(self.lines) + self.peek()
 
-    def _read_stdio(self):
-        """Non-blocking read into strbuffer"""
-        # Only attempt reading if it will not block
-        fd_event_list = self._poll.poll(10)  # milliseconds
-        if len(fd_event_list) == 1:
-            _fd, event = fd_event_list.pop()
-            del _fd  # not needed
-        else:
-            return 0  # More than 1 fd registered will timeout down-stack.
-        if event & self.MASK:
-            newoutput = os.read(self._infd, self.READ_SIZE)
-        else:
-            return 0  # Read would block
-        if newoutput != '':
-            # Assume terminal type not handled, strip off escape codes
-            newoutput = self.STRIP_REGEX.sub('', newoutput)
+    def __len__(self):
+        """Number of complete lines received, including any dropped"""
+        return self.offset + len(self.lines)
+
+    def fileno(self):
+        """Return file descriptor being read"""
+        return self._infd
+
+    def read_ready(self):
+        """
+        Read once, into strbuffer/lines, only call when read will not block
+
+        :return: Number of bytes received
+        """
+        try:
+            newoutput = os.read(self._infd, self.read_size)
+        except OSError, xcept:
+            if xcept.errno == errno.EAGAIN:
+                return 0
+            if xcept.errno != errno.EIO:  # pty closed
+                raise
+            newoutput = ''
+        # Grow reads while input is plentiful, shrink back when trickling
+        if len(newoutput) == self.read_size:
+            self.read_size = min(self.read_size * 2, self.MAX_READ_SIZE)
+        elif len(newoutput) < self.read_size / 4:
+            self.read_size = max(self.read_size / 2, self.READ_SIZE)
+        if newoutput == '':
+            if not self._regular:
+                # Pipe/pty writer closed, nothing more will ever come
+                self.eof = True
+                self.poller.unregister(self)
+            return 0
+        self.feed(newoutput)
+        return len(newoutput)
+
+    def feed(self, newoutput):
+        """
+        Integrate newly read output, only the incomplete tail is kept buffered
+
+        :param newoutput: String of raw input
+        """
+        # Assume terminal type not handled, strip off escape codes
+        newoutput = self.STRIP_REGEX.sub('', newoutput)
+        self.received += len(newoutput)
+        if self.log_fn and callable(self.log_fn):
+            self.log_fn(newoutput)
+        last_newline = newoutput.rfind('\n')
+        if last_newline < 0:
             self.strbuffer += newoutput
-            if self.log_fn and callable(self.log_fn):
-                self.log_fn(newoutput)
-            return len(newoutput)
-        return 0
+            return
+        # Don't integrate partial lines, only what precedes the last '\n'
+        complete = self.strbuffer + newoutput[:last_newline]
+        self.lines.extend([line + '\n' for line in complete.split('\n')])
+        # Plus the final newline, not included in complete
+        self.retained_bytes += len(complete) + 1
+        self.strbuffer = newoutput[last_newline + 1:]
+        self._trim()
+
+    def _trim(self):
+        """Drop (spill) oldest consumed lines over max_lines/max_bytes"""
+        # Unseen lines are never dropped
+        consumed = self.idx + 1 - self.offset
+        n_drop = 0
+        if self.max_lines is not None:
+            n_drop = len(self.lines) - self.max_lines
+        if self.max_bytes is not None:
+            excess = self.retained_bytes - self.max_bytes
+            n_bytes = 0
+            while excess > 0 and n_bytes < consumed:
+                excess -= len(self.lines[n_bytes])
+                n_bytes += 1
+            n_drop = max(n_drop, n_bytes)
+        n_drop = min(n_drop, consumed)
+        if n_drop <= 0:
+            return
+        dropped = self.lines[:n_drop]
+        del self.lines[:n_drop]
+        self.offset += n_drop
+        self.retained_bytes -= sum([len(line) for line in dropped])
+        if self._spill is not None:
+            self._spill.writelines(dropped)
+            self._spill.flush()
+
+    def spilled(self):
+        """
+        Return list of lines dropped from ``lines``, read back from spill_path
+
+        :raises ValueError: if lines were dropped without a ``spill_path``
+        """
+        if self._spill is None:
+            if self.offset:
+                raise ValueError("%d lines dropped, no spill_path to read "
+                                 "them from" % self.offset)
+            return []
+        with open(self.spill_path, 'rb') as spill:
+            spill.seek(self._spill_offset)
+            return spill.readlines()
+
+    def history(self):
+        """
+        Return all input received, including spilled and incomplete lines
+        """
+        return ''.join(self.spilled()) + str(self)
+
+    def close(self):
+        """
+        Stop reading, close spill_path file and any private poller
+        (does not close infd or a shared poller)
+        """
+        self.poller.unregister(self)
+        if self._private_poller:
+            self.poller.close()
+        if self._spill is not None:
+            self._spill.close()
+
+    def _read_stdio(self):
+        """Non-blocking read (of all poller fds), return bytes received here"""
+        received = self.received
+        self.poller.poll(self.POLL_MILISECONDS / 1000.0)
+        return self.received - received
 
     def _integrate(self):
         """Integrate any newly received complete lines into self.lines"""
-        n_read = self._read_stdio()  # update buffer
-        if n_read == 0:
-            return 0
-        # Don't integrate partial lines, check each for '\n'
-        unseenlines = self.strbuffer.splitlines(True)
-        # Give oldest first
-        unseenlines.reverse()
-        unseenline = self.strbuffer  # May not enter while loop
-        while unseenlines:
-            unseenline = unseenlines.pop()
-            if '\n' in unseenline:
-                self.lines.append(unseenline)
-            else:
-                # last line is incomplete
-                break
-        if unseenline:  # Incomplete line goes back into buffer
-            self.strbuffer = unseenline
-        else:  # All lines consumed
-            self.strbuffer = ''
-        return n_read
+        return self._read_stdio()
 
     def nextline(self):
         """Return next complete unseen line, or None"""
-        n_read = self._integrate()
-        end_idx = len(self.lines) - 1
-        if end_idx < 0:
-            return None
-        if self.idx >= end_idx and n_read == 0:
-            return None  # nothing new was read
+        self._integrate()
+        end_idx = len(self) - 1
         # Lines exist beyond what has been returned
         if self.idx < end_idx:
             self.idx += 1
-            return self.lines[self.idx]
+            line = self.lines[self.idx - self.offset]
+            if self.max_lines is not None or self.max_bytes is not None:
+                self._trim()
+            return line
         if self.idx > end_idx:
             raise ValueError("Last seen greater than number received")
         # Nothing unseen has arrived
@@ -120,12 +340,18 @@ class UnseenLines(object):
     def undo(self, idx):
         """
         Reset last-seen line index BACK to idx (forward will raise ValueError)
+
+        In ring-buffer mode, idx must remain within the retained lines.
         """
+        if idx < self.offset - 1:
+            raise ValueError("Undo index %d precedes the %d lines retained "
+                             "from index %d" % (idx, len(self.lines),
+                                                self.offset))
         if idx <= self.idx:
             if self.log_fn is not None and callable(self.log_fn):
                 for old_idx in xrange(self.idx, idx, -1):
                     self.log_fn("(Undoing) %s"
-                                % self.lines[old_idx])
+                                % self.lines[old_idx - self.offset])
             self.idx = idx
         else:
             raise ValueError("Undo index %d not less than or equal to "
@@ -135,7 +361,29 @@ class UnseenLines(object):
         """
         Process any new input then return
         """
-        self._integrate()
+        self.poller.poll(0)
+
+    def wait(self, timeout, otherone=None):
+        """
+        Block until more input is received, or timeout seconds pass
+
+        :param timeout: Maximum seconds to wait
+        :param otherone: (optional) Other UnseenLines instance to keep
+                         flushing, when it does not share this poller.
+        :return: True if more input was received
+        """
+        received = self.received
+        deadline = time() + timeout
+        while self.received == received:
+            remaining = deadline - time()
+            if remaining <= 0:
+                return False
+            if otherone is not None and otherone.poller is not self.poller:
+                # Can't block on both, wake up to keep draining otherone
+                remaining = min(remaining, self.POLL_MILISECONDS / 1000.0)
+                otherone.flush()
+            self.poller.poll(remaining)
+        return True
 
 
 class UnseenlineMatchTimeout(RuntimeError):
@@ -258,19 +506,22 @@ class UnseenlineMatch(object):
                 otherone.flush()
             if cls.timedout(start, timeout):
                 raise xcept
-            found = cls.is_found(regex, unseenline[-1])
-            if found:
-                # Don't gather the next line
-                break
-            unseenline.append(cls.gather(unseenlines))
-        else:  # every time unseenline is none
-            # No guarantee _any_ new lines came in
-            if cls.timedout(start, timeout):
-                raise xcept
-            # Safe to gather (takes time), don't store big list of None
-            unseenline[-1] = cls.gather(unseenlines)
-            found = False
-        return found
+            if cls.is_found(regex, unseenline[-1]):
+                return True  # Don't gather the next line
+            idx, received = unseenlines.idx, unseenlines.received
+            nextone = cls.gather(unseenlines)
+            if (nextone == unseenline[-1] and idx == unseenlines.idx and
+                    received == unseenlines.received):
+                break  # Same incomplete line, nothing new came in
+            unseenline.append(nextone)
+        # No guarantee _any_ new lines came in
+        if cls.timedout(start, timeout):
+            raise xcept
+        # Block for input instead of spinning
+        unseenlines.wait(start + float(timeout) - time(), otherone)
+        # Safe to gather (takes time), don't store big list of None
+        unseenline[-1] = cls.gather(unseenlines)
+        return False
 
     @classmethod
     def timedout(cls, start, timeout):
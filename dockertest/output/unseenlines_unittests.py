@@ -2,7 +2,10 @@
 
 import tty
 import os
+import re
 import tempfile
+import threading
+import time
 import unittest
 import sys
 import types
@@ -169,6 +172,12 @@ class UnseenLinesTestPipe(UnseenLinesTestBase):
         self.assertEqual(nl.nextline(), None)
 
 
+    def test_close_private_poller(self):
+        nl = self.UnseenLines(self.r_pipe)
+        nl.close()
+        # pylint: disable=W0212
+        self.assertTrue(nl.poller._epoll.closed)
+
 class UnseenLinesTestpty(UnseenLinesTestBase):
 
     def setUp(self):
@@ -246,7 +255,230 @@ class UnseenLinesTestpty(UnseenLinesTestBase):
         self.assertEqual(nl.peek(), 'bar')
         self.assertEqual(nl.nextline(), None)
 
-# FIXME: Need unittest for UnseenLineMatch
+
+class UnseenLinesTestPoller(UnseenLinesTestBase):
+
+    def setUp(self):
+        super(UnseenLinesTestPoller, self).setUp()
+        from dockertest.output import UnseenLinesPoller, UnseenlineMatch
+        from dockertest.output import UnseenlineMatchPeek
+        from dockertest.output import UnseenlineMatchTimeout
+        self.poller = UnseenLinesPoller()
+        self.UnseenlineMatch = UnseenlineMatch
+        self.UnseenlineMatchPeek = UnseenlineMatchPeek
+        self.UnseenlineMatchTimeout = UnseenlineMatchTimeout
+        self.out_r, self.out_w = os.pipe()
+        self.err_r, self.err_w = os.pipe()
+        self.out = self.UnseenLines(self.out_r, poller=self.poller)
+        self.err = self.UnseenLines(self.err_r, poller=self.poller)
+
+    def tearDown(self):
+        self.poller.close()
+        for pipe_fd in (self.out_r, self.out_w, self.err_r, self.err_w):
+            try:
+                os.close(pipe_fd)
+            except OSError:
+                pass
+        super(UnseenLinesTestPoller, self).tearDown()
+
+    def write_later(self, pipe_fd, data, delay=0.1):
+        writer = threading.Timer(delay, os.write, (pipe_fd, data))
+        writer.start()
+        return writer
+
+    def test_shared(self):
+        os.write(self.err_w, "err\n")
+        os.write(self.out_w, "out\npartial")
+        self.out.flush()  # reads both
+        self.assertEqual(self.err.lines, ['err\n'])
+        self.assertEqual(self.out.lines, ['out\n'])
+        self.assertEqual(self.out.strbuffer, 'partial')
+        self.assertEqual(self.err.nextline(), 'err\n')
+        self.assertEqual(self.err.nextline(), None)
+
+    def test_close_shared_poller(self):
+        self.out.close()
+        # pylint: disable=W0212
+        self.assertFalse(self.poller._epoll.closed)
+        os.write(self.err_w, "err\n")
+        self.assertEqual(self.err.nextline(), 'err\n')
+
+    def test_tail_only(self):
+        for chunk in ("a", "b\nc", "d\n\ne", "\n"):
+            self.out.feed(chunk)
+        self.assertEqual(self.out.lines, ['ab\n', 'cd\n', '\n', 'e\n'])
+        self.assertEqual(self.out.strbuffer, '')
+        self.assertEqual(self.out.received, 9)
+
+    def test_adaptive(self):
+        read_size = self.out.read_size
+        os.write(self.out_w, "x" * read_size * 3)
+        self.out.flush()
+        self.assertEqual(self.out.read_size, read_size * 2)
+        self.out.flush()
+        self.assertEqual(self.out.read_size, read_size * 4)
+        os.write(self.out_w, "x")
+        self.out.flush()
+        self.assertEqual(self.out.read_size, read_size * 2)
+        os.write(self.out_w, "\n")
+        self.out.flush()
+        self.assertEqual(self.out.read_size, read_size)
+        self.assertEqual(len(self.out.lines[0]), read_size * 3 + 2)
+
+    def test_wait(self):
+        start = time.time()
+        self.assertFalse(self.out.wait(0.1))
+        self.assertTrue(time.time() - start >= 0.1)
+        writer = self.write_later(self.out_w, "foo\n")
+        self.assertTrue(self.out.wait(5))
+        writer.join()
+        self.assertEqual(self.out.nextline(), 'foo\n')
+        # Other instance's input doesn't end the wait
+        writer = self.write_later(self.err_w, "bar\n", 0)
+        self.assertFalse(self.out.wait(0.2))
+        writer.join()
+        self.assertEqual(self.err.nextline(), 'bar\n')
+
+    def test_eof(self):
+        os.write(self.out_w, "last\n")
+        os.close(self.out_w)
+        self.out.flush()
+        self.out.flush()
+        self.assertTrue(self.out.eof)
+        self.assertFalse(self.err.eof)
+        self.assertEqual(self.out.nextline(), 'last\n')
+        start = time.time()
+        self.assertFalse(self.out.wait(0.1))
+        self.assertTrue(time.time() - start >= 0.1)
+
+    def test_match(self):
+        regex = re.compile(r'^ready')
+        writer = self.write_later(self.out_w, "starting\nready\n")
+        match = self.UnseenlineMatch(regex, self.out, 5, self.err)
+        writer.join()
+        self.assertTrue(match)
+        self.assertEqual(match.context[-1], 'ready\n')
+        self.assertRaises(self.UnseenlineMatchTimeout,
+                          self.UnseenlineMatch, regex, self.out, 0.1)
+
+    def test_match_peek(self):
+        regex = re.compile(r'prompt> $')
+        os.write(self.out_w, "prom")
+        writer = self.write_later(self.out_w, "pt> ")
+        match = self.UnseenlineMatchPeek(regex, self.out, 5)
+        writer.join()
+        self.assertTrue(match)
+        self.assertRaises(self.UnseenlineMatchTimeout,
+                          self.UnseenlineMatchPeek, re.compile('nope'),
+                          self.out, 0.1)
+
+    def test_match_not_spinning(self):
+        regex = re.compile(r'never')
+        os.write(self.out_w, "partial")
+        start = time.clock()
+        self.assertRaises(self.UnseenlineMatchTimeout,
+                          self.UnseenlineMatchPeek, regex, self.out, 0.5)
+        # Mostly blocked, not burning CPU
+        self.assertTrue(time.clock() - start < 0.25)
+
+
+class UnseenLinesTestRing(UnseenLinesTestBase):
+
+    def setUp(self):
+        super(UnseenLinesTestRing, self).setUp()
+        self.out_r, self.out_w = os.pipe()
+        self.spill = tempfile.NamedTemporaryFile()
+
+    def tearDown(self):
+        self.spill.close()
+        for pipe_fd in (self.out_r, self.out_w):
+            os.close(pipe_fd)
+        super(UnseenLinesTestRing, self).tearDown()
+
+    def consume(self, unseenlines):
+        result = []
+        line = unseenlines.nextline()
+        while line is not None:
+            result.append(line)
+            line = unseenlines.nextline()
+        return result
+
+    def test_unbounded(self):
+        out = self.UnseenLines(self.out_r)
+        out.feed("1\n2\n3\n")
+        self.assertEqual(len(self.consume(out)), 3)
+        self.assertEqual(out.lines, ['1\n', '2\n', '3\n'])
+        self.assertEqual(out.spilled(), [])
+        out.close()
+
+    def test_unseen_retained(self):
+        out = self.UnseenLines(self.out_r, max_lines=2)
+        out.feed("1\n2\n3\n4\n")
+        # Nothing consumed, nothing may be dropped
+        self.assertEqual(len(out.lines), 4)
+        self.assertEqual(self.consume(out), ['1\n', '2\n', '3\n', '4\n'])
+        self.assertEqual(out.lines, ['3\n', '4\n'])
+        self.assertEqual(out.offset, 2)
+        self.assertEqual(len(out), 4)
+        out.close()
+
+    def test_max_lines_spill(self):
+        out = self.UnseenLines(self.out_r, max_lines=2,
+                               spill_path=self.spill.name)
+        out.feed("1\n2\n3\n")
+        self.consume(out)
+        out.feed("4\n5")
+        self.assertEqual(out.lines, ['3\n', '4\n'])
+        self.assertEqual(out.spilled(), ['1\n', '2\n'])
+        self.assertEqual(out.history(), '1\n2\n3\n4\n5')
+        self.assertEqual(out.nextline(), '4\n')
+        self.assertEqual(out.nextline(), None)
+        out.close()
+
+    def test_spill_path_reused(self):
+        self.spill.write("stale\n")
+        self.spill.flush()
+        out = self.UnseenLines(self.out_r, max_lines=1,
+                               spill_path=self.spill.name)
+        out.feed("1\n2\n")
+        self.consume(out)
+        self.assertEqual(out.spilled(), ['1\n'])
+        self.assertEqual(out.history(), '1\n2\n')
+        out.close()
+        with open(self.spill.name, 'rb') as spill:
+            self.assertEqual(spill.read(), 'stale\n1\n')
+
+    def test_max_bytes(self):
+        out = self.UnseenLines(self.out_r, max_bytes=10,
+                               spill_path=self.spill.name)
+        out.feed("aaaa\nbbbb\ncccc\n")
+        self.consume(out)
+        self.assertEqual(out.lines, ['bbbb\n', 'cccc\n'])
+        self.assertEqual(out.retained_bytes, 10)
+        self.assertEqual(out.spilled(), ['aaaa\n'])
+        out.close()
+
+    def test_undo(self):
+        out = self.UnseenLines(self.out_r, max_lines=2,
+                               spill_path=self.spill.name)
+        out.feed("1\n2\n3\n4\n")
+        self.consume(out)
+        # Within retained window
+        out.undo(1)
+        self.assertEqual(self.consume(out), ['3\n', '4\n'])
+        # Before retained window
+        self.assertRaises(ValueError, out.undo, 0)
+        self.assertEqual(out.idx, 3)
+        out.close()
+
+    def test_no_spill_path(self):
+        out = self.UnseenLines(self.out_r, max_lines=1)
+        out.feed("1\n2\n")
+        self.consume(out)
+        self.assertRaises(ValueError, out.spilled)
+        out.close()
+
+# FIXME: Need more unittests for UnseenLineMatch
 
 if __name__ == "__main__":
     unittest.main()
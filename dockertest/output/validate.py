@@ -13,6 +13,49 @@ from dockertest.xceptions import DockerExecError, DockerOutputError
 from . dockerversion import DockerVersion
 
 
+#: Horizontal whitespace, for patterns searched across multi-line output
+_HSPACE = r'[^\S\r\n]'
+
+#: Go panic message pattern
+_CRASH = re.compile(r'panic:[^\r\n]+error')
+
+#: Docker usage message pattern
+_USAGE = re.compile(r'[Uu][Ss][Aa][Gg][Ee]:%s+[Dd][Oo][Cc][Kk][Ee][Rr]%s+\S'
+                    % (_HSPACE, _HSPACE))
+
+#: Any-case 'error' pattern
+_ERROR = re.compile(r'[Ee][Rr][Rr][Oo][Rr]')
+
+#: Docker client fatal log message pattern
+_FATA = re.compile(r'FATA\[\d')
+
+#: Non-printable character pattern, for unicode output
+_NONPRINTABLE = re.compile(r"[^%s]" % re.escape(printable))
+
+
+def fails_on(regex):
+    """
+    Decorate a ``*_check`` function as failing where compiled regex is found
+
+    ``OutputGoodBase`` searches for all such checkers' patterns in a single
+    pass, instead of calling them.  Patterns must not depend on flags.
+
+    :param regex: Compiled regular expression the checker searches for
+    """
+    def decorator(func):  # pylint: disable=C0111
+        func.fails_on = regex
+        return func
+    return decorator
+
+
+def _literal_first(pattern):
+    # Leading [Xx] character classes defeat the regex engine's first
+    # character scan, spell them as literal alternatives instead.
+    if pattern[:1] == '[' and pattern[3:4] == ']' and '|' not in pattern:
+        return "|".join([char + pattern[4:] for char in pattern[1:3]])
+    return pattern
+
+
 class AllGoodBase(object):
 
     """
@@ -138,6 +181,12 @@ class OutputGoodBase(AllGoodBase):
     #: Stripped standard-error string
     stderr_strip = None
 
+    #: Private, per-class cache of ``*_check`` method names (do not use)
+    _checkers = None
+
+    #: Private, per-class cache of combined ``fails_on`` regexes (do not use)
+    _scanners = None
+
     def __init__(self, cmdresult, ignore_error=False, skip=None):
         # Base class __init__ is abstract
         # pylint: disable=W0231
@@ -155,7 +204,7 @@ class OutputGoodBase(AllGoodBase):
         else:
             newskip = skip
         self.__instattrs__(newskip)
-        for checker in [name for name in dir(self) if name.endswith('_check')]:
+        for checker in self.checkers():
             self.callables[checker + '_stdout'] = getattr(self, checker)
             self.callables[checker + '_stderr'] = getattr(self, checker)
         self.call_callables()
@@ -171,6 +220,65 @@ class OutputGoodBase(AllGoodBase):
                                                      self.stderr_strip)
         return super(OutputGoodBase, self).__str__()
 
+    @classmethod
+    def checkers(cls):
+        """
+        Return (cached) tuple of ``*_check`` method names defined on class
+        """
+        # Subclasses must not share their base's cache
+        if cls.__dict__.get('_checkers') is None:
+            cls._checkers = tuple(sorted([name for name in dir(cls)
+                                          if name.endswith('_check')]))
+        return cls._checkers
+
+    @classmethod
+    def scanner(cls, names):
+        """
+        Return (cached) regex matching any ``fails_on`` pattern of checkers
+
+        :param names: Tuple of ``*_check`` names decorated with ``fails_on``
+        """
+        if cls.__dict__.get('_scanners') is None:
+            cls._scanners = {}
+        regex = cls._scanners.get(names)
+        if regex is None:
+            regex = re.compile("|".join([
+                _literal_first(getattr(cls, name).fails_on.pattern)
+                for name in names]))
+            cls._scanners[names] = regex
+        return regex
+
+    def scan(self, names, output):
+        """
+        Return list of ``fails_on`` checker names whose pattern is in output
+
+        :param names: Tuple of ``*_check`` names decorated with ``fails_on``
+        :param output: Stripped output string
+        """
+        if self.scanner(names).search(output) is None:
+            return []  # Common case, output searched once
+        return [name for name in names
+                if getattr(self, name).fails_on.search(output) is not None]
+
+    def call_callables(self):
+        _results = {}
+        patterned = [name for name in self.checkers()
+                     if getattr(getattr(self, name), 'fails_on', None)]
+        for suffix, output in (('_stdout', self.stdout_strip),
+                               ('_stderr', self.stderr_strip)):
+            names = tuple([name for name in patterned
+                           if name + suffix not in self.skip])
+            if not names:
+                continue
+            failed = self.scan(names, output)
+            for name in names:
+                _results[name + suffix] = name not in failed
+        for name, call in self.callables.items():
+            if name in _results or name in self.skip or not callable(call):
+                continue
+            _results[name] = call(**self.callable_args(name))
+        self.results.update(self.prepare_results(_results))
+
     def callable_args(self, name):
         if name.endswith('_stdout'):
             return {'output': self.stdout_strip}
@@ -205,6 +313,7 @@ class OutputGood(OutputGoodBase):
     """
 
     @staticmethod
+    @fails_on(_CRASH)
     def crash_check(output):
         """
         Return False if Go panic string found in output
@@ -212,13 +321,10 @@ class OutputGood(OutputGoodBase):
         :param output: Stripped output string
         :return: True if Go panic pattern **not** found
         """
-        regex = re.compile(r'\s*panic:\s*.+error.*')
-        for line in output.splitlines():
-            if bool(regex.search(line.strip())):
-                return False  # panic message found
-        return True  # panic message not found
+        return _CRASH.search(output) is None
 
     @staticmethod
+    @fails_on(_USAGE)
     def usage_check(output):
         """
         Return False if 'Docker usage' pattern found in output
@@ -226,13 +332,10 @@ class OutputGood(OutputGoodBase):
         :param output: Stripped output string
         :return: True if usage message pattern **not** found
         """
-        regex = re.compile(r'\s*usage:\s+docker\s+.*', re.IGNORECASE)
-        for line in output.splitlines():
-            if bool(regex.search(line.strip())):
-                return False  # usage message found
-        return True  # usage message not found
+        return _USAGE.search(output) is None
 
     @staticmethod
+    @fails_on(_ERROR)
     def error_check(output):
         """
         Return False if 'Error: ' pattern found in output
@@ -240,9 +343,10 @@ class OutputGood(OutputGoodBase):
         :param output: Stripped output string
         :return: True if 'Error: ' does **not** sppear
         """
-        return output.lower().strip().find('error') == -1
+        return _ERROR.search(output) is None
 
     @staticmethod
+    @fails_on(_FATA)
     def fata_check(output):
         """
         Return False if 'FATA[xxxx]' pattern found in output
@@ -250,8 +354,7 @@ class OutputGood(OutputGoodBase):
         :param output: Stripped output string
         :return: True if 'FATA ' does **not** sppear
         """
-        regex = re.compile(r'FATA\[\d+')
-        return not bool(regex.search(output))
+        return _FATA.search(output) is None
 
     @staticmethod
     def nonprintables_check(output):
@@ -260,8 +363,10 @@ class OutputGood(OutputGoodBase):
 
         :note: Must be explicitly enabled by calling enable_nonprintables()
         """
-        regex = re.compile(r"[^%s]" % re.escape(printable))
-        return not bool(regex.search(output))
+        if isinstance(output, str):
+            # Deleting every printable is much faster than a regex search
+            return output.translate(None, printable) == ''
+        return _NONPRINTABLE.search(output) is None
 
 
 class OutputNotBad(OutputGood):
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""
+Time OutputGood and OutputNotBad checking of large command outputs
+
+Prints megabytes checked per second, and checks per second for a small
+output, for clean stdout blobs of 1k, 10k, and 100k lines.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+# Must come after sys.path modification
+from dockertest.output import OutputGood, OutputNotBad  # noqa
+
+#: Number of lines in each stdout blob timed
+SIZES = (1000, 10000, 100000)
+
+#: Number of checks timed on a single-line output
+SMALL_REPEAT = 10000
+
+
+class FakeCmdResult(object):
+
+    """Just enough of CmdResult for checking"""
+
+    def __init__(self, stdout, stderr=''):
+        self.command = 'docker ps -a --no-trunc'
+        self.exit_status = 0
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = 0.1
+
+
+def make_stdout(lines):
+    """Return clean ``docker ps`` like stdout of lines lines"""
+    return "\n".join(['%064x   fedora:20   "/bin/true"   5 weeks ago   '
+                      'Exited (0) 5 weeks ago   name_%d' % (index, index)
+                      for index in xrange(lines)])
+
+
+def main():
+    """Check blobs of each size, print results"""
+    for checker in (OutputGood, OutputNotBad):
+        for lines in SIZES:
+            cmdresult = FakeCmdResult(make_stdout(lines))
+            megs = len(cmdresult.stdout) / 1000000.0
+            start = time.time()
+            assert checker(cmdresult)
+            elapsed = time.time() - start
+            print ("%12s %7d lines: %7.1f MB/sec, %8.4f sec"
+                   % (checker.__name__, lines, megs / elapsed, elapsed))
+        cmdresult = FakeCmdResult(make_stdout(1))
+        start = time.time()
+        for _ in xrange(SMALL_REPEAT):
+            checker(cmdresult)
+        elapsed = time.time() - start
+        print ("%12s %7d small: %7.0f checks/sec"
+               % (checker.__name__, SMALL_REPEAT, SMALL_REPEAT / elapsed))
+
+
+if __name__ == '__main__':
+    main()
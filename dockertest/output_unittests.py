@@ -8,6 +8,7 @@ import types
 import unittest
 import time
 import random
+from StringIO import StringIO
 
 
 # DO NOT allow this function to get loose in the wild!
@@ -120,6 +121,64 @@ class BaseInterfaceTest(unittest.TestCase):
         self.assertRaises(self.DockerOutputError,
                           self.output.OutputGood, cmdresult)
 
+    def test_output_good_results(self):
+        cmdresult = FakeCmdResult('docker', 0, "one\ntwo FATA[0000] three",
+                                  "Usage: docker [OPTIONS]\nfour\x07")
+        output_good = self.output.OutputGood(cmdresult, ignore_error=True)
+        self.assertFalse(output_good)
+        failed = set([name for name, result in output_good.results.items()
+                      if not result])
+        self.assertEqual(failed, set(['fata_check_stdout',
+                                      'usage_check_stderr',
+                                      'nonprintables_check_stderr']))
+        self.assertEqual(len(output_good.results), 10)
+        self.assertEqual(len(output_good.details), 1)
+        output_good = self.output.OutputGood(cmdresult, ignore_error=True,
+                                             skip=['fata_check',
+                                                   'usage_check',
+                                                   'nonprintables_check'])
+        self.assertTrue(output_good)
+        self.assertEqual(len(output_good.results), 4)
+
+    def test_output_good_lines(self):
+        # Patterns never span lines, like the original per-line checks
+        for stdout in ("panic: runtime\nerror", "usage: docker\nrun",
+                       "usage:\ndocker run", "usage: docker   "):
+            cmdresult = FakeCmdResult('docker', 0, stdout)
+            self.assertTrue(self.output.OutputGood(cmdresult, skip=[
+                'error_check', 'nonprintables_check']))
+        for stdout in ("foo\n  panic: runtime error: index\n",
+                       "bar\n\tUSAGE:  Docker run\n", "an ErRoR"):
+            cmdresult = FakeCmdResult('docker', 0, stdout)
+            self.assertFalse(self.output.OutputGood(cmdresult,
+                                                    ignore_error=True))
+
+    def test_checkers_per_class(self):
+        class NoPanic(self.output.OutputGoodBase):
+            crash_check = staticmethod(self.output.OutputGood.crash_check)
+
+            def exit_check(fake_self, output):
+                return fake_self.cmdresult.exit_status == 0
+        self.assertEqual(NoPanic.checkers(), ('crash_check', 'exit_check'))
+        self.assertEqual(self.output.OutputGoodBase.checkers(), ())
+        self.assertTrue(NoPanic(self.good_cmdresult))
+        cmdresult = FakeCmdResult('docker', 1, "panic: some error")
+        no_panic = NoPanic(cmdresult, ignore_error=True)
+        self.assertEqual(no_panic.results, {'crash_check_stdout': False,
+                                            'crash_check_stderr': True,
+                                            'exit_check_stdout': False,
+                                            'exit_check_stderr': False})
+        self.assertTrue(NoPanic.scanner(('crash_check',)) is
+                        NoPanic.scanner(('crash_check',)))
+
+    def test_direct_checks(self):
+        output_good = self.output.OutputGood
+        self.assertFalse(output_good.crash_check("panic: an error"))
+        self.assertTrue(output_good.usage_check("usage: foo"))
+        self.assertFalse(output_good.nonprintables_check("\x00"))
+        self.assertFalse(output_good.nonprintables_check(u"\u2022"))
+        self.assertTrue(output_good.nonprintables_check(u"printable"))
+
 
 class DockerVersionTest(unittest.TestCase):
 
@@ -176,6 +235,56 @@ class DockerVersionTest(unittest.TestCase):
                          'go1.2.3')
 
 
+class DockerVersionCacheTest(unittest.TestCase):
+
+    version_string = "Client:\n Version: 1.13.1\nServer:\n Version: 1.12.6\n"
+
+    def setUp(self):
+        import dockertest.output.dockerversion as dockerversion
+        self.dockerversion = dockerversion
+        self.commands = []
+        self.check_output = dockerversion.subprocess.check_output
+        dockerversion.subprocess.check_output = self.fake_check_output
+        dockerversion.invalidate()
+
+    def tearDown(self):
+        self.dockerversion.subprocess.check_output = self.check_output
+        self.dockerversion.invalidate()
+
+    def fake_check_output(self, command, **_dargs):
+        self.commands.append(command)
+        return self.version_string
+
+    def test_cached(self):
+        for _ in xrange(3):
+            docker_version = self.dockerversion.DockerVersion()
+            self.assertEqual(docker_version.client, '1.13.1')
+        self.dockerversion.DockerVersion(docker_path='/usr/bin/docker',
+                                         docker_options='-H tcp://foo')
+        self.dockerversion.DockerVersion(docker_path='/usr/bin/docker',
+                                         docker_options='-H tcp://foo ')
+        self.assertEqual(self.commands,
+                         ['docker version',
+                          '/usr/bin/docker -H tcp://foo version'])
+
+    def test_invalidate(self):
+        self.dockerversion.DockerVersion()
+        self.dockerversion.invalidate()
+        self.version_string = self.version_string.replace('1.13.1', '17.03')
+        self.assertEqual(self.dockerversion.DockerVersion().client, '17.03')
+        self.assertEqual(len(self.commands), 2)
+
+    def test_not_cached_error(self):
+        def fail(command, **_dargs):
+            self.commands.append(command)
+            raise OSError("no docker")
+        self.dockerversion.subprocess.check_output = fail
+        self.assertRaises(OSError, self.dockerversion.DockerVersion)
+        self.dockerversion.subprocess.check_output = self.fake_check_output
+        self.assertEqual(self.dockerversion.DockerVersion().server, '1.12.6')
+        self.assertEqual(len(self.commands), 2)
+
+
 class ColumnRangesTest(unittest.TestCase):
 
     table = ('CONTAINER ID        IMAGE               COMMAND             '
@@ -210,6 +319,31 @@ class ColumnRangesTest(unittest.TestCase):
         self.assertEqual(tc.offset(99999), 'NAMES')
         self.assertEqual(tc.offset(-99999), 'NAMES')
         self.assertEqual(tc.offset(None), 'NAMES')
+        for offset in xrange(0, 140):
+            name = tc.columns[min(offset // 20, 6)]
+            self.assertEqual(tc.offset(offset), name)
+
+    def test_getitem_missing(self):
+        tc = self.ColumnRanges(self.table)
+        self.assertEqual(tc['IMAGE'], (20, 40))
+        self.assertEqual(tc[(20, 40)], 'IMAGE')
+        self.assertRaises(KeyError, tc.__getitem__, 'FOOBAR')
+        self.assertRaises(KeyError, tc.__getitem__, (20, 41))
+        self.assertEqual(tc.get('FOOBAR'), None)
+        self.assertFalse([] in tc)
+
+    def test_reuse(self):
+        tc = self.ColumnRanges(self.table)
+        self.assertTrue(self.ColumnRanges(self.table) is tc)
+        self.assertFalse(self.ColumnRanges(self.table, 2) is tc)
+        self.assertFalse(self.ColumnRanges(self.table + ' ') is tc)
+        self.assertEqual(self.ColumnRanges(self.table + ' ').ranges,
+                         tc.ranges)
+        # Bad headers are never remembered
+        self.assertRaises(ValueError, self.ColumnRanges, self.table,
+                          expected=3)
+        self.assertRaises(ValueError, self.ColumnRanges, self.table,
+                          expected=3)
 
 
 class TextTableTest(unittest.TestCase):
@@ -249,6 +383,85 @@ class TextTableTest(unittest.TestCase):
         tt = self.TT(self.table)
         self.assertEqual(tt, self.expected)
 
+    def test_dupe_init(self):
+        self.assertRaises(ValueError, self.TT, self.table + 'foo   bar\n')
+
+    def test_extend(self):
+        tt = self.TT(self.table.splitlines()[0])
+        tt.extend(self.expected)
+        self.assertEqual(tt, self.expected)
+        self.assertRaises(ValueError, tt.extend, [self.expected[0]])
+        self.assertRaises(ValueError, tt.extend, [{'one': 1, 'two': 2}])
+        tt.allow_duplicate = True
+        tt.extend(self.expected)
+        self.assertEqual(len(tt), len(self.expected) * 2)
+
+    def test_contains_modified(self):
+        tt = self.TT(self.table)
+        first = dict(self.expected[0])
+        self.assertTrue(first in tt)
+        del tt[0]
+        self.assertFalse(first in tt)
+        tt.insert(0, first)
+        self.assertTrue(first in tt)
+        other = {'one': 'x', 'two': 'y', 'three': 'z'}
+        tt[0] = other
+        self.assertFalse(first in tt)
+        self.assertTrue(other in tt)
+        del tt[0:2]
+        self.assertFalse(other in tt)
+        self.assertFalse(self.expected[1] in tt)
+        self.assertFalse({'one': 'a', 'two': 'b'} in tt)
+        self.assertFalse({'one': 'a', 'two': 'b', 'four': 'c'} in tt)
+        self.assertFalse('a' in tt)
+
+    def test_lines_init(self):
+        tt = self.TT(StringIO(self.table))
+        self.assertEqual(tt, self.expected)
+        tt = self.TT(iter(['\n'] + self.table.splitlines(True)))
+        self.assertEqual(tt, self.expected)
+        self.assertRaises(TypeError, self.TT, iter(['  \n', '\n']))
+
+    def test_header_init(self):
+        lines = self.table.splitlines()
+        tt = self.TT("\n".join(lines[1:]), header=lines[0])
+        self.assertEqual(tt, self.expected)
+
+    def test_iter_rows(self):
+        lines = iter(self.table.splitlines(True))
+        rows = self.TT.iter_rows(lines)
+        self.assertEqual(rows.next(), self.expected[0])
+        # Nothing read past the row
+        self.assertEqual(lines.next(), '1     2     3   4  \n')
+        self.assertEqual(list(rows), self.expected[2:])
+        self.assertEqual(list(self.TT.iter_rows(StringIO(self.table))),
+                         self.expected)
+        self.assertEqual(list(self.TT.iter_rows(self.table.splitlines()[:1])),
+                         [])
+        self.assertRaises(TypeError, list, self.TT.iter_rows([]))
+
+    def test_row_copies(self):
+        tt = self.TT(self.table)
+        tt[0]['one'] = 'changed'
+        self.assertEqual(tt[0], self.expected[0])
+        self.assertEqual(tt[1:3], self.expected[1:3])
+        self.assertEqual(list(tt), self.expected)
+
+    def test_column(self):
+        tt = self.TT(self.table)
+        self.assertEqual(tt.column('two'), ['bar', '2', None, 'b'])
+        self.assertRaises(ValueError, tt.column, 'four')
+        self.assertEqual(tt.search('two', None), [self.expected[2]])
+        self.assertEqual(tt.search('four', None), self.expected)
+        self.assertEqual(tt.search('four', 'a'), [])
+
+    def test_unhashable(self):
+        tt = self.TT(self.table)
+        tt.append({'one': ['x'], 'two': 'y', 'three': 'z'})
+        self.assertRaises(ValueError, tt.append,
+                          {'one': ['x'], 'two': 'y', 'three': 'z'})
+        self.assertTrue(self.expected[0] in tt)
+
     def test_images(self):
         tt = self.TT("""REPOSITORY                    TAG                 IMAGE ID                                                           CREATED             VIRTUAL SIZE
 192.168.122.245:5000/fedora   32                  0d20aec6529d5d396b195182c0eaa82bfe014c3e82ab390203ed56a774d2c404   5 weeks ago         387 MB
@@ -16,6 +16,7 @@ import os.path
 import imp
 import sys
 import copy
+import threading
 from ConfigParser import Error
 from autotest.client.shared.error import TestError, TestNAError
 from autotest.client.shared.version import get_version
@@ -312,6 +313,64 @@ class SubSubtest(subtestbase.SubBase):
         return _config
 
 
+class SubSubtestRegistry(object):
+
+    """
+    Index of ``SubSubtest`` subclasses by name, for one subtest module
+
+    The subtest module is imported and indexed once, an external
+    module-file named after a sub-subtest class is imported once on
+    first lookup of that name.  Use ``get()`` for a cached instance.
+
+    :param pkg_path: Directory containing the subtest module-file(s)
+    :param modname: Name of the subtest module (and subtest class)
+    """
+
+    #: Cache of instances, by ``pkg_path`` and ``modname``
+    _registries = {}
+
+    def __init__(self, pkg_path, modname):
+        self.pkg_path = pkg_path
+        self.module = SubSubtestCaller.import_if_not_loaded(modname,
+                                                            [pkg_path])
+        # Class name to SubSubtest subclass, or None if not one
+        self._classes = {}
+        for name, value in vars(self.module).items():
+            if isinstance(value, type) and issubclass(value, SubSubtest):
+                self._classes[name] = value
+
+    @classmethod
+    def get(cls, pkg_path, modname):
+        """
+        Return cached instance for ``modname`` in ``pkg_path``, create if none
+        """
+        key = (pkg_path, modname)
+        registry = cls._registries.get(key)
+        if registry is None:
+            registry = cls._registries[key] = cls(pkg_path, modname)
+        return registry
+
+    def lookup(self, name):
+        """
+        Return ``SubSubtest`` subclass named name, or None if not one
+
+        :param name: Class name, optionally external module-file name.
+        """
+        try:
+            return self._classes[name]
+        except KeyError:
+            pass
+        cls = getattr(self.module, name, None)
+        # Not found in subtest module, look in external module with same name
+        if cls is None:
+            mod = SubSubtestCaller.import_if_not_loaded(name, [self.pkg_path])
+            cls = getattr(mod, name, None)
+        if not (isinstance(cls, type) and issubclass(cls, SubSubtest)):
+            cls = None
+        self._classes[name] = cls
+        return cls
+
+
 class SubSubtestCaller(Subtest):
 
     r"""
@@ -324,7 +383,10 @@ class SubSubtestCaller(Subtest):
     option.  Child subsubtest configuration section is formed by appending the
     child's subclass name onto the parent's ``config_section`` value.  Parent
     configuration is passed to subsubtest, with the subsubtest's section
-    overriding values with the same option name.
+    overriding values with the same option name.  When the ``max_parallel``
+    config. option is above one, up to that many subsubtests run at once,
+    except those sharing any of their ``exclusive`` (CSV) config. option
+    resource names.
     """
 
     #: A list holding the ordered names of each subsubtest to load and run.
@@ -344,6 +406,10 @@ class SubSubtestCaller(Subtest):
     #: for logging/debugging purposes while calling methods.  (read-only)
     exception_info = None
 
+    # Private cache of control CSV values, subsubtest_names, and what
+    # subsub_control_enabled() computes from them, see _control_filter()
+    _control_filter_cache = None
+
     def __init__(self, *args, **dargs):
         super(SubSubtestCaller, self).__init__(*args, **dargs)
         #: Need separate private dict similar to `sub_stuff` but different name
@@ -420,10 +486,11 @@ class SubSubtestCaller(Subtest):
         :param name:  String, name of subsubtest class (and possibly module)
         :param subsubtest:  Instance of subsubtest or subclass
         """
+        method = None
         try:
-            self.call_subsubtest_method(subsubtest.initialize)
-            self.call_subsubtest_method(subsubtest.run_once)
-            self.call_subsubtest_method(subsubtest.postprocess)
+            for method in (subsubtest.initialize, subsubtest.run_once,
+                           subsubtest.postprocess):
+                self.call_subsubtest_method(method)
             # No exceptions, contribute to subtest success
             self.final_subsubtests.add(name)
         # Catching general exception to allow logging
@@ -431,11 +498,9 @@ class SubSubtestCaller(Subtest):
         # more general exception.
         # pylint: disable=W0703
         except Exception, detail:
-            self.logtraceback(name,
-                              self.exception_info["exc_info"],
-                              self.exception_info["error_source"],
-                              detail)
-            exc_info = self.exception_info["exc_info"]
+            # exception_info may belong to another thread's subsubtest
+            exc_info = sys.exc_info()
+            self.logtraceback(name, exc_info, method.func_name, detail)
             if self.is_known_failure(name):
                 self.logwarning("Treating %s subsubtest failure as PASS", name)
                 self.final_subsubtests.add(name)
@@ -494,10 +559,101 @@ class SubSubtestCaller(Subtest):
         if not self.subsubtest_names:
             self.logwarning("No sub-subtests configured to run "
                             "for subtest %s" % self.config_section)
+        elif int(self.config.get('max_parallel', 1)) > 1:
+            self.run_scheduled(int(self.config['max_parallel']))
         else:
             for name in self.subsubtest_names:
                 self.run_all_stages(name, self.new_subsubtest(name))
 
+    def run_scheduled(self, max_parallel):
+        """
+        Call ``run_all_stages()`` for up to max_parallel subsubtests at a time,
+        in separate threads, see ``run_exclusive()``.
+
+        :param max_parallel: Maximum number of concurrently running subsubtests
+        :raise DockerTestError: On subsubtest ``cleanup()`` failures **only**,
+                                after all subsubtests finish.
+        """
+        items = []
+        for name in self.subsubtest_names:
+            subsubtest = self.new_subsubtest(name)
+            if subsubtest is None:
+                continue  # Assume a message was already logged
+            items.append((name, subsubtest))
+        errors = self.run_exclusive(items, max_parallel,
+                                    self.run_all_stages)
+        # Logs of concurrent subsubtests interleave, summarize in order
+        for name in self.subsubtest_names:
+            if name not in self.start_subsubtests:
+                continue
+            if name in self.final_subsubtests:
+                self.loginfo("Sub-subtest %s: PASS", name)
+            else:
+                self.loginfo("Sub-subtest %s: FAIL", name)
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
+    def run_exclusive(self, items, max_parallel, target):
+        """
+        Call target(name, subsubtest) for each of items, up to max_parallel
+        at a time in separate threads.  Items start in order, except one
+        sharing an ``exclusive`` (CSV) config. option resource name with any
+        running item waits, and later items may start first.
+
+        :param items: List of (name, subsubtest) tuples
+        :param max_parallel: Maximum number of concurrent target calls
+        :param target: Callable passed name and subsubtest of each item
+        :return: List of exc_info tuples raised by target, in finish order
+        """
+        pending = []
+        for name, subsubtest in items:
+            exclusive = subsubtest.config.get('exclusive', '')
+            pending.append((name, subsubtest,
+                            set(config.get_as_list(exclusive))))
+        busy = set()  # resource names held by running items
+        running = []  # thread of each running item
+        errors = []
+        cond = threading.Condition()
+
+        def run(name, subsubtest, resources):
+            try:
+                target(name, subsubtest)
+            # Catching general exception, to return after all finish
+            # pylint: disable=W0703
+            except Exception:
+                errors.append(sys.exc_info())
+            finally:
+                with cond:
+                    busy.difference_update(resources)
+                    running.remove(threading.current_thread())
+                    cond.notify()
+
+        threads = []
+        with cond:
+            while pending:
+                ready = None
+                if len(running) < max_parallel:
+                    for item in pending:
+                        if not item[2] & busy:
+                            ready = item
+                            break
+                if ready is None:
+                    cond.wait()
+                    continue
+                pending.remove(ready)
+                name, subsubtest, resources = ready
+                if resources:
+                    self.logdebug("Starting %s, exclusive: %s", name,
+                                  ", ".join(sorted(resources)))
+                busy.update(resources)
+                thread = threading.Thread(target=run, name=name, args=ready)
+                running.append(thread)
+                threads.append(thread)
+                thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
     def postprocess(self):
         """
         Compare set of subsubtest name (keys) from ``start_subsubtests``
@@ -552,42 +708,51 @@ class SubSubtestCaller(Subtest):
                 return True
         return False
 
-    def subsub_control_enabled(self, name, control_config):
+    def _control_filter(self, control_config):
         """
-        Return True if name not excluded in control.ini
+        Return subthings, excludes, and includes sets for name filtering
+
+        Subthings is None when nothing runs.  Includes or subthings are empty
+        when they name no specific sub-subtest, i.e. don't limit anything.
+        Cached until control_config values or ``subsubtest_names`` change.
         """
         subthings_csv = control_config.get('subthings', '')
         exclude_csv = control_config.get('exclude', '')
         include_csv = control_config.get('include', '')
+        key = (subthings_csv, exclude_csv, include_csv,
+               tuple(self.subsubtest_names))
+        cached = self._control_filter_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
         if subthings_csv != '':
-            subthings = [subthing.strip()
-                         for subthing in config.get_as_list(subthings_csv)]
-        else:
-            return False  # nothing is suppose to run?!?!?!?!?
-        if exclude_csv != '':
-            excludes = [exclude.strip()
-                        for exclude in config.get_as_list(exclude_csv)]
-            if name in excludes:
-                return False
-            # else more checking reqired
-        else:
-            excludes = []  # exclude nothing
-        if include_csv != '':
-            includes = [include.strip()
-                        for include in config.get_as_list(include_csv)]
-            # Can't use self.config['subsubtests'] b/c initialize() could
-            # have modified/augmented it.
-            specifics = self.subsubtests_in_list(self.subsubtest_names,
-                                                 includes)
-            if specifics:
-                return name in includes
+            subthings = set(config.get_as_list(subthings_csv))
+            # everything included, specific sub-subtests?
+            if not self.subsubtests_in_list(self.subsubtest_names,
+                                            subthings):
+                subthings = set()
         else:
+            subthings = None  # nothing is suppose to run?!?!?!?!?
+        excludes = set(config.get_as_list(exclude_csv))
+        # Can't use self.config['subsubtests'] b/c initialize() could
+        # have modified/augmented it.
+        includes = set(config.get_as_list(include_csv))
+        if not self.subsubtests_in_list(self.subsubtest_names, includes):
             # All self.subsubtest_names included if none appear
-            pass
-        # everything included, name not excluded, specific sub-subtests?
-        specifics = self.subsubtests_in_list(self.subsubtest_names,
-                                             subthings)
-        if specifics:
+            includes = set()
+        result = (subthings, excludes, includes)
+        self._control_filter_cache = (key, result)
+        return result
+
+    def subsub_control_enabled(self, name, control_config):
+        """
+        Return True if name not excluded in control.ini
+        """
+        subthings, excludes, includes = self._control_filter(control_config)
+        if subthings is None or name in excludes:
+            return False
+        if includes:
+            return name in includes
+        if subthings:
             return name in subthings
         # This code is running, assume all sub-subtests should run.
         return True
@@ -618,17 +783,12 @@ class SubSubtestCaller(Subtest):
         :param name: Class name, optionally external module-file name.
         :return: ``SubSubtest`` instance or ``None`` if failed to load
         """
-        # Try in external module-file named 'name' also
-        mydir = self.bindir
-        # Look in module holding this subclass for subsubtest class first.
-        myname = self.__class__.__name__
-        mod = self.import_if_not_loaded(myname, [mydir])
-        cls = getattr(mod, name, None)
-        # Not found in this module, look in external module file with same name
-        if cls is None:
-            mod = self.import_if_not_loaded(name, [mydir])
-            cls = getattr(mod, name, None)
-        if issubclass(cls, SubSubtest):
+        # Look in module holding this subclass for subsubtest class first,
+        # then in external module-file named 'name'.
+        registry = SubSubtestRegistry.get(self.bindir,
+                                          self.__class__.__name__)
+        cls = registry.lookup(name)
+        if cls is not None:
             # Don't load excluded sub-subtests
             name = cls.make_name(self.config_section)
             if not self.subsub_enabled(cls):
@@ -657,7 +817,10 @@ class SubSubtestCallerSimultaneous(SubSubtestCaller):
     option.  Child subsubtest configuration section is formed by appending the
     child's subclass name onto the parent's ``config_section`` value.  Parent
     configuration is passed to subsubtest, with the subsubtest's section
-    overriding values with the same option name.
+    overriding values with the same option name.  Up to ``max_parallel``
+    (config. option) subsubtest ``run_once`` methods execute concurrently,
+    in separate threads, except those sharing any of their ``exclusive``
+    (CSV) config. option resource names.
 
     :param \*args: Passed through to super-class.
     :param \*\*dargs: Passed through to super-class.
@@ -702,18 +865,36 @@ class SubSubtestCallerSimultaneous(SubSubtestCaller):
         # DO NOT CALL superclass run_once(); this variation works
         # completely differently!
         self.log_step_msg('run_once')
-        for name, subsubtest in self.run_subsubtests.items():
-            try:
-                subsubtest.run_once()
-                # Allow postprocess()
-                self.post_subsubtests[name] = subsubtest
-            # Catching general exception here, b/c cleanup
-            # step must be guaranteed to run.  Exception
-            # details will be logged instead.
-            # pylint: disable=W0703
-            except Exception, detail:
-                # Log problem, don't add to post_subsubtests
-                self.logtraceback(name, sys.exc_info(), "run_once", detail)
+        items = [(name, self.run_subsubtests[name])
+                 for name in self.subsubtest_names
+                 if name in self.run_subsubtests]
+        max_parallel = int(self.config.get('max_parallel', 1))
+        if max_parallel <= 1:
+            for name, subsubtest in items:
+                self.try_run_once(name, subsubtest)
+            return
+        self.loginfo("Running up to %d sub-subtests at once", max_parallel)
+        self.run_exclusive(items, max_parallel, self.try_run_once)
+
+    def try_run_once(self, name, subsubtest):
+        """
+        Call subsubtest's ``run_once()``, adding it to ``post_subsubtests``
+        unless an exception is raised (and logged).
+
+        :param name: Name of subsubtest
+        :param subsubtest: Subsubtest instance
+        """
+        try:
+            subsubtest.run_once()
+            # Allow postprocess()
+            self.post_subsubtests[name] = subsubtest
+        # Catching general exception here, b/c cleanup
+        # step must be guaranteed to run.  Exception
+        # details will be logged instead.
+        # pylint: disable=W0703
+        except Exception, detail:
+            # Log problem, don't add to post_subsubtests
+            self.logtraceback(name, sys.exc_info(), "run_once", detail)
 
     def postprocess(self):
         # DO NOT CALL superclass postprocess(); this variation works
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from unittest2 import TestCase, main
+
+
+###############################################################################
+# BEGIN boilerplate crap needed for subtests, which should be refactored
+
+# DO NOT allow this function to get loose in the wild!
+def mock(mod_path):
+    """
+    Recursively inject tree of mocked modules from entire mod_path
+    """
+    name_list = mod_path.split('.')
+    child_name = name_list.pop()
+    child_mod = sys.modules.get(mod_path, types.ModuleType(child_name))
+    if len(name_list) == 0:  # child_name is left-most basic module
+        if child_name not in sys.modules:
+            sys.modules[child_name] = child_mod
+        return sys.modules[child_name]
+    else:
+        # New or existing child becomes parent
+        recurse_path = ".".join(name_list)
+        parent_mod = mock(recurse_path)
+        if not hasattr(sys.modules[recurse_path], child_name):
+            setattr(parent_mod, child_name, child_mod)
+            # full-name also points at child module
+            sys.modules[mod_path] = child_mod
+        return sys.modules[mod_path]
+
+# Mock module and exception class in one stroke
+setattr(mock('autotest.client.test'), 'test', object)
+mock('autotest.client.utils')
+mock('autotest.client.shared.utils')
+mock('autotest.client.shared.service')
+setattr(mock('autotest.client.shared.error'), 'CmdError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestFail', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestNAError', Exception)
+setattr(mock('autotest.client.shared.error'), 'AutotestError', Exception)
+setattr(mock('autotest.client.shared.version'), 'get_version',
+        lambda: version.AUTOTESTVERSION)
+
+import version
+
+# END   boilerplate crap needed for subtests, which should be refactored
+###############################################################################
+
+
+class StubSubSubtest(object):
+
+    """Just enough of a SubSubtest for scheduling"""
+
+    def __init__(self, exclusive):
+        self.config = {'exclusive': exclusive}
+
+
+class SubtestTestBase(TestCase):
+
+    def setUp(self):
+        import subtest
+        self.subtest = subtest
+
+    def make_caller(self, names, exclusive=None, durations=None,
+                    failures=None):
+        """
+        Return SubSubtestCaller recording start/end of each subsubtest name
+
+        :param exclusive: Optional dict of name to exclusive CSV
+        :param durations: Optional dict of name to seconds running, or 0.1
+        :param failures: Optional dict of name to exception instance raised
+        """
+        if exclusive is None:
+            exclusive = {}
+        if durations is None:
+            durations = {}
+        if failures is None:
+            failures = {}
+
+        class StubCaller(self.subtest.SubSubtestCaller):
+
+            # Subtest.__init__ requires a real autotest job
+            # pylint: disable=W0231
+            def __init__(self):
+                self.subsubtest_names = list(names)
+                self.start_subsubtests = {}
+                self.final_subsubtests = set()
+                self.exception_info = {}
+                self.lock = threading.Lock()
+                self.events = []
+                self.running = 0
+                self.max_running = 0
+
+            @staticmethod
+            def new_subsubtest(name):
+                return StubSubSubtest(exclusive.get(name, ''))
+
+            def run_all_stages(self, name, subsubtest):
+                with self.lock:
+                    self.events.append(('start', name))
+                    self.running += 1
+                    self.max_running = max(self.max_running, self.running)
+                time.sleep(durations.get(name, 0.1))
+                with self.lock:
+                    self.events.append(('end', name))
+                    self.running -= 1
+                if name in failures:
+                    raise failures[name]
+                self.start_subsubtests[name] = subsubtest
+                self.final_subsubtests.add(name)
+
+            def logdebug(self, *args, **dargs):
+                pass
+
+            loginfo = logdebug
+
+        return StubCaller()
+
+
+class TestRunScheduled(SubtestTestBase):
+
+    def test_exclusive_never_overlap(self):
+        caller = self.make_caller(['a', 'b'], exclusive={'a': 'x, y',
+                                                         'b': 'y'})
+        caller.run_scheduled(2)
+        self.assertEqual(caller.events, [('start', 'a'), ('end', 'a'),
+                                         ('start', 'b'), ('end', 'b')])
+
+    def test_max_parallel(self):
+        caller = self.make_caller(['a', 'b', 'c', 'd', 'e'])
+        caller.run_scheduled(2)
+        self.assertEqual(caller.max_running, 2)
+        self.assertEqual(caller.final_subsubtests,
+                         set(['a', 'b', 'c', 'd', 'e']))
+
+    def test_later_starts_first(self):
+        caller = self.make_caller(['a', 'b', 'c'],
+                                  exclusive={'a': 'x', 'b': 'x'})
+        caller.run_scheduled(2)
+        starts = [name for event, name in caller.events if event == 'start']
+        self.assertEqual(starts, ['a', 'c', 'b'])
+        # b waited for a, even though a slot was free
+        self.assertTrue(caller.events.index(('end', 'a')) <
+                        caller.events.index(('start', 'b')))
+
+    def test_first_error_after_all(self):
+        caller = self.make_caller(['a', 'b', 'c'],
+                                  durations={'a': 0.01, 'b': 0.3,
+                                             'c': 0.01},
+                                  failures={'a': ValueError('a'),
+                                            'c': KeyError('c')})
+        self.assertRaises(ValueError, caller.run_scheduled, 2)
+        # Raised only after every subsubtest finished
+        self.assertEqual(caller.running, 0)
+        self.assertEqual(sorted(name for event, name in caller.events
+                                if event == 'end'), ['a', 'b', 'c'])
+        self.assertEqual(caller.final_subsubtests, set(['b']))
+
+
+class RecordingSubSubtest(StubSubSubtest):
+
+    """Records run_once() start/end and cleanup() into caller"""
+
+    def __init__(self, caller, name, exclusive, duration, failure):
+        super(RecordingSubSubtest, self).__init__(exclusive)
+        self.caller = caller
+        self.name = name
+        self.duration = duration
+        self.failure = failure
+
+    def run_once(self):
+        caller = self.caller
+        with caller.lock:
+            caller.events.append(('start', self.name))
+            caller.running += 1
+            caller.max_running = max(caller.max_running, caller.running)
+        time.sleep(self.duration)
+        with caller.lock:
+            caller.events.append(('end', self.name))
+            caller.running -= 1
+        if self.failure is not None:
+            raise self.failure
+
+    def postprocess(self):
+        pass
+
+    def cleanup(self):
+        self.caller.events.append(('cleanup', self.name))
+
+
+class TestSimultaneous(SubtestTestBase):
+
+    def make_simultaneous(self, names, max_parallel, exclusive=None,
+                          failures=None):
+        """
+        Return SubSubtestCallerSimultaneous as if initialize() succeeded
+
+        :param exclusive: Optional dict of name to exclusive CSV
+        :param failures: Optional dict of name to exception instance raised
+        """
+        if exclusive is None:
+            exclusive = {}
+        if failures is None:
+            failures = {}
+
+        class StubSimultaneous(self.subtest.SubSubtestCallerSimultaneous):
+
+            # Subtest.__init__ requires a real autotest job
+            # pylint: disable=W0231
+            def __init__(self):
+                self.config = {'max_parallel': str(max_parallel)}
+                self.config_section = 'p/s'
+                self.step_log_msgs = {}
+                self.subsubtest_names = list(names)
+                self.post_subsubtests = {}
+                self.lock = threading.Lock()
+                self.events = []
+                self.tracebacks = []
+                self.running = 0
+                self.max_running = 0
+                self.start_subsubtests = dict(
+                    (name, RecordingSubSubtest(self, name,
+                                               exclusive.get(name, ''),
+                                               0.1, failures.get(name)))
+                    for name in names)
+                self.run_subsubtests = dict(self.start_subsubtests)
+
+            def logtraceback(self, name, exc_info, error_source, detail):
+                self.tracebacks.append((name, error_source))
+
+            def logdebug(self, *args, **dargs):
+                pass
+
+            loginfo = logdebug
+
+        return StubSimultaneous()
+
+    def test_sequential(self):
+        caller = self.make_simultaneous(['a', 'b', 'c'], 1)
+        caller.run_once()
+        self.assertEqual(caller.max_running, 1)
+        starts = [name for event, name in caller.events if event == 'start']
+        self.assertEqual(starts, ['a', 'b', 'c'])
+
+    def test_max_parallel(self):
+        caller = self.make_simultaneous(['a', 'b', 'c', 'd', 'e'], 2)
+        caller.run_once()
+        self.assertEqual(caller.max_running, 2)
+        self.assertEqual(sorted(caller.post_subsubtests.keys()),
+                         ['a', 'b', 'c', 'd', 'e'])
+
+    def test_exclusive_never_overlap(self):
+        caller = self.make_simultaneous(['a', 'b', 'c'], 3,
+                                        exclusive={'a': 'x', 'c': 'y, x'})
+        caller.run_once()
+        self.assertEqual(caller.max_running, 2)
+        self.assertTrue(caller.events.index(('end', 'a')) <
+                        caller.events.index(('start', 'c')))
+
+    def test_failure_cleanup(self):
+        caller = self.make_simultaneous(['a', 'b', 'c'], 2,
+                                        failures={'b': ValueError('b')})
+        caller.run_once()
+        self.assertEqual(caller.tracebacks, [('b', 'run_once')])
+        self.assertEqual(sorted(caller.post_subsubtests.keys()), ['a', 'c'])
+        self.assertRaises(self.subtest.DockerTestFail, caller.postprocess)
+        caller.cleanup()
+        cleanups = [name for event, name in caller.events
+                    if event == 'cleanup']
+        self.assertEqual(sorted(cleanups), ['a', 'b', 'c'])
+
+class TestSubSubtestRegistry(SubtestTestBase):
+
+    modules = {'regsub': ('from subtest import SubSubtest, SubSubtestCaller\n'
+                          'class regsub(SubSubtestCaller):\n'
+                          '    pass\n'
+                          'class inmodule(SubSubtest):\n'
+                          '    pass\n'
+                          'class plain(object):\n'
+                          '    pass\n'
+                          'notsubsub = 42\n'),
+               'external': ('from subtest import SubSubtest\n'
+                            'class external(SubSubtest):\n'
+                            '    pass\n'),
+               'noclass': 'something = None\n'}
+
+    def setUp(self):
+        super(TestSubSubtestRegistry, self).setUp()
+        self.pkg_path = tempfile.mkdtemp(self.__class__.__name__)
+        for name, source in self.modules.items():
+            with open(os.path.join(self.pkg_path, name + '.py'), 'wb') as mod:
+                mod.write(source)
+        self.registry = self.subtest.SubSubtestRegistry.get(self.pkg_path,
+                                                            'regsub')
+
+    def tearDown(self):
+        shutil.rmtree(self.pkg_path, ignore_errors=True)
+        self.subtest.SubSubtestRegistry._registries.clear()
+        for name in self.modules:
+            sys.modules.pop(name, None)
+        super(TestSubSubtestRegistry, self).tearDown()
+
+    def test_cached(self):
+        self.assertTrue(self.registry is
+                        self.subtest.SubSubtestRegistry.get(self.pkg_path,
+                                                            'regsub'))
+
+    def test_in_module(self):
+        cls = self.registry.lookup('inmodule')
+        self.assertTrue(cls is sys.modules['regsub'].inmodule)
+        self.assertFalse('external' in sys.modules)
+
+    def test_external(self):
+        cls = self.registry.lookup('external')
+        self.assertTrue(cls is sys.modules['external'].external)
+        self.assertTrue(issubclass(cls, self.subtest.SubSubtest))
+
+    def test_miss_remembered(self):
+        self.assertEqual(self.registry.lookup('noclass'), None)
+        # Not imported again
+        del sys.modules['noclass']
+        os.unlink(os.path.join(self.pkg_path, 'noclass.py'))
+        self.assertEqual(self.registry.lookup('noclass'), None)
+        self.assertFalse('noclass' in sys.modules)
+
+    def test_not_subsubtest(self):
+        self.assertEqual(self.registry.lookup('plain'), None)
+        self.assertEqual(self.registry.lookup('notsubsub'), None)
+        self.assertEqual(self.registry.lookup('regsub'), None)
+
+
+class TestSubsubControlEnabled(SubtestTestBase):
+
+    names = ('p/s/a', 'p/s/b', 'p/s/c')
+
+    def setUp(self):
+        super(TestSubsubControlEnabled, self).setUp()
+        self.caller = self.make_caller(['a', 'b', 'c'])
+        self.caller.config_section = 'p/s'
+
+    def enabled(self, subthings='', exclude='', include=''):
+        control_config = {'subthings': subthings, 'exclude': exclude,
+                          'include': include}
+        return [self.caller.subsub_control_enabled(name, dict(control_config))
+                for name in self.names]
+
+    def test_nothing(self):
+        self.assertEqual(self.enabled(), [False, False, False])
+        self.assertEqual(self.enabled(exclude='p/s/b', include='p/s/a'),
+                         [False, False, False])
+
+    def test_subthings(self):
+        self.assertEqual(self.enabled('p/s'), [True, True, True])
+        self.assertEqual(self.enabled('p/s, p/s/b'), [False, True, False])
+        self.assertEqual(self.enabled(','), [True, True, True])
+
+    def test_exclude(self):
+        self.assertEqual(self.enabled('p/s', exclude='p/s/b'),
+                         [True, False, True])
+        self.assertEqual(self.enabled('p/s/a,p/s/b', exclude='p/s/b'),
+                         [True, False, False])
+
+    def test_include(self):
+        self.assertEqual(self.enabled('p/s', include='p/s/c'),
+                         [False, False, True])
+        # Include of other subtests doesn't limit these
+        self.assertEqual(self.enabled('p/s', include='x/y'),
+                         [True, True, True])
+        # Include overrides specific subthings
+        self.assertEqual(self.enabled('p/s/a', include='p/s/a, p/s/c'),
+                         [True, False, True])
+        self.assertEqual(self.enabled('p/s', exclude='p/s/c',
+                                      include='p/s/a, p/s/c'),
+                         [True, False, False])
+
+    def test_parsed_once(self):
+        get_as_list = self.subtest.config.get_as_list
+        calls = []
+
+        def counting(*args, **dargs):
+            calls.append(args)
+            return get_as_list(*args, **dargs)
+        self.subtest.config.get_as_list = counting
+        try:
+            self.enabled('p/s', exclude='p/s/b')
+            self.assertEqual(len(calls), 3)
+            # Equal values in a new control_config dict copy
+            self.enabled('p/s', exclude='p/s/b')
+            self.assertEqual(len(calls), 3)
+            self.enabled('p/s', exclude='p/s/c')
+            self.assertEqual(len(calls), 6)
+        finally:
+            self.subtest.config.get_as_list = get_as_list
+
+
+if __name__ == '__main__':
+    main()
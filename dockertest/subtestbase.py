@@ -15,6 +15,7 @@ from xceptions import DockerTestFail
 from xceptions import DockerTestNAError
 from config import CONFIGCUSTOMS, get_as_list
 from environment import docker_rpm
+import dockertest.listcache as listcache
 
 
 def known_failures_file():
@@ -148,6 +149,9 @@ class SubBase(object):
         Always called, before any exceptions thrown are re-raised.
         """
         self.log_step_msg('cleanup')
+        cache = listcache.peek(self)
+        if cache is not None:
+            self.logdebug("Container/image listing cache: %s", cache)
         self.overlook_known_failures()
 
     def overlook_known_failures(self):
@@ -8,10 +8,13 @@ images from the local registry.
 Operational Summary
 ----------------------
 
-#. Check for unexpected running containers
-#. Kill unexpected running containers
-#. Remove unexpected containers
-#. Remove unexpected images
+#. List containers and images once, for all sub-subtests.  Or, when
+   ``track_events`` is enabled, only inspect containers created since
+   the previous check, and only list images if any could have been added.
+#. Remove unexpected containers (running or not) in parallel
+#. Remove unexpected images, children before parents, in parallel batches
+#. Remove unexpected ``<none>`` images the same way
+#. Report unexpected containers and images which were not removed
 
 Prerequisites
 ---------------
@@ -19,12 +22,22 @@ Prerequisites
 Customized configuration listing expected containers and images.
 """
 
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from Queue import Queue, Empty
 from dockertest.subtest import SubSubtestCaller
 from dockertest.subtest import SubSubtest
+from dockertest.containers import DockerContainer
 from dockertest.containers import DockerContainers
 from dockertest.images import DockerImage
 from dockertest.images import DockerImages
+from dockertest.dockercmd import DockerCmd
 from dockertest.config import get_as_list
+from dockertest.output import parse_event, event_object
 
 
 class DockerImageIncomplete(DockerImage):
@@ -60,7 +73,7 @@ class DockerImageIncomplete(DockerImage):
                 return self.cmp_greedy(other.repo, other.tag,
                                        other.repo_addr, other.user)
             return False
-        return super(DockerImageIncomplete, self.__eq__(other))
+        return super(DockerImageIncomplete, self).__eq__(other)
 
     @classmethod
     def prob_is_fqin(cls, fqin_or_id):
@@ -84,6 +97,216 @@ class DockerImageIncomplete(DockerImage):
         return fqin_score > 0
 
 
+def in_parallel(func, items, workers):
+    """
+    Call func(item) for every item using at most workers threads
+
+    :param func: Callable taking a single item
+    :param items: Iterable of items
+    :param workers: Maximum number of concurrent calls
+    :raise: First exception raised by func, after all calls finish
+    """
+    queue = Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except Empty:
+                return
+            try:
+                func(item)
+            except Exception:  # pylint: disable=W0703
+                errors.append(sys.exc_info())
+
+    threads = [threading.Thread(target=worker)
+               for _ in xrange(max(1, min(int(workers), queue.qsize())))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+
+def is_none_image(img):
+    """
+    Return True if DockerImage-like img has no repository name (``<none>``)
+    """
+    return img.repo is None or not img.repo or img.repo == '<none>'
+
+
+def removal_waves(long_ids, parents):
+    """
+    Group image IDs so no image is removed before any of its children
+
+    :param long_ids: Ordered sequence of image long IDs to be removed
+    :param parents: Dictionary of image long ID to parent's long ID
+    :return: List of lists of long IDs, removable in order, each list's
+             content in any order.
+    """
+    remaining = list(long_ids)
+    waves = []
+    while remaining:
+        # Parents of anything still remaining must wait
+        busy = set([parents.get(long_id) for long_id in remaining])
+        wave = [long_id for long_id in remaining if long_id not in busy]
+        if not wave:  # Loop in parent data?!?  Don't hang
+            wave = remaining
+        waves.append(wave)
+        remaining = [long_id for long_id in remaining if long_id not in wave]
+    return waves
+
+
+class EventsDelta(object):
+
+    """
+    Containers and images possibly created, according to docker events
+
+    :param containers: Iterable of container IDs, or None if unknown
+    :param images_dirty: True if any image may have been created
+    """
+
+    #: Container event operations creating / removing a container
+    CREATE_OPS = ('create',)
+    DESTROY_OPS = ('destroy',)
+    #: Operations which can only ever remove images
+    UNTAG_OPS = ('untag', 'delete')
+
+    def __init__(self, containers=(), images_dirty=False):
+        if containers is not None:
+            containers = set(containers)
+        self.containers = containers
+        self.images_dirty = images_dirty
+
+    def update(self, lines):
+        """
+        Add objects created by events lines, drop those destroyed
+
+        :param lines: Iterable of ``docker events`` output lines
+        """
+        for line in lines:
+            if not line.strip():
+                continue
+            details = parse_event(line)
+            if details is None:  # Can't know what happened
+                self.containers = None
+                self.images_dirty = True
+                continue
+            obj = event_object(details)
+            operation = details['operation']
+            if obj == 'container':
+                # commit creates an image, as do intermediate build containers
+                if operation == 'commit':
+                    self.images_dirty = True
+                if self.containers is None:
+                    continue
+                if operation in self.CREATE_OPS:
+                    self.containers.add(details['identifier'])
+                elif operation in self.DESTROY_OPS:
+                    self.containers.discard(details['identifier'])
+            elif obj == 'image' and operation not in self.UNTAG_OPS:
+                self.images_dirty = True
+
+
+class EventsTracker(object):
+
+    """
+    Detached ``docker events`` process logging to a file, for a whole job
+
+    :param dirname: Directory to hold event log and state file, shared by
+                    all tests in the job.
+    """
+
+    log_filename = 'garbage_check_events.log'
+    state_filename = 'garbage_check_events.json'
+
+    def __init__(self, dirname):
+        self.log_path = os.path.join(dirname, self.log_filename)
+        self.state_path = os.path.join(dirname, self.state_filename)
+        self.state = self.load()
+
+    def load(self):
+        """
+        Return state dictionary from state file, or empty dict if none/bad
+        """
+        try:
+            with open(self.state_path, 'rb') as state_file:
+                return json.load(state_file)
+        except (IOError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Atomically replace state file with current state
+        """
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'wb') as state_file:
+            json.dump(self.state, state_file)
+        os.rename(tmp_path, self.state_path)
+
+    def running(self):
+        """
+        Return True if events process from state file is still logging
+        """
+        pid = self.state.get('pid')
+        if not pid or self.state.get('until', 0) <= time.time():
+            return False
+        try:
+            with open('/proc/%d/cmdline' % pid, 'rb') as cmdline:
+                return 'events' in cmdline.read()
+        except IOError:  # Gone
+            return False
+
+    def start(self, command, until):
+        """
+        Start logging output of events command, detached from this process
+
+        :param command: Full ``docker events`` command line, exiting at until
+        :param until: Time (seconds since epoch) command will exit
+        """
+        with open(self.log_path, 'wb') as log_file:
+            with open(os.devnull, 'r+b') as devnull:
+                # Must outlive this test's process, and not hold it's files
+                proc = subprocess.Popen('exec %s' % command, shell=True,
+                                        stdin=devnull, stdout=log_file,
+                                        stderr=devnull, close_fds=True,
+                                        preexec_fn=os.setsid)
+        self.state = {'pid': proc.pid, 'until': until, 'offset': 0,
+                      'containers': [], 'images_dirty': False}
+        self.save()
+
+    def delta(self):
+        """
+        Return ``EventsDelta`` for events since last ``checkpoint()``
+        """
+        offset = self.state.get('offset', 0)
+        with open(self.log_path, 'rb') as log_file:
+            log_file.seek(offset)
+            data = log_file.read()
+        # Leave any partially written line for next time
+        data = data[:data.rfind('\n') + 1]
+        self.state['offset'] = offset + len(data)
+        delta = EventsDelta(self.state.get('containers', ()),
+                            self.state.get('images_dirty', False))
+        delta.update(data.splitlines())
+        return delta
+
+    def checkpoint(self, containers, images_dirty):
+        """
+        Record events consumed, and leftovers to check again next time
+
+        :param containers: Iterable of container IDs not removed
+        :param images_dirty: True if leftover images were not removed
+        """
+        self.state['containers'] = list(containers)
+        self.state['images_dirty'] = bool(images_dirty)
+        self.save()
+
+
 class garbage_check(SubSubtestCaller):
     # This runs between EVERY subtest, okay, to be more quiet.
     step_log_msgs = {}
@@ -92,15 +315,107 @@ class garbage_check(SubSubtestCaller):
         super(garbage_check, self).initialize()
         # Some runtime messages are added
         self.step_log_msgs = {}
+        self.stuff['dc'] = DockerContainers(self)
+        self.stuff['di'] = di = DockerImages(self)
+        di.DICLS = DockerImageIncomplete
 
+        # None means list everything
+        self.stuff['delta'] = None
+        # Sub-subtests record what they could not remove here
+        self.stuff['unremoved_containers'] = set()
+        self.stuff['unremoved_images'] = False
+        if self.config['track_events']:
+            self.track_events()
 
-class Base(SubSubtest):
+        # One snapshot of each, leftovers shared with all sub-subtests
+        images = self.current_images()
+        default_image = self.fuzzy_img(images, di.default_image)
+        self.stuff['default_image'] = default_image
 
-    # This runs between EVERY subtest, okay, to be more quiet.
-    step_log_msgs = {}
+        # Can't use set of DockerImageIncomplete -> it's mutable
+        preserve_images = [default_image]
+        for fqin_or_id in get_as_list(self.config['preserve_fqins']):
+            preserve_images.append(self.fuzzy_img(images, fqin_or_id))
+        self.stuff['preserve_images'] = preserve_images
 
-    def fuzzy_img(self, fqin_or_id):
-        di = self.sub_stuff['di']
+        preserve_cnames = set(get_as_list(self.config['preserve_cnames']))
+        self.stuff['preserve_cnames'] = preserve_cnames
+
+        self.stuff['leftover_containers'] = [
+            cntr for cntr in self.current_containers()
+            if cntr.container_name not in preserve_cnames]
+        self.stuff['leftover_images'] = [img for img in images
+                                         if img not in preserve_images]
+        # Long IDs of leftovers removed by sub-subtests
+        self.stuff['removed'] = set()
+
+    def track_events(self):
+        """
+        Use delta since last check if tracking events, otherwise start to.
+        """
+        tracker = EventsTracker(self.job.resultdir)
+        self.stuff['tracker'] = tracker
+        if tracker.running():
+            delta = tracker.delta()
+            self.stuff['delta'] = delta
+            if delta.containers is not None:
+                self.logdebug("Checking %d containers created since last "
+                              "check", len(delta.containers))
+            return
+        now = int(time.time())
+        until = now + self.config['track_events_lifetime']
+        dkrcmd = DockerCmd(self, 'events', ['--since=%d' % now,
+                                            '--until=%d' % until])
+        self.logdebug("Tracking events for next checks: %s", dkrcmd.command)
+        tracker.start(dkrcmd.command, until)
+
+    def current_containers(self):
+        """
+        Return list of all DockerContainer instances, or those in delta
+        """
+        delta = self.stuff['delta']
+        dc = self.stuff['dc']
+        if delta is None or delta.containers is None:
+            return dc.list_containers()
+        if not delta.containers:
+            return []
+        result = []
+        for long_id, item in dc.inspect_many(delta.containers).items():
+            cntr = DockerContainer(item['Config']['Image'],
+                                   json.dumps(" ".join(item['Config']['Cmd']
+                                                       or [])),
+                                   container_name=item['Name'].lstrip('/'))
+            cntr.long_id = long_id
+            cntr.created = item.get('Created')
+            result.append(cntr)
+        return result
+
+    def current_images(self):
+        """
+        Return list of all DockerImage-like instances, or none if delta clean
+        """
+        di = self.stuff['di']
+        delta = self.stuff['delta']
+        if delta is not None and not delta.images_dirty:
+            return di.DILCLS()
+        return di.list_imgs()
+
+    def cleanup(self):
+        super(garbage_check, self).cleanup()
+        tracker = self.stuff.get('tracker')
+        if tracker is not None:
+            tracker.checkpoint(self.stuff['unremoved_containers'],
+                               self.stuff['unremoved_images'])
+
+    @staticmethod
+    def fuzzy_img(images, fqin_or_id):
+        """
+        Return DockerImage-like from images matching fqin_or_id, or one
+        with whatever details are known.
+
+        :param images: ``DockerImageList`` instance to search
+        :param fqin_or_id: FQIN or image ID string
+        """
         repo = None
         tag = None
         repo_addr = None
@@ -111,8 +426,7 @@ class Base(SubSubtest):
         size = None
         if DockerImageIncomplete.prob_is_fqin(fqin_or_id):
             # Greedy match (i.e. doesn't compare None values)
-            imgs = di.filter_list_full_name(di.list_imgs(),
-                                            fqin_or_id)
+            imgs = images.with_full_name(fqin_or_id)
             if len(imgs) == 1:  # found it
                 return imgs[0]
             # Retrieve known infos
@@ -120,7 +434,7 @@ class Base(SubSubtest):
              repo_addr,
              user) = DockerImageIncomplete.split_to_component(fqin_or_id)
         else:
-            imgs = di.list_imgs_with_image_id(fqin_or_id)
+            imgs = images.with_image_id(fqin_or_id)
             if len(imgs) == 1:  # found it
                 return imgs[0]
             if len(fqin_or_id) == 12:
@@ -135,154 +449,186 @@ class Base(SubSubtest):
             img.short_id = short_id
         return img
 
-    def initialize(self):
-        super(Base, self).initialize()
-        self.step_log_msgs = {}
-        self.sub_stuff['dc'] = DockerContainers(self)
-        self.sub_stuff['di'] = di = DockerImages(self)
-        di.DICLS = DockerImageIncomplete
 
-        default_image = self.fuzzy_img(di.default_image)
-        self.sub_stuff['default_image'] = default_image
-
-        # Can't use set of DockerImageIncomplete -> it's mutable
-        preserve_images = [default_image]
-        for fqin_or_id in get_as_list(self.config['preserve_fqins']):
-            preserve_images.append(self.fuzzy_img(fqin_or_id))
-        self.sub_stuff['preserve_images'] = preserve_images
-
-        preserve_cnames = set(get_as_list(self.config['preserve_cnames']))
-        self.sub_stuff['preserve_cnames'] = preserve_cnames
-        self.sub_stuff['fail_containers'] = False
-        self.sub_stuff['fail_images'] = False
+class Base(SubSubtest):
 
-    def postprocess(self):
-        super(Base, self).postprocess()
-        dc = self.sub_stuff['dc']
-        preserve_cnames = self.sub_stuff['preserve_cnames']
-        leftover_containers = set(dc.list_container_names()) - preserve_cnames
-        if leftover_containers:
-            fail_containers = ("Found leftover containers "
-                               "from prior test: %s"
-                               % leftover_containers)
-            self.sub_stuff['fail_containers'] = fail_containers
+    # This runs between EVERY subtest, okay, to be more quiet.
+    step_log_msgs = {}
 
-        di = self.sub_stuff['di']
-        preserve_images = self.sub_stuff['preserve_images']
-        leftover_images = [img for img in di.list_imgs()
-                           if img not in preserve_images]
-        if leftover_images:
-            fail_images = ("Found leftover images "
-                           "from prior test: %s"
-                           % (leftover_images))
-            self.sub_stuff['fail_images'] = fail_images
-        # Let subclasses perform the actual failing (or not)
+    def initialize(self):
+        super(Base, self).initialize()
+        self.step_log_msgs = {}
+        for key in ('dc', 'di', 'leftover_containers', 'leftover_images',
+                    'removed'):
+            self.sub_stuff[key] = self.parent_subtest.stuff[key]
+
+    def unremoved(self, leftovers):
+        """
+        Return list of those leftovers no sub-subtest removed
+
+        :param leftovers: List of DockerContainer or DockerImage-like
+        """
+        removed = self.sub_stuff['removed']
+        return [item for item in leftovers if item.long_id not in removed]
+
+    def report_unremoved(self, what, unremoved):
+        """
+        Warn, or fail if ``fail_on_unremoved``, when anything was unremoved
+
+        :param what: Description of unremoved items
+        :param unremoved: Iterable of unremoved items, or their names
+        """
+        if not unremoved:
+            return
+        msg = "Found leftover %s from prior test: %s" % (what, unremoved)
+        if self.config['fail_on_unremoved']:
+            self.failif(True, msg)
+        else:
+            # No test failure, but maybe a warning
+            self.logwarning(msg)
+
+    def image_parents(self, long_ids):
+        """
+        Return dictionary of image long ID to it's parent's long ID
+
+        :param long_ids: Iterable of image long IDs to inspect
+        """
+        long_ids = list(set(long_ids))
+        parents = {}
+        # Plenty under ARG_MAX
+        for start in xrange(0, len(long_ids), 256):
+            subargs = ['--format', '"{{.Id}} {{.Parent}}"']
+            subargs += long_ids[start:start + 256]
+            dkrcmd = DockerCmd(self, 'inspect', subargs, verbose=False)
+            dkrcmd.quiet = True
+            for line in dkrcmd.execute().stdout.splitlines():
+                ids = line.split()
+                if len(ids) == 2:
+                    parents[ids[0]] = ids[1]
+        return parents
+
+    def remove_images(self, imgs, remove):
+        """
+        Call remove(img) for all imgs, children before parents, in parallel
+
+        :param imgs: List of DockerImage-like instances
+        :param remove: Callable taking single DockerImage-like argument
+        """
+        by_id = {}
+        for img in imgs:
+            by_id.setdefault(img.long_id, []).append(img)
+        parents = self.image_parents(by_id.keys())
+
+        def remove_all(long_id):
+            # Multiple tags of one image can't be removed concurrently
+            for img in by_id[long_id]:
+                try:
+                    remove(img)
+                except (ValueError, KeyError):
+                    pass  # Removal was the goal
+            self.sub_stuff['removed'].add(long_id)
+
+        # Keep listing order, for predictable logging
+        ordered = []
+        for img in imgs:
+            if by_id[img.long_id][0] is img:
+                ordered.append(img.long_id)
+        for wave in removal_waves(ordered, parents):
+            in_parallel(remove_all, wave, self.config['removal_workers'])
 
 
 class containers(Base):
 
     def run_once(self):
         super(containers, self).run_once()
-        preserve_cnames = self.sub_stuff['preserve_cnames']
-
+        if not self.config['remove_garbage']:
+            return
         dc = self.sub_stuff['dc']
-        dc.remove_args = '--force=true --volumes=true'
-        for name in set(dc.list_container_names()) - preserve_cnames:
-            if not self.config['remove_garbage']:
-                continue
+
+        def remove(cntr):
             self.logwarning("Removing left behind container: %s",
-                            name)
+                            cntr.container_name)
             try:
-                dc.remove_by_name(name)
+                dc.remove_by_obj(cntr)
             except (ValueError, KeyError):
                 pass  # Removal was the goal
-        # Don't presume what others methods will do with this instance
-        dc.remove_args = DockerContainers.remove_args
+            self.sub_stuff['removed'].add(cntr.long_id)
+
+        dc.remove_args = '--force=true --volumes=true'
+        try:
+            in_parallel(remove, self.sub_stuff['leftover_containers'],
+                        self.config['removal_workers'])
+        finally:
+            # Don't presume what others methods will do with this instance
+            dc.remove_args = DockerContainers.remove_args
 
     def postprocess(self):
-        # identify cleanup failures in base class
         super(containers, self).postprocess()
-        if not self.config['fail_on_unremoved']:
-            if self.sub_stuff['fail_containers']:
-                # No test failure, but maybe a warning
-                self.logwarning(self.sub_stuff['fail_containers'])
-        else:
-            self.failif(self.sub_stuff['fail_containers'],
-                        # Value is it's own failure message
-                        self.sub_stuff['fail_containers'])
+        unremoved = self.unremoved(self.sub_stuff['leftover_containers'])
+        self.parent_subtest.stuff['unremoved_containers'].update(
+            [cntr.long_id for cntr in unremoved])
+        self.report_unremoved('containers', set([cntr.container_name
+                                                 for cntr in unremoved]))
 
 
 class images(Base):
 
     def run_once(self):
         super(images, self).run_once()
-        preserve_images = self.sub_stuff['preserve_images']
+        if not self.config['remove_garbage']:
+            return
         di = self.sub_stuff['di']
-        di.remove_args = '--force=true'
-        leftover_images = [img for img in di.list_imgs()
-                           if img not in preserve_images]
-        for img in leftover_images:
-            # another sub-subtest will take care of <none> images
-            if img.repo == '' or img.repo is None:
-                continue
-            if not self.config['remove_garbage']:
-                continue
+        # another sub-subtest will take care of <none> images
+        leftover_images = [img for img in self.sub_stuff['leftover_images']
+                           if not is_none_image(img)]
+
+        def remove(img):
             self.logwarning("Removing left behind: %s", img)
-            try:
-                di.remove_image_by_image_obj(img)
-            except (ValueError, KeyError):
-                pass  # Removal was the goal
-        # Don't presume what others methods will do with this instance
-        di.remove_args = DockerImages.remove_args
+            di.remove_image_by_image_obj(img)
+
+        di.remove_args = '--force=true'
+        try:
+            self.remove_images(leftover_images, remove)
+        finally:
+            # Don't presume what others methods will do with this instance
+            di.remove_args = DockerImages.remove_args
 
     def postprocess(self):
-        # identify cleanup failures in base class
         super(images, self).postprocess()
-        if not self.config['fail_on_unremoved']:
-            if self.sub_stuff['fail_images']:
-                self.logwarning(self.sub_stuff['fail_images'])
-        else:
-            self.failif(self.sub_stuff['fail_images'],
-                        # Value is it's own failure message
-                        self.sub_stuff['fail_images'])
+        unremoved = [img for img in
+                     self.unremoved(self.sub_stuff['leftover_images'])
+                     if not is_none_image(img)]
+        if unremoved:
+            self.parent_subtest.stuff['unremoved_images'] = True
+        self.report_unremoved('images', unremoved)
 
 
 class nones(Base):
 
     def run_once(self):
         super(nones, self).run_once()
-        preserve_images = self.sub_stuff['preserve_images']
+        if not self.config['remove_garbage']:
+            return
         di = self.sub_stuff['di']
-        di.remove_args = '--force=true'
-        leftover_images = [img for img in di.list_imgs()
-                           if img not in preserve_images]
-        for img in leftover_images:
-            if img.repo is not None and img.repo and img.repo != '<none>':
-                continue
-            if not self.config['remove_garbage']:
-                continue
+        leftover_images = [img for img in self.sub_stuff['leftover_images']
+                           if is_none_image(img)]
+
+        def remove(img):
             self.logwarning("Removing leftover <none> image: %s", img)
-            try:
-                di.remove_image_by_id(img.short_id)
-            except (ValueError, KeyError):
-                pass  # Removal was the goal
-        # Don't presume what others methods will do with this instance
-        di.remove_args = DockerImages.remove_args
+            di.remove_image_by_id(img.short_id)
+
+        di.remove_args = '--force=true'
+        try:
+            self.remove_images(leftover_images, remove)
+        finally:
+            # Don't presume what others methods will do with this instance
+            di.remove_args = DockerImages.remove_args
 
     def postprocess(self):
-        # No super-call, this method is different
-        di = self.sub_stuff['di']
-        preserve_images = self.sub_stuff['preserve_images']
-        leftover_images = [img for img in di.list_imgs()
-                           if (img not in preserve_images and
-                               img.repo == '' or img.repo is None)]
-        if leftover_images:
-            fail_images = ("Found leftover <none>'s "
-                           "from prior test: %s"
-                           % (leftover_images))
-            # Just in case?
-            self.sub_stuff['fail_images'] = fail_images
-            if not self.config['fail_on_unremoved']:
-                self.logwarning(fail_images)
-            else:
-                self.failif(fail_images, fail_images)
+        super(nones, self).postprocess()
+        unremoved = [img for img in
+                     self.unremoved(self.sub_stuff['leftover_images'])
+                     if is_none_image(img)]
+        if unremoved:
+            self.parent_subtest.stuff['unremoved_images'] = True
+        self.report_unremoved("<none>'s", unremoved)
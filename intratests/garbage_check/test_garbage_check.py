@@ -0,0 +1,222 @@
+# -*- python -*-
+#
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest2 import TestCase, main        # pylint: disable=unused-import
+import autotest  # pylint: disable=unused-import
+import garbage_check
+
+
+class TestRemovalWaves(TestCase):
+
+    def test_no_parents(self):
+        self.assertEqual(garbage_check.removal_waves(['a', 'b', 'c'], {}),
+                         [['a', 'b', 'c']])
+
+    def test_chain(self):
+        # c is child of b is child of a
+        parents = {'c': 'b', 'b': 'a', 'a': ''}
+        self.assertEqual(garbage_check.removal_waves(['a', 'b', 'c'],
+                                                     parents),
+                         [['c'], ['b'], ['a']])
+
+    def test_tree(self):
+        # Parents outside of long_ids don't matter
+        parents = {'b': 'a', 'c': 'a', 'd': 'c', 'a': 'preserved'}
+        self.assertEqual(garbage_check.removal_waves(['a', 'b', 'c', 'd'],
+                                                     parents),
+                         [['b', 'd'], ['c'], ['a']])
+
+    def test_loop(self):
+        parents = {'a': 'b', 'b': 'a'}
+        self.assertEqual(garbage_check.removal_waves(['a', 'b'], parents),
+                         [['a', 'b']])
+
+
+class TestInParallel(TestCase):
+
+    def test_all_called(self):
+        called = []
+        lock = threading.Lock()
+
+        def func(item):
+            with lock:
+                called.append(item)
+
+        garbage_check.in_parallel(func, range(10), 3)
+        self.assertEqual(sorted(called), range(10))
+
+    def test_bounded(self):
+        running = [0, 0]  # current, maximum
+        lock = threading.Lock()
+
+        def func(_):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        garbage_check.in_parallel(func, range(10), 3)
+        self.assertEqual(running[1], 3)
+
+    def test_error(self):
+        called = []
+
+        def func(item):
+            called.append(item)
+            if item == 2:
+                raise ValueError(item)
+
+        self.assertRaises(ValueError, garbage_check.in_parallel,
+                          func, range(5), 2)
+        # Remaining items still processed
+        self.assertEqual(sorted(called), range(5))
+
+    def test_empty(self):
+        garbage_check.in_parallel(None, [], 4)
+
+
+
+LONG_ID = ("a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4"
+           "e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2")
+
+
+class TestFuzzyImg(TestCase):
+
+    def setUp(self):
+        from dockertest.images import DockerImageList
+        self.image = garbage_check.DockerImageIncomplete(
+            'fedora', 'latest', LONG_ID, None, None, 'docker.io', None)
+        self.none = garbage_check.DockerImageIncomplete(
+            None, None, LONG_ID[::-1], None, None)
+        self.images = DockerImageList([self.image, self.none])
+
+    def test_found(self):
+        fuzzy_img = garbage_check.garbage_check.fuzzy_img
+        self.assertTrue(fuzzy_img(self.images, 'docker.io/fedora:latest')
+                        is self.image)
+        self.assertTrue(fuzzy_img(self.images, LONG_ID) is self.image)
+        self.assertTrue(fuzzy_img(self.images, LONG_ID[::-1][:12])
+                        is self.none)
+
+    def test_not_found(self):
+        fuzzy_img = garbage_check.garbage_check.fuzzy_img
+        img = fuzzy_img(self.images, 'docker.io/fedora:rawhide')
+        self.assertFalse(img in self.images)
+        self.assertEqual(img.tag, 'rawhide')
+        self.assertEqual(img.long_id, img.UNKNOWN)
+        img = fuzzy_img(self.images, '0123456789ab')
+        self.assertFalse(img in self.images)
+        self.assertEqual(img.short_id, '0123456789ab')
+
+    def test_is_none_image(self):
+        self.assertFalse(garbage_check.is_none_image(self.image))
+        self.assertTrue(garbage_check.is_none_image(self.none))
+
+CID = ("39b75e2aef85774dc545acc9998f0c44"
+       "d0af5f1baf32617e8bc5ed5f998cc558")
+CID2 = ("4f5e1a9a5c1b1e1e7e5b2c1ff0b6e8d4"
+        "43f3ba0a7a01b5d4ab1b0bd0b2b07b5f")
+STAMP = "2016-04-06T09:53:33.265109190-04:00"
+
+
+class TestEventsDelta(TestCase):
+
+    def test_1_09_containers(self):
+        delta = garbage_check.EventsDelta()
+        delta.update(["%s %s: (from foo:latest) create" % (STAMP, CID),
+                      "%s %s: (from foo:latest) start" % (STAMP, CID),
+                      "%s %s: (from foo:latest) create" % (STAMP, CID2),
+                      "%s %s: (from foo:latest) destroy" % (STAMP, CID2)])
+        self.assertEqual(delta.containers, set([CID]))
+        self.assertFalse(delta.images_dirty)
+
+    def test_1_09_images(self):
+        delta = garbage_check.EventsDelta()
+        delta.update(["%s foo:latest: untag" % STAMP])
+        self.assertFalse(delta.images_dirty)
+        delta.update(["%s foo:latest: pull" % STAMP])
+        self.assertTrue(delta.images_dirty)
+
+    def test_1_10(self):
+        delta = garbage_check.EventsDelta([CID2])
+        delta.update(["%s container create %s (image=foo, name=bar)"
+                      % (STAMP, CID),
+                      "%s container commit %s (image=foo, name=bar)"
+                      % (STAMP, CID),
+                      ""])
+        self.assertEqual(delta.containers, set([CID, CID2]))
+        self.assertTrue(delta.images_dirty)
+
+    def test_garbage(self):
+        delta = garbage_check.EventsDelta()
+        delta.update(["%s container create %s (image=foo, name=bar)"
+                      % (STAMP, CID),
+                      "this is not an event"])
+        self.assertEqual(delta.containers, None)
+        self.assertTrue(delta.images_dirty)
+        # Stays unknown
+        delta.update(["%s container create %s (image=foo, name=bar)"
+                      % (STAMP, CID)])
+        self.assertEqual(delta.containers, None)
+
+
+class TestEventsTracker(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='test_garbage_check')
+        self.tracker = garbage_check.EventsTracker(self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_not_running(self):
+        self.assertEqual(self.tracker.state, {})
+        self.assertFalse(self.tracker.running())
+        # Expired
+        self.tracker.state = {'pid': os.getpid(), 'until': time.time() - 1}
+        self.assertFalse(self.tracker.running())
+        # Not an events process
+        self.tracker.state['until'] = time.time() + 60
+        self.assertFalse(self.tracker.running())
+
+    def test_start(self):
+        until = time.time() + 60
+        self.tracker.start("sh -c 'sleep 60; :' events", until)
+        pid = self.tracker.state['pid']
+        try:
+            other = garbage_check.EventsTracker(self.tmpdir)
+            self.assertEqual(other.state['until'], until)
+            self.assertTrue(other.running())
+        finally:
+            os.kill(pid, 15)
+            os.waitpid(pid, 0)
+        self.assertFalse(self.tracker.running())
+
+    def test_delta_checkpoint(self):
+        self.tracker.state = {'containers': [CID2], 'images_dirty': False}
+        with open(self.tracker.log_path, 'wb') as log_file:
+            log_file.write("%s container create %s (image=foo, name=bar)\n"
+                           "%s container destroy %s (image=foo, name=bar)\n"
+                           "%s image pull foo:la"
+                           % (STAMP, CID, STAMP, CID2, STAMP))
+        delta = self.tracker.delta()
+        self.assertEqual(delta.containers, set([CID]))
+        # Partial last line not consumed yet
+        self.assertFalse(delta.images_dirty)
+        self.tracker.checkpoint(delta.containers, False)
+        with open(self.tracker.log_path, 'ab') as log_file:
+            log_file.write("test (name=foo)\n")
+        other = garbage_check.EventsTracker(self.tmpdir)
+        delta = other.delta()
+        self.assertEqual(delta.containers, set([CID]))
+        self.assertTrue(delta.images_dirty)
+
+
+if __name__ == '__main__':
+    main()
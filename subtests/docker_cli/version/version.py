@@ -22,7 +22,7 @@ from dockertest.output import OutputGood
 from dockertest.output import DockerVersion
 from dockertest.output import mustpass
 from dockertest.dockercmd import DockerCmd
-from dockertest.docker_daemon import SocketClient
+from dockertest.docker_daemon import socket_client
 
 
 class version(subtest.Subtest):
@@ -44,7 +44,7 @@ class version(subtest.Subtest):
 
     def verify_version(self, docker_version):
         # TODO: Make URL to daemon configurable
-        client = SocketClient()
+        client = socket_client()
         _version = client.version()
         client_version = _version['Version']
         self.failif(client_version != docker_version.client,
@@ -0,0 +1,117 @@
+# -*- python -*-
+
+from unittest2 import TestCase, main
+
+import __builtin__
+import imp
+import os
+import shutil
+import tempfile
+
+
+class FakeJob(object):
+
+    """Just enough of an autotest job for loading the control file"""
+
+    args = []
+
+    def __init__(self, resultdir):
+        self.resultdir = resultdir
+        # Subtests, config_defaults, etc. are looked up next to this
+        self.control = os.path.join(resultdir, 'control')
+
+    def add_sysinfo_command(self, *args, **dargs):
+        pass
+
+
+# The control file runs with autotest's job in it's globals
+JOB_DIR = tempfile.mkdtemp('test_control')
+__builtin__.job = FakeJob(JOB_DIR)
+CACHE_VAR = 'AUTOTEST_DOCKER_CONFIG_CACHE'
+CACHE_ENV = os.environ.get(CACHE_VAR)
+try:
+    control = imp.load_source('control', './control')
+finally:
+    del __builtin__.job
+    if CACHE_ENV is None:
+        del os.environ[CACHE_VAR]
+    else:
+        os.environ[CACHE_VAR] = CACHE_ENV
+
+
+class TestSubtestWaves(TestCase):
+
+    subtests = ['a', 'b', 'c', 'd', 'e']
+
+    def waves(self, exclusive=None, solo=(), parallel=5):
+        if exclusive is None:
+            exclusive = {}
+        exclusive = dict([(name, set(resources))
+                          for name, resources in exclusive.items()])
+        return control.subtest_waves(self.subtests, exclusive, set(solo),
+                                     parallel)
+
+    def test_one_wave(self):
+        self.assertEqual(self.waves(), [self.subtests])
+
+    def test_parallel(self):
+        self.assertEqual(self.waves(parallel=2),
+                         [['a', 'b'], ['c', 'd'], ['e']])
+        self.assertEqual(self.waves(parallel=1),
+                         [['a'], ['b'], ['c'], ['d'], ['e']])
+
+    def test_exclusive(self):
+        self.assertEqual(self.waves({'a': ['x'], 'c': ['y', 'x'],
+                                     'd': ['y']}),
+                         [['a', 'b', 'd', 'e'], ['c']])
+
+    def test_order_preserved(self):
+        self.assertEqual(self.waves({'a': ['x'], 'b': ['x'], 'c': ['x']},
+                                    parallel=2),
+                         [['a', 'd'], ['b', 'e'], ['c']])
+
+    def test_solo(self):
+        self.assertEqual(self.waves({'c': ['restart', 'x']},
+                                    solo=['restart']),
+                         [['a', 'b', 'd', 'e'], ['c']])
+        self.assertEqual(self.waves({'a': ['restart']}, solo=['restart']),
+                         [['a'], ['b', 'c', 'd', 'e']])
+        self.assertEqual(self.waves({'b': ['restart'], 'd': ['restart']},
+                                    solo=['restart'], parallel=2),
+                         [['a', 'c'], ['b'], ['d'], ['e']])
+
+
+class TestSubtestExclusive(TestCase):
+
+    def setUp(self):
+        self.control_ini = control.ControlINI()
+        self.subdir = os.path.join(JOB_DIR, 'config_defaults', 'subtests')
+        os.makedirs(self.subdir)
+        with open(os.path.join(self.subdir, 'one.ini'), 'wb') as ini:
+            ini.write('[p/one]\n'
+                      'subtest_exclusive = x, y\n'
+                      'exclusive = subsub\n'
+                      '[p/one/sub]\n'
+                      'subtest_exclusive = z\n'
+                      '[p/one_more]\n'
+                      'subtest_exclusive = other\n')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.join(JOB_DIR, 'config_defaults'))
+
+    def test_subtest_exclusive(self):
+        self.assertEqual(self.control_ini.subtest_exclusive(['p/one',
+                                                             'p/two']),
+                         {'p/one': set(['x', 'y', 'z']), 'p/two': set()})
+
+    def test_bad_ini(self):
+        with open(os.path.join(self.subdir, 'two.ini'), 'wb') as ini:
+            ini.write('garbage\n')
+        self.assertEqual(self.control_ini.subtest_exclusive(['p/one']), {})
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(JOB_DIR)